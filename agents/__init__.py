@@ -1,6 +1,19 @@
-from .pdf_agent import PDFQueryAgent
-from .seller_agent import SellerAgent
-from .general_agent import GeneralAgent
-from .code_agent import DHI_CodeBot
+import importlib
 
-__all__ = ['PDFQueryAgent', 'SellerAgent', 'GeneralAgent', 'DHI_CodeBot']
\ No newline at end of file
+from .registry import AGENT_FACTORIES, get_agent_class, create_agent, register_agent
+from .pool import AgentPool, AgentSession, agent_pool
+
+# Agent classes are resolved on first attribute access so importing the package stays cheap
+_LAZY_EXPORTS = {
+    'PDFQueryAgent': '.pdf_agent',
+    'SellerAgent': '.seller_agent',
+    'GeneralAgent': '.general_agent',
+    'DHI_CodeBot': '.code_agent',
+}
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        return getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+__all__ = ['PDFQueryAgent', 'SellerAgent', 'GeneralAgent', 'DHI_CodeBot', 'AGENT_FACTORIES', 'get_agent_class', 'create_agent', 'register_agent', 'AgentPool', 'AgentSession', 'agent_pool']
@@ -1,19 +1,78 @@
-# from .CodeGen import CodeGPTPlus
-from codegpt import CodeGPTPlus
-
-# Initialize CodeGPT instance
-dhi_codebot = CodeGPTPlus()
+import time
+import uuid
+from database.conversation_memory import ConversationMemory
+from database.semantic_cache import answer_cache
+from utils.concurrency import run_blocking, iterate_blocking, query_slot
+from utils.llm_gateway import codegpt_completion
 
 class DHI_CodeBot:
-    def __init__(self):
+    def __init__(self, session_id: str = None, persist_memory: bool = True):
         self.agent_id = "17bb7886-6ef6-4d00-8fe3-8d5ac8ee445d"
+        # Follow-up requests ("now add type hints") see the recent turns and a summary of older ones
+        self.memory = ConversationMemory(session_id or uuid.uuid4().hex, "DHI_CodeBot", persist=persist_memory)
     
+    def release(self):
+        """The CodeGPT client is shared process-wide; only the in-memory conversation is dropped"""
+        self.memory.release()
+
+    def memory_usage(self) -> int:
+        return 0
+
+    def _messages(self, question: str):
+        return self.memory.messages(question)
+
     def query(self, question: str) -> str:
         try:
-            response = dhi_codebot.chat_completion(
+            # Cached answers fit the first request and later ones that do not refer back to earlier turns
+            standalone = self.memory.is_standalone(question)
+            cached = answer_cache.lookup(question, agent="DHI_CodeBot") if standalone else None
+            if cached is not None:
+                self.memory.add_turn(question, cached)
+                return f"🧠 (From memory) {cached}"
+
+            started = time.perf_counter()
+            # The shared CodeGPT client is created by the gateway on first use
+            response = codegpt_completion(
                 agent_id=self.agent_id, 
-                messages=[{"role": "user", "content": question}]
+                messages=self._messages(question)
             )
+            if standalone:
+                answer_cache.store(question, response, agent="DHI_CodeBot", filename="DHI_CodeBot", latency=time.perf_counter() - started)
+            self.memory.add_turn(question, response)
             return response
         except Exception as e:
-            return f"❌ Error processing query: {str(e)}"
\ No newline at end of file
+            return f"❌ Error processing query: {str(e)}"
+
+    async def aquery(self, question: str) -> str:
+        """Async variant of query; the CodeGPT client is synchronous so it runs on the shared thread pool"""
+        async with query_slot():
+            return await run_blocking(self.query, question)
+
+    async def astream(self, question: str):
+        """Stream chunks from chat_completion(stream=True); the full answer is cached and remembered once the stream completes"""
+        async with query_slot():
+            try:
+                standalone = await run_blocking(self.memory.is_standalone, question)
+                cached = await run_blocking(answer_cache.lookup, question, agent="DHI_CodeBot") if standalone else None
+                if cached is not None:
+                    await run_blocking(self.memory.add_turn, question, cached)
+                    yield f"🧠 (From memory) {cached}"
+                    return
+
+                started = time.perf_counter()
+                messages = await run_blocking(self._messages, question)
+                chunks = []
+                async for chunk in iterate_blocking(
+                    codegpt_completion,
+                    agent_id=self.agent_id,
+                    messages=messages,
+                    stream=True
+                ):
+                    chunks.append(chunk)
+                    yield chunk
+
+                if standalone:
+                    await run_blocking(answer_cache.store, question, "".join(chunks), agent="DHI_CodeBot", filename="DHI_CodeBot", latency=time.perf_counter() - started)
+                await run_blocking(self.memory.add_turn, question, "".join(chunks))
+            except Exception as e:
+                yield f"❌ Error processing query: {str(e)}"
@@ -1,23 +1,101 @@
-from langchain_groq import ChatGroq
-from database.models import session, Conversation
+import time
+import uuid
+from database.conversation_memory import ConversationMemory
+from database.semantic_cache import answer_cache
+from utils.concurrency import run_blocking, query_slot
+from utils.model_router import get_routed_model
+
+SYSTEM_PROMPT = "You are an expert in Amazon Ads. Provide precise answers related to Amazon advertising strategies, campaign optimization, bid management, and related queries."
 
 class GeneralAgent:
-    def __init__(self, chat_interface):
-        self.llm = ChatGroq(temperature=0, model_name="llama-3.3-70b-versatile")
+    def __init__(self, chat_interface=None, session_id: str = None, persist_memory: bool = True):
+        self.llm = get_routed_model("GeneralAgent")
         self.chat_interface = chat_interface
-        self.chat_interface.send("🤖 You can ask any queries related to Amazon Ads.", user="System", respond=False)
+        # Follow-up questions are answered with the recent turns and a summary of older ones
+        self.memory = ConversationMemory(session_id or uuid.uuid4().hex, "GeneralAgent", persist=persist_memory)
+        # Headless callers such as the batch runner have no chat to greet
+        if self.chat_interface is not None:
+            self.chat_interface.send("🤖 You can ask any queries related to Amazon Ads.", user="System", respond=False)
+
+    def release(self):
+        """Drop this agent's handle on the shared LLM client and its in-memory conversation"""
+        self.llm = None
+        self.memory.release()
+
+    def memory_usage(self) -> int:
+        return 0
+
+    def _get_llm(self):
+        if self.llm is None:
+            self.llm = get_routed_model("GeneralAgent")
+        return self.llm
+
+    def _messages(self, question: str):
+        return self.memory.messages(question, system_prompt=SYSTEM_PROMPT)
 
     def query(self, question: str) -> str:
         try:
-            existing = session.query(Conversation).filter_by(query=question).first()
-            if existing:
-                return f"🧠 (From memory) {existing.result}"
+            # Cached answers fit the first question and later ones that do not refer back to earlier turns
+            standalone = self.memory.is_standalone(question)
+            cached = answer_cache.lookup(question, agent="GeneralAgent") if standalone else None
+            if cached is not None:
+                self.memory.add_turn(question, cached)
+                return f"🧠 (From memory) {cached}"
             
-            system_prompt = "You are an expert in Amazon Ads. Provide precise answers related to Amazon advertising strategies, campaign optimization, bid management, and related queries."
-            response = self.llm.invoke([{"role": "system", "content": system_prompt}, {"role": "user", "content": question}])
+            started = time.perf_counter()
+            response = self._get_llm().invoke(self._messages(question))
+            content = response.content if hasattr(response, 'content') else str(response)
 
-            session.add(Conversation(query=question, result=response.content, filename="GeneralAgent"))
-            session.commit()
-            return response.content if hasattr(response, 'content') else str(response)
+            if standalone:
+                answer_cache.store(question, content, agent="GeneralAgent", filename="GeneralAgent", latency=time.perf_counter() - started)
+            self.memory.add_turn(question, content)
+            return content
         except Exception as e:
-            return f"❌ Error processing query: {str(e)}"
\ No newline at end of file
+            return f"❌ Error processing query: {str(e)}"
+
+    async def aquery(self, question: str) -> str:
+        """Async variant of query using the gateway model's native ainvoke"""
+        async with query_slot():
+            try:
+                standalone = await run_blocking(self.memory.is_standalone, question)
+                cached = await run_blocking(answer_cache.lookup, question, agent="GeneralAgent") if standalone else None
+                if cached is not None:
+                    await run_blocking(self.memory.add_turn, question, cached)
+                    return f"🧠 (From memory) {cached}"
+
+                started = time.perf_counter()
+                messages = await run_blocking(self._messages, question)
+                response = await self._get_llm().ainvoke(messages)
+                content = response.content if hasattr(response, 'content') else str(response)
+
+                if standalone:
+                    await run_blocking(answer_cache.store, question, content, agent="GeneralAgent", filename="GeneralAgent", latency=time.perf_counter() - started)
+                await run_blocking(self.memory.add_turn, question, content)
+                return content
+            except Exception as e:
+                return f"❌ Error processing query: {str(e)}"
+
+    async def astream(self, question: str):
+        """Stream answer tokens as they arrive; the full answer is cached and remembered once the stream completes"""
+        async with query_slot():
+            try:
+                standalone = await run_blocking(self.memory.is_standalone, question)
+                cached = await run_blocking(answer_cache.lookup, question, agent="GeneralAgent") if standalone else None
+                if cached is not None:
+                    await run_blocking(self.memory.add_turn, question, cached)
+                    yield f"🧠 (From memory) {cached}"
+                    return
+
+                started = time.perf_counter()
+                messages = await run_blocking(self._messages, question)
+                chunks = []
+                async for chunk in self._get_llm().astream(messages):
+                    if chunk.content:
+                        chunks.append(chunk.content)
+                        yield chunk.content
+
+                if standalone:
+                    await run_blocking(answer_cache.store, question, "".join(chunks), agent="GeneralAgent", filename="GeneralAgent", latency=time.perf_counter() - started)
+                await run_blocking(self.memory.add_turn, question, "".join(chunks))
+            except Exception as e:
+                yield f"❌ Error processing query: {str(e)}"
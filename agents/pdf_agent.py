@@ -1,30 +1,155 @@
+import os
+import threading
+import time
 from langchain.chains import RetrievalQA
-from langchain.document_loaders import PyPDFLoader
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import Chroma
-from langchain_groq import ChatGroq
 
-from database.models import session, Conversation
+from agents.pdf_ingestion import PDFIngestionPipeline
+from database.semantic_cache import answer_cache
+from database.vector_store import open_document_index
+from utils.helpers import file_sha256
+from utils.uploads import retain
+from utils.concurrency import run_blocking, query_slot
+from utils.llm_gateway import get_chat_model
+from utils.tracing import span
+from utils.embedding_service import get_embedding_service
 
 class PDFQueryAgent:
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: str, progress_callback=None, doc_hash: str = None, filename: str = None):
         self.pdf_path = pdf_path
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        self.db = Chroma.from_documents(documents, embeddings, persist_directory="./chroma_db")
-        self.db.persist()
+        # The upload store already hashed the bytes while writing them
+        self.doc_hash = doc_hash or file_sha256(pdf_path)
+        self.filename = filename or os.path.basename(pdf_path)
+        retain(self, pdf_path)
+        # Shared process-wide model; no per-upload reload of the sentence-transformer weights
+        embeddings = get_embedding_service()
+        # Each document lives in its own collection named by its content hash, so a
+        # known PDF opens instantly and retrieval only ever searches this document
+        # Ingestion runs in the background so the UI stays responsive; pages become
+        # queryable batch by batch as they are embedded. Uploading the same PDF again
+        # while it is being indexed joins that ingestion instead of restarting it.
+        self.db, ready, self.ingestion = open_document_index(
+            self.doc_hash,
+            embeddings,
+            filename=self.filename,
+            create_pipeline=lambda store: PDFIngestionPipeline(pdf_path, store, progress_callback=progress_callback),
+        )
+        self.pipeline = self.ingestion.pipeline if self.ingestion else None
+        if self.ingestion is not None:
+            self.ingested = self.ingestion.done
+        else:
+            self.ingested = threading.Event()
+            self.ingested.set()
+        self._build_chain()
+
+    @property
+    def ingestion_error(self):
+        return self.ingestion.error if self.ingestion else None
+
+    def _build_chain(self):
+        self.llm = get_chat_model()
+        self.retriever = self.db.as_retriever()
         self.qa_chain = RetrievalQA.from_chain_type(
-            llm=ChatGroq(temperature=0, model_name="llama-3.3-70b-versatile"),
+            llm=self.llm,
             chain_type="stuff",
-            retriever=self.db.as_retriever()
+            retriever=self.retriever
         )
-    
+
+    def _ensure_open(self):
+        """Reopen the document's collection and chain after release()"""
+        if self.qa_chain is None:
+            self.db, _, _ = open_document_index(self.doc_hash, get_embedding_service())
+            self._build_chain()
+
+    def release(self):
+        """Drop the vector store handle, retriever and LLM client once ingestion has finished"""
+        if not self.ingested.is_set():
+            return
+        self.db = None
+        self.retriever = None
+        self.qa_chain = None
+        self.llm = None
+
+    def memory_usage(self) -> int:
+        # Vectors live in the persistent Chroma collection, not in this process's heap
+        return 0
+
+    def _ingestion_notice(self):
+        """Status message while the document is still being indexed, or None once complete"""
+        if self.ingestion_error is not None:
+            return f"❌ Error processing PDF: {str(self.ingestion_error)}"
+        if self.ingested.is_set():
+            return None
+        if self._is_empty():
+            return "⏳ Still indexing the first pages of this PDF, please try again in a moment."
+        return f"⏳ Still indexing ({self.pipeline.pages_done}/{self.pipeline.total_pages} pages); this answer only uses the pages indexed so far.\n\n"
+
+    def _is_empty(self):
+        return self.pipeline is not None and self.pipeline.chunks_indexed == 0
+
     def query(self, question: str) -> str:
-        existing = session.query(Conversation).filter_by(query=question).first()
-        if existing:
-            return f"🧠 (From memory) {existing.result}"
-        result = self.qa_chain.run(question)
-        session.add(Conversation(query=question, result=result, filename=self.pdf_path))
-        session.commit()
-        return result
\ No newline at end of file
+        notice = self._ingestion_notice()
+        if notice is None:
+            cached = answer_cache.lookup(question, agent="PDFQueryAgent", doc_hash=self.doc_hash)
+            if cached is not None:
+                return f"🧠 (From memory) {cached}"
+        elif self.ingestion_error is not None or self._is_empty():
+            return notice
+        self._ensure_open()
+        started = time.perf_counter()
+        with span("retrieval_qa"):
+            result = self.qa_chain.run(question)
+        # Answers over a partially indexed document are never cached
+        if notice is None:
+            answer_cache.store(question, result, agent="PDFQueryAgent", doc_hash=self.doc_hash, filename=self.filename, latency=time.perf_counter() - started)
+            return result
+        return notice + result
+
+    async def aquery(self, question: str) -> str:
+        """Async variant of query using the chain's native arun"""
+        async with query_slot():
+            notice = self._ingestion_notice()
+            if notice is None:
+                cached = await run_blocking(answer_cache.lookup, question, agent="PDFQueryAgent", doc_hash=self.doc_hash)
+                if cached is not None:
+                    return f"🧠 (From memory) {cached}"
+            elif self.ingestion_error is not None or self._is_empty():
+                return notice
+            await run_blocking(self._ensure_open)
+            started = time.perf_counter()
+            with span("retrieval_qa"):
+                result = await self.qa_chain.arun(question)
+            if notice is None:
+                await run_blocking(answer_cache.store, question, result, agent="PDFQueryAgent", doc_hash=self.doc_hash, filename=self.filename, latency=time.perf_counter() - started)
+                return result
+            return notice + result
+
+    async def astream(self, question: str):
+        """Stream the answer token by token using the same stuff prompt as qa_chain"""
+        async with query_slot():
+            notice = self._ingestion_notice()
+            if notice is None:
+                cached = await run_blocking(answer_cache.lookup, question, agent="PDFQueryAgent", doc_hash=self.doc_hash)
+                if cached is not None:
+                    yield f"🧠 (From memory) {cached}"
+                    return
+            else:
+                yield notice
+                if self.ingestion_error is not None or self._is_empty():
+                    return
+            await run_blocking(self._ensure_open)
+            started = time.perf_counter()
+            with span("retrieval") as retrieval:
+                docs = await self.retriever.aget_relevant_documents(question)
+                retrieval.set(documents=len(docs))
+            prompt = self.qa_chain.combine_documents_chain.llm_chain.prompt
+            messages = prompt.format_prompt(
+                context="\n\n".join(doc.page_content for doc in docs),
+                question=question
+            ).to_messages()
+            chunks = []
+            async for chunk in self.llm.astream(messages):
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield chunk.content
+            if notice is None:
+                await run_blocking(answer_cache.store, question, "".join(chunks), agent="PDFQueryAgent", doc_hash=self.doc_hash, filename=self.filename, latency=time.perf_counter() - started)
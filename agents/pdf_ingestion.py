@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Chunks are sized in embedding-model tokens; all-MiniLM-L6-v2 truncates at 256
+PDF_CHUNK_TOKENS = int(os.getenv("PDF_CHUNK_TOKENS", 200))
+PDF_CHUNK_OVERLAP = int(os.getenv("PDF_CHUNK_OVERLAP", 20))
+PDF_EMBED_BATCH_SIZE = int(os.getenv("PDF_EMBED_BATCH_SIZE", 64))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 8))
+PDF_INGEST_WORKERS = int(os.getenv("PDF_INGEST_WORKERS", max(1, min(4, os.cpu_count() or 1))))
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+_splitter = None
+_splitter_lock = threading.Lock()
+
+def _get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn, not fork, as in utils/sandbox.py: the server process has threads and open sockets
+            _process_pool = ProcessPoolExecutor(max_workers=PDF_INGEST_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+def _get_splitter():
+    """Token-aware splitter using the embedding model's own tokenizer"""
+    global _splitter
+    with _splitter_lock:
+        if _splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            from utils.embedding_service import get_embedding_service
+            # Reuse the tokenizer of the already loaded shared embedding model
+            tokenizer = get_embedding_service().load_model().tokenizer
+            if tokenizer is None:
+                # The offline hashing model has no tokenizer; words approximate tokens
+                _splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=PDF_CHUNK_TOKENS,
+                    chunk_overlap=PDF_CHUNK_OVERLAP,
+                    length_function=lambda text: len(text.split())
+                )
+            else:
+                _splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+                    tokenizer,
+                    chunk_size=PDF_CHUNK_TOKENS,
+                    chunk_overlap=PDF_CHUNK_OVERLAP
+                )
+        return _splitter
+
+def _extract_pages(pdf_path: str, start: int, stop: int):
+    """Extract text for pages [start, stop); runs in a worker process"""
+    from pypdf import PdfReader
+    reader = PdfReader(pdf_path)
+    return [(page_number, reader.pages[page_number].extract_text() or "") for page_number in range(start, stop)]
+
+def count_pages(pdf_path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(pdf_path).pages)
+
+def iter_pages(pdf_path: str, total_pages: int):
+    """Yield (page_number, text) in page order while later pages are parsed in parallel"""
+    pool = _get_process_pool()
+    ranges = deque((start, min(start + PDF_PAGES_PER_TASK, total_pages)) for start in range(0, total_pages, PDF_PAGES_PER_TASK))
+    in_flight = deque()
+    # Keep a bounded number of page ranges in flight so memory stays flat on large files
+    while ranges or in_flight:
+        while ranges and len(in_flight) < PDF_INGEST_WORKERS * 2:
+            start, stop = ranges.popleft()
+            in_flight.append(pool.submit(_extract_pages, pdf_path, start, stop))
+        for page in in_flight.popleft().result():
+            yield page
+
+class PDFIngestionPipeline:
+    """Streaming PDF ingestion: parallel page extraction, token-sized chunks, batched embedding.
+
+    Each embedded batch is added to the vector store as soon as it is ready, so the
+    first pages become queryable while later pages are still being processed.
+    progress_callback(stage, done, total) is called as pages are parsed and chunks indexed.
+    """
+
+    def __init__(self, pdf_path: str, store, progress_callback=None, batch_size: int = None):
+        self.pdf_path = pdf_path
+        self.store = store
+        self.progress_callback = progress_callback
+        self.batch_size = batch_size or PDF_EMBED_BATCH_SIZE
+        self.total_pages = 0
+        self.pages_done = 0
+        self.chunks_indexed = 0
+
+    def _report(self, stage: str, done: int, total: int):
+        if self.progress_callback:
+            try:
+                self.progress_callback(stage, done, total)
+            except Exception as e:
+                print(f"Error reporting ingestion progress: {e}")
+
+    def _flush(self, batch):
+        if batch:
+            self.store.add_documents(batch)
+            self.chunks_indexed += len(batch)
+            self._report("embedded", self.pages_done, self.total_pages)
+
+    def run(self) -> int:
+        """Ingest the whole document; returns the number of chunks indexed"""
+        from langchain.schema import Document
+
+        splitter = _get_splitter()
+        self.total_pages = count_pages(self.pdf_path)
+        self._report("started", 0, self.total_pages)
+
+        batch = []
+        for page_number, text in iter_pages(self.pdf_path, self.total_pages):
+            for chunk in splitter.split_text(text):
+                batch.append(Document(page_content=chunk, metadata={"source": self.pdf_path, "page": page_number}))
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+            self.pages_done += 1
+            self._report("parsed", self.pages_done, self.total_pages)
+        self._flush(batch)
+
+        self._report("completed", self.pages_done, self.total_pages)
+        return self.chunks_indexed
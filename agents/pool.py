@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Total bytes of heavy agent state (DataFrames, retrievers, clients) kept across all sessions
+AGENT_POOL_MEMORY_BUDGET_MB = float(os.getenv("AGENT_POOL_MEMORY_BUDGET_MB", 2048))
+# Sessions idle longer than this lose their heavy state; after twice this they are dropped
+AGENT_POOL_IDLE_TIMEOUT_SECONDS = float(os.getenv("AGENT_POOL_IDLE_TIMEOUT_SECONDS", 1800))
+AGENT_POOL_REAP_INTERVAL_SECONDS = float(os.getenv("AGENT_POOL_REAP_INTERVAL_SECONDS", 60))
+
+class AgentSession:
+    """Agents and per-user state for one browser session"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.agents = {}
+        self.active = None
+        self.state = {}
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+    @property
+    def agent(self):
+        """The agent selected for this session's chat, if any"""
+        return self.agents.get(self.active)
+
+    def memory_usage(self) -> int:
+        return sum(agent.memory_usage() for agent in self.agents.values())
+
+class AgentPool:
+    """Session-scoped agent instances under a shared memory budget.
+
+    Sessions are kept in LRU order. When the bytes held by all agents exceed the
+    budget, heavy state is released from the least recently used sessions first
+    (agents rebuild it on their next query). Idle sessions are released after
+    idle_timeout and dropped entirely after twice that. Agents answering a query
+    hold a lease(): eviction skips them, and releases caused by replacing or
+    dropping them wait until the query ends.
+    """
+
+    def __init__(self, memory_budget_bytes: int = None, idle_timeout: float = None):
+        self.memory_budget_bytes = int(memory_budget_bytes if memory_budget_bytes is not None else AGENT_POOL_MEMORY_BUDGET_MB * 1024 * 1024)
+        self.idle_timeout = idle_timeout if idle_timeout is not None else AGENT_POOL_IDLE_TIMEOUT_SECONDS
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+        self._reaper = None
+        # id(agent) -> queries in progress, and leased agents to release when their last query ends
+        self._leases = {}
+        self._deferred = {}
+        self.stats = {"sessions_created": 0, "sessions_dropped": 0, "releases": 0, "busy_skipped": 0}
+
+    def get(self, session_id: str) -> AgentSession:
+        """Return (creating if needed) a session and mark it most recently used"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = AgentSession(session_id)
+                self._sessions[session_id] = session
+                self.stats["sessions_created"] += 1
+            session.last_used = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    @contextmanager
+    def lease(self, agent):
+        """Keep an agent's heavy state in place while it answers a query"""
+        with self._lock:
+            self._leases[id(agent)] = self._leases.get(id(agent), 0) + 1
+        try:
+            yield agent
+        finally:
+            with self._lock:
+                remaining = self._leases.pop(id(agent)) - 1
+                if remaining:
+                    self._leases[id(agent)] = remaining
+                deferred = self._deferred.pop(id(agent), None) if not remaining else None
+            if deferred is not None:
+                deferred.release()
+
+    def _busy(self, agent) -> bool:
+        return id(agent) in self._leases
+
+    def _release_agent(self, agent):
+        """Release an agent now, or when its current query ends"""
+        with self._lock:
+            if self._busy(agent):
+                self._deferred[id(agent)] = agent
+                return
+        agent.release()
+
+    def set_agent(self, session_id: str, name: str, agent, activate: bool = True):
+        """Attach an agent to a session, replacing any previous agent of that name"""
+        with self._lock:
+            session = self.get(session_id)
+            previous = session.agents.get(name)
+            if previous is not None and previous is not agent:
+                self._release_agent(previous)
+            session.agents[name] = agent
+            if activate:
+                session.active = name
+        self.enforce_budget()
+        return agent
+
+    def drop(self, session_id: str):
+        """Release and forget a session, e.g. when its browser tab is closed"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return
+            self.stats["sessions_dropped"] += 1
+        for agent in session.agents.values():
+            self._release_agent(agent)
+
+    def _release_session(self, session: AgentSession):
+        """Release a session's idle agents; agents in the middle of a query are left for a later pass"""
+        for agent in session.agents.values():
+            if self._busy(agent):
+                self.stats["busy_skipped"] += 1
+            else:
+                agent.release()
+        self.stats["releases"] += 1
+
+    def enforce_budget(self):
+        """Release heavy state from least recently used sessions until under budget"""
+        with self._lock:
+            total = sum(session.memory_usage() for session in self._sessions.values())
+            # The most recently used session is never touched; it is the one being served
+            for session in list(self._sessions.values())[:-1]:
+                if total <= self.memory_budget_bytes:
+                    break
+                held = session.memory_usage()
+                if held:
+                    self._release_session(session)
+                    total -= held - session.memory_usage()
+
+    def evict_idle(self):
+        """Release sessions idle past the timeout and drop those idle twice as long"""
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            idle = now - session.last_used
+            if idle > 2 * self.idle_timeout:
+                self.drop(session.session_id)
+            elif idle > self.idle_timeout and session.memory_usage():
+                with self._lock:
+                    self._release_session(session)
+
+    def start_reaper(self, interval: float = AGENT_POOL_REAP_INTERVAL_SECONDS):
+        """Run evict_idle periodically on a daemon thread"""
+        def _reap():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.evict_idle()
+                    self.enforce_budget()
+                except Exception as e:
+                    print(f"Error evicting idle agent sessions: {e}")
+
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=_reap, name="agent-pool-reaper", daemon=True)
+                self._reaper.start()
+
+    def get_stats(self):
+        """Live sessions, bytes held and eviction counters"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            stats = dict(self.stats)
+        bytes_held = [session.memory_usage() for session in sessions]
+        stats.update({
+            "live_sessions": len(sessions),
+            "bytes_held": sum(bytes_held),
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "sessions": {
+                session.session_id: {
+                    "active_agent": session.active,
+                    "agents": list(session.agents),
+                    "bytes_held": held,
+                    "idle_seconds": time.time() - session.last_used,
+                }
+                for session, held in zip(sessions, bytes_held)
+            },
+        })
+        return stats
+
+# Shared pool for all Panel sessions served by this process
+agent_pool = AgentPool()
@@ -0,0 +1,33 @@
+import importlib
+
+# Button name -> "module:attribute" of the agent class. Modules are imported only
+# when a user first picks that agent, so the landing page renders without loading
+# langchain, chromadb, sentence-transformers or pandas.
+AGENT_FACTORIES = {
+    "Amazon Ads Queries": "agents.general_agent:GeneralAgent",
+    "Seller Queries": "agents.seller_agent:SellerAgent",
+    "PDF Queries": "agents.pdf_agent:PDFQueryAgent",
+    "Code Generation": "agents.code_agent:DHI_CodeBot",
+}
+
+_loaded = {}
+
+def get_agent_class(name: str):
+    """Import (once) and return the agent class registered under a button name"""
+    if name not in _loaded:
+        try:
+            target = AGENT_FACTORIES[name]
+        except KeyError:
+            raise ValueError(f"Unknown agent: {name}")
+        module_name, attr = target.split(":")
+        _loaded[name] = getattr(importlib.import_module(module_name), attr)
+    return _loaded[name]
+
+def create_agent(name: str, **kwargs):
+    """Instantiate the agent registered under a button name"""
+    return get_agent_class(name)(**kwargs)
+
+def register_agent(name: str, target: str):
+    """Register an additional agent as "module:attribute" under a button name"""
+    AGENT_FACTORIES[name] = target
+    _loaded.pop(name, None)
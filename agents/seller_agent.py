@@ -1,22 +1,51 @@
+import copy
 import os
 import re
+import time
 import uuid
 import pandas as pd
-from langchain_groq import ChatGroq
 from langchain_experimental.agents import create_pandas_dataframe_agent
 
-from database.models import session, Conversation
-from utils.helpers import ensure_uploads_dir
+from agents.seller_planner import QueryPlanner, record_fast_path
+from agents.seller_out_of_core import OutOfCoreDataset, ResultTooLarge, needs_out_of_core
+from agents.seller_index import build_token_index, is_text_column
+from agents.seller_sandbox import SELLER_SANDBOX, sandbox_agent
+from database.semantic_cache import answer_cache
+from database.upload_store import get_artifact, record_artifact
+from utils.helpers import ensure_uploads_dir, file_sha256
+from utils.concurrency import run_blocking, query_slot
+from utils.tracing import span
+from utils.model_router import get_routed_model
+from utils.dataframe_loader import COLUMNAR_CACHE_DIR, load_csv
+from utils.exports import DataExport
+from utils.uploads import retain
+from utils.sandbox import sandbox_pool
+
+def filter_question(question: str) -> str:
+    """The pandas agent's input for a filtering question: the question plus instructions to keep the filtered frame"""
+    return f"""
+            {question}
+
+            After executing this query, if you've filtered the data in any way, show the first few rows of your filtered result and the total number of rows.
+            Also, in your Python code, assign your filtered dataframe to the variable '_FILTERED_RESULT_' so I can extract it.
+            """
 
 class SellerAgent:
-    def __init__(self, csv_path: str = None):
-        if csv_path:
-            self.df = pd.read_csv(csv_path)
-            self.csv_path = csv_path
-        else:
-            self.df = None
-            self.csv_path = None
-        self.llm = ChatGroq(temperature=0, model_name="llama-3.3-70b-versatile")
+    def __init__(self, csv_path: str = None, doc_hash: str = None, filename: str = None):
+        self.csv_path = csv_path
+        # The upload store already hashed the bytes while writing them
+        self.doc_hash = doc_hash or (file_sha256(csv_path) if csv_path else None)
+        self.filename = filename or (os.path.basename(csv_path) if csv_path else None)
+        self.df = None
+        self.llm = None
+        self.agent = None
+        self.planner = None
+        self.load_report = None
+        self.dataset = None
+        self.token_index = None
+        self._memory_bytes = 0
+        # Identifies this agent's REPL namespace inside the sandbox workers
+        self.session_key = uuid.uuid4().hex
         
         # Enhanced prefix with clearer instructions for formatting
         self.prefix = """
@@ -46,7 +75,43 @@ class SellerAgent:
         
         Remember to execute the correct pandas operations and evaluate your results before responding.
         """
-        
+        self._load()
+
+    def _load(self):
+        """Load the CSV and build the LLM agent; called again after release()"""
+        if self.csv_path and needs_out_of_core(self.csv_path):
+            # Too large for memory: the fast path scans the file chunk by chunk and
+            # the LLM agent only sees a sample for schema and example values
+            self.dataset = OutOfCoreDataset(self.csv_path, self.doc_hash)
+            self.df = self.dataset.sample()
+            self._memory_bytes = int(self.df.memory_usage(deep=True).sum())
+            self.load_report = {
+                "source": "out_of_core",
+                "rows": self.dataset.row_count,
+                "columns": len(self.df.columns),
+                "file_bytes": os.path.getsize(self.csv_path),
+                "optimized_bytes": self._memory_bytes,
+                "raw_bytes": None,
+                "load_seconds": 0.0,
+            }
+            if self.dataset.parquet_path and get_artifact(self.doc_hash, "columnar_cache") is None:
+                record_artifact(self.doc_hash, "columnar_cache", self.dataset.parquet_path)
+                record_artifact(self.doc_hash, "profile", data=self.load_report)
+        elif self.csv_path:
+            # Typed load with categoricals and downcast numerics, reusing the Parquet copy of an identical upload
+            self.df, self.load_report = load_csv(self.csv_path, self.doc_hash)
+            self._memory_bytes = self.load_report["optimized_bytes"]
+            self._record_profile()
+            # Keyword and "contains" filters are answered from token postings once this is ready
+            self.token_index = build_token_index(self.df, self.doc_hash)
+        self._build_agent()
+
+    def _build_agent(self):
+        """Create the pandas agent and its REPL over the loaded frame"""
+        # Keep the source file and its columnar copies out of the uploads cleanup while this agent lives
+        retain(self, self.csv_path, self.load_report and self.load_report.get("columnar_cache"), self.dataset and self.dataset.parquet_path)
+        # Tool-output steps of the ReAct loop run on the small model, escalating on bad output
+        self.llm = get_routed_model("SellerAgent")
         self.agent = create_pandas_dataframe_agent(
             llm=self.llm,
             df=self.df if self.df is not None else pd.DataFrame(),
@@ -55,83 +120,116 @@ class SellerAgent:
             allow_dangerous_code=True,
             prefix=self.prefix
         )
+        if SELLER_SANDBOX and self.df is not None:
+            self._sandbox_generated_code()
 
-    def query(self, question: str) -> str:
-        from ui.components import update_layout_with_download_button
-        
+    def _sandbox_generated_code(self):
+        """Route the agent's generated code to the sandbox pool, which reads the frame from Parquet"""
+        source = self.load_report.get("columnar_cache") if self.dataset is None else None
+        try:
+            if not source or not os.path.exists(source):
+                # Out-of-core sample, or no columnar cache from load_csv
+                ensure_uploads_dir()
+                os.makedirs(COLUMNAR_CACHE_DIR, exist_ok=True)
+                source = os.path.join(COLUMNAR_CACHE_DIR, f"{self.doc_hash}.sample.parquet")
+                if not os.path.exists(source):
+                    self.df.to_parquet(source, engine="pyarrow", index=False)
+            retain(self, source)
+            sandbox_agent(self.agent, os.path.abspath(source), self.session_key, sandbox_pool.start())
+        except Exception as e:
+            print(f"Sandbox unavailable, running generated code in-process: {e}")
+
+    def _record_profile(self):
+        """Link the columnar cache and dataset profile to the upload, or reuse the profile from the first load"""
+        if self.load_report["source"] == "csv":
+            if self.load_report.get("columnar_cache"):
+                record_artifact(self.doc_hash, "columnar_cache", self.load_report["columnar_cache"])
+            profile = dict(self.load_report, dtypes={str(col): str(dtype) for col, dtype in self.df.dtypes.items()})
+            record_artifact(self.doc_hash, "profile", data=profile)
+            return
+        stored = get_artifact(self.doc_hash, "profile")
+        if stored is not None and stored[1]:
+            # Keep the parse-time memory savings in the report shown for repeat uploads
+            for key in ("raw_bytes", "saved_bytes", "saved_pct"):
+                if key in stored[1]:
+                    self.load_report[key] = stored[1][key]
+
+    def clone(self):
+        """Another agent over the same loaded frame, planner and token index, with its own pandas agent.
+
+        The pandas agent's REPL namespace holds per-question state (the filtered result
+        behind an export), so concurrent workers such as batch.py's each need one.
+        """
+        if self.agent is None:
+            self._load()
+        if self.planner is None:
+            self.planner = QueryPlanner(self.df)
+        twin = copy.copy(self)
+        # Shares the column data; columns the generated code adds or drops stay in its own REPL
+        twin.df = self.df.copy(deep=False)
+        twin.session_key = uuid.uuid4().hex
+        twin._build_agent()
+        return twin
+
+    def release(self):
+        """Drop the DataFrame, LLM client and agent; they are rebuilt on the next query"""
+        self.df = None
+        self.llm = None
+        self.agent = None
+        self.planner = None
+        self.token_index = None
+        self._memory_bytes = 0
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by this agent's heavy state"""
+        index_bytes = self.token_index.memory_usage() if self.token_index is not None else 0
+        return self._memory_bytes + index_bytes
+
+    def query(self, question: str, on_export=None) -> str:
+        """Answer a question; on_export(DataExport, row count) is called when a filtered result can be downloaded"""
+        if self.agent is None:
+            self._load()
         if self.df is None or self.df.empty:
             return "❌ Please upload a valid CSV file before querying."
         try:
-            existing = session.query(Conversation).filter_by(query=question).first()
-            if existing:
-                return f"🧠 (From memory) {existing.result}"
-            
-            # Check if the query involves filtering
-            filter_keywords = ["filter", "where", "find", "list", "show", "contain", "match", "include"]
-            is_filter_query = any(keyword in question.lower() for keyword in filter_keywords)
+            # Data answers hinge on exact values ("contains shoes" vs "contains hats"), so no near matches
+            cached = answer_cache.lookup(question, agent="SellerAgent", doc_hash=self.doc_hash, semantic=False)
+            if cached is not None:
+                return f"🧠 (From memory) {cached}"
+
+            started = time.perf_counter()
             
-            # Generate a UUID-based filename for filtered data
-            export_filename = f"filtered_data_{uuid.uuid4().hex[:8]}.csv"
-            filtered_csv_path = os.path.join("uploads", export_filename)
+            # Out-of-core row results are streamed to this file while the query runs;
+            # in-memory results are only serialized when the user clicks download.
+            # Headless callers (batch runs) pass no on_export and get the answer text only
+            export_name = f"filtered_data_{uuid.uuid4().hex[:8]}"
+            filtered_csv_path = os.path.join(ensure_uploads_dir(), f"{export_name}.csv") if on_export is not None else None
             
-            # Add a specialized instruction for the agent to return the filtered data
-            if is_filter_query:
-                custom_question = f"""
-                {question}
-                
-                After executing this query, if you've filtered the data in any way, show the first few rows of your filtered result and the total number of rows.
-                Also, in your Python code, assign your filtered dataframe to the variable '_FILTERED_RESULT_' so I can extract it.
-                """
-                
-                try:
-                    response = self.agent.run(custom_question)
-                except Exception as parse_error:
-                    # Handle parsing errors by extracting useful information
-                    error_message = str(parse_error)
-                    match = re.search(r'Could not parse LLM output: `(.*)`', error_message, re.DOTALL)
-                    if match:
-                        # Return the raw output from the LLM without parsing
-                        raw_output = match.group(1)
-                        response = f"I analyzed your request: {raw_output}\n\nHere's a summary of what I found in your data."
-                    else:
-                        # If we can't extract the output, run a simpler query
-                        simple_question = f"Please analyze this data: {question}"
-                        response = self.agent.run(simple_question)
-                
-                # Extract the filtered dataframe result from the agent's response
-                filtered_df = self._extract_filtered_dataframe(response)
+            # Common filter, sort, group-by, top-N and count questions are answered
+            # directly with vectorized pandas; anything else goes to the LLM agent
+            exported_rows = None
+            with span("fast_path") as fast_span:
+                fast = self._try_fast_path(question, filtered_csv_path)
+                fast_span.set(answered=fast is not None)
+            if fast is not None:
+                response, filtered_df, exported_rows = fast
             else:
-                try:
-                    response = self.agent.run(question)
-                except Exception as parse_error:
-                    # Handle parsing errors by extracting useful information
-                    error_message = str(parse_error)
-                    match = re.search(r'Could not parse LLM output: `(.*)`', error_message, re.DOTALL)
-                    if match:
-                        # Return the raw output from the LLM without parsing
-                        raw_output = match.group(1)
-                        response = f"I analyzed your request and found: {raw_output}"
-                    else:
-                        # Return a simplified error message
-                        response = f"❌ I had trouble parsing the analysis results. Please try rephrasing your question. Error details: {str(parse_error)[:100]}..."
-                filtered_df = None
+                with span("pandas_agent"):
+                    response, filtered_df = self._run_llm_agent(question)
+                if self.dataset is not None:
+                    response += f"\n\n⚠️ This file is too large to load in full; this answer is based on the first {len(self.df):,} of {self.dataset.row_count:,} rows."
             
-            # Create and save the filtered dataframe if it exists
-            if filtered_df is not None and not filtered_df.empty:
-                # Ensure uploads directory exists
-                ensure_uploads_dir()
-                
-                # Save the filtered dataframe to CSV
-                filtered_df.to_csv(filtered_csv_path, index=False)
-                
-                # Update the UI with a download button
-                update_layout_with_download_button(filtered_csv_path, len(filtered_df))
+            if exported_rows and on_export is not None:
+                on_export(DataExport(csv_path=filtered_csv_path, name=export_name), exported_rows)
+                response += f"\n\n✅ Filtered data is ready for download! Found {exported_rows} matching rows."
+            # Offer the filtered dataframe for download if it exists
+            elif filtered_df is not None and not filtered_df.empty and on_export is not None:
+                on_export(DataExport(filtered_df, name=export_name), len(filtered_df))
                 
                 # Enhance the response
                 response += f"\n\n✅ Filtered data is ready for download! Found {len(filtered_df)} matching rows."
             
-            session.add(Conversation(query=question, result=response, filename=self.csv_path))
-            session.commit()
+            answer_cache.store(question, response, agent="SellerAgent", doc_hash=self.doc_hash, filename=self.filename, latency=time.perf_counter() - started)
             return response
         except Exception as e:
             import traceback
@@ -139,56 +237,114 @@ class SellerAgent:
             print(f"Error in SellerAgent.query: {error_details}")
             return f"❌ Error processing query: {str(e)}"
     
-    def _extract_filtered_dataframe(self, response):
-        """Extract filtered dataframe from the agent's response"""
-        # Try to extract from code blocks
-        code_blocks = re.findall(r'```python(.*?)```', response, re.DOTALL)
-        if not code_blocks:
-            # Try alternate code block format if the first regex doesn't match
-            code_blocks = re.findall(r'```(.*?)```', response, re.DOTALL)
-        
-        filtered_df = None
-        # Execute each code block to get the filtered dataframe
-        for code_block in code_blocks:
-            # Clean up the code block and check for the filtered result variable
-            code = code_block.strip()
-            if "_FILTERED_RESULT_" in code:
-                # Create a local namespace to execute the code
-                local_vars = {"df": self.df.copy(), "_FILTERED_RESULT_": None, "pd": pd}
-                try:
-                    # Execute the code to get the filtered dataframe
-                    exec(code, globals(), local_vars)
-                    if local_vars["_FILTERED_RESULT_"] is not None and isinstance(local_vars["_FILTERED_RESULT_"], pd.DataFrame):
-                        filtered_df = local_vars["_FILTERED_RESULT_"]
-                except Exception as exec_error:
-                    print(f"Error executing code block: {exec_error}")
-        
-        # If we couldn't extract the filtered dataframe from code blocks, try to parse the result for keyword filtering
-        if filtered_df is None:
-            filtered_df = self._try_alternative_extraction(response)
-            
-        return filtered_df
-    
-    def _try_alternative_extraction(self, response):
-        """Try alternative methods to extract a filtered dataframe"""
+    def _run_llm_agent(self, question: str):
+        """Answer through the pandas ReAct agent; returns (response, filtered_df or None)"""
+        # Check if the query involves filtering
+        filter_keywords = ["filter", "where", "find", "list", "show", "contain", "match", "include"]
+        is_filter_query = any(keyword in question.lower() for keyword in filter_keywords)
+
+        # Add a specialized instruction for the agent to return the filtered data
+        if is_filter_query:
+            custom_question = filter_question(question)
+
+            # Stale results from an earlier question must not be mistaken for this one's
+            self._repl_locals().pop("_FILTERED_RESULT_", None)
+            try:
+                response = self.agent.run(custom_question)
+            except Exception as parse_error:
+                # Handle parsing errors by extracting useful information
+                error_message = str(parse_error)
+                match = re.search(r'Could not parse LLM output: `(.*)`', error_message, re.DOTALL)
+                if match:
+                    # Return the raw output from the LLM without parsing
+                    raw_output = match.group(1)
+                    response = f"I analyzed your request: {raw_output}\n\nHere's a summary of what I found in your data."
+                else:
+                    # If we can't extract the output, run a simpler query
+                    simple_question = f"Please analyze this data: {question}"
+                    response = self.agent.run(simple_question)
+
+            # Extract the filtered dataframe result from the agent's response
+            filtered_df = self._extract_filtered_dataframe(response)
+        else:
+            try:
+                response = self.agent.run(question)
+            except Exception as parse_error:
+                # Handle parsing errors by extracting useful information
+                error_message = str(parse_error)
+                match = re.search(r'Could not parse LLM output: `(.*)`', error_message, re.DOTALL)
+                if match:
+                    # Return the raw output from the LLM without parsing
+                    raw_output = match.group(1)
+                    response = f"I analyzed your request and found: {raw_output}"
+                else:
+                    # Return a simplified error message
+                    response = f"❌ I had trouble parsing the analysis results. Please try rephrasing your question. Error details: {str(parse_error)[:100]}..."
+            filtered_df = None
+        return response, filtered_df
+
+    def _try_fast_path(self, question: str, export_path: str = None):
+        """Answer with the deterministic query planner.
+
+        Returns (response, filtered_df, exported_rows) or None. In out-of-core mode
+        matching rows are streamed straight to export_path and exported_rows is their count.
+        """
+        if self.planner is None:
+            self.planner = QueryPlanner(self.df)
+        plan = self.planner.plan(question)
+        if plan is None:
+            record_fast_path("llm_fallback")
+            return None
         try:
-            # Look for patterns like "df[df['column'] == 'value']"
-            filter_patterns = re.findall(r"df\[(.*?)\]", response, re.DOTALL)
-            if filter_patterns:
-                for pattern in filter_patterns:
-                    try:
-                        # Create a safe execution environment
-                        local_vars = {"df": self.df.copy(), "pd": pd, "re": re, "np": pd.np}
-                        # Try to execute the filter
-                        exec(f"_FILTERED_RESULT_ = df[{pattern}]", globals(), local_vars)
-                        if "_FILTERED_RESULT_" in local_vars and isinstance(local_vars["_FILTERED_RESULT_"], pd.DataFrame):
-                            return local_vars["_FILTERED_RESULT_"]
-                    except Exception:
-                        continue
-        except Exception as extract_error:
-            print(f"Error extracting filter conditions: {extract_error}")
-        
-        # Try keyword-based filtering as a last resort
+            if self.dataset is not None:
+                result, matched = self.dataset.execute(plan, export_path=export_path if plan.kind == "rows" else None)
+                total_rows = self.dataset.row_count
+            else:
+                result, matched = plan.execute(self.df, self.token_index), None
+                total_rows = len(self.df)
+        except ResultTooLarge as e:
+            # The LLM would only see the in-memory sample, so say why instead of guessing
+            record_fast_path("fast_path")
+            return f"⚠️ {e}", None, None
+        except Exception as e:
+            print(f"Fast path failed for {plan.describe()}: {e}")
+            record_fast_path("fast_path_errors")
+            return None
+        record_fast_path("fast_path")
+        response = plan.format_response(result, total_rows, matched_rows=matched)
+        if self.dataset is not None and plan.kind == "rows":
+            return response, None, matched
+        filtered_df = result if plan.kind in ("rows", "sort", "top") and isinstance(result, pd.DataFrame) else None
+        return response, filtered_df, None
+
+    async def aquery(self, question: str, on_export=None) -> str:
+        """Async variant of query; the pandas agent and exports run on the shared thread pool"""
+        async with query_slot():
+            return await run_blocking(self.query, question, on_export)
+
+    async def astream(self, question: str, on_export=None):
+        """The pandas ReAct loop has no useful partial output, so the full answer is yielded once"""
+        yield await self.aquery(question, on_export)
+
+    def _repl_locals(self):
+        """Namespace of the agent's python_repl_ast tool, where its generated code ran"""
+        for tool in getattr(self.agent, "tools", []):
+            if tool.name == "python_repl_ast":
+                return tool.locals
+        return {}
+
+    def _extract_filtered_dataframe(self, response):
+        """Return the _FILTERED_RESULT_ the agent's own code left in its REPL namespace.
+
+        The agent already computed it, so nothing is re-executed or copied; the
+        keyword index is only consulted when the agent did not assign it.
+        """
+        result = self._repl_locals().pop("_FILTERED_RESULT_", None)
+        if isinstance(result, pd.Series) and result.dtype == bool and result.index.equals(self.df.index):
+            # A boolean mask rather than the filtered rows
+            result = self.df[result]
+        if isinstance(result, pd.DataFrame):
+            return result
         return self._try_keyword_filtering(response)
     
     def _try_keyword_filtering(self, response):
@@ -204,13 +360,18 @@ class SellerAgent:
         
         # Apply filtering based on extracted search terms
         if search_terms:
-            string_cols = self.df.select_dtypes(include=['object']).columns
-            filter_condition = pd.Series([False] * len(self.df))
+            indexed = self.token_index.search(search_terms) if self.token_index is not None else None
+            if indexed is not None:
+                return self.df[indexed]
+
+            # Index still building: scan the text columns directly
+            string_cols = [col for col in self.df.columns if is_text_column(self.df[col])]
+            filter_condition = pd.Series(False, index=self.df.index)
             
             for term in search_terms:
                 for col in string_cols:
-                    filter_condition = filter_condition | self.df[col].astype(str).str.contains(term, case=False, na=False)
+                    filter_condition = filter_condition | self.df[col].astype(str).str.contains(term, case=False, regex=False, na=False)
             
-            return self.df[filter_condition].copy()
+            return self.df[filter_condition]
         
         return None
\ No newline at end of file
@@ -0,0 +1,142 @@
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Build the token index on a background thread so uploads return immediately
+SELLER_TOKEN_INDEX_BACKGROUND = os.getenv("SELLER_TOKEN_INDEX_BACKGROUND", "1") == "1"
+
+# Tokens are compared upper-cased, the same way pandas' case-insensitive str.contains does
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text) -> list:
+    """Upper-cased word tokens of a cell value or search term"""
+    return _TOKEN_RE.findall(str(text).upper())
+
+def is_text_column(series) -> bool:
+    return isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+class _ColumnIndex:
+    """Token postings for one text column.
+
+    Each row is mapped to the id of its distinct value, and each token to the
+    sorted ids of the distinct values containing it. A term's row bitmap is then
+    a lookup table over value ids, so rows are never rescanned as strings.
+    """
+
+    def __init__(self, series):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            self.codes = series.cat.codes.to_numpy()
+            self.values = series.cat.categories.astype(str).to_series(index=None).reset_index(drop=True)
+        else:
+            codes, uniques = pd.factorize(series)
+            self.codes = codes
+            self.values = pd.Series(uniques.astype(str))
+
+        # (token, value id) pairs, tokenized once per distinct value rather than per row
+        tokens = self.values.str.upper().str.findall(_TOKEN_RE.pattern).explode().dropna()
+        pairs = pd.DataFrame({"token": tokens.to_numpy(), "value_id": tokens.index.to_numpy(dtype=np.int32)}).drop_duplicates()
+        pairs = pairs.sort_values(["token", "value_id"], kind="stable")
+        self.vocab, bounds = np.unique(pairs["token"].to_numpy(dtype=str), return_index=True)
+        self.vocab = self.vocab.tolist()
+        self.postings = np.split(pairs["value_id"].to_numpy(), bounds[1:]) if len(bounds) else []
+        # Vocabulary joined into one string so substring matches on tokens run in C
+        self._joined = "\n".join(self.vocab)
+        self._starts = np.cumsum([0] + [len(token) + 1 for token in self.vocab[:-1]]) if self.vocab else np.zeros(0, dtype=np.int64)
+
+    def _values_with_token_part(self, part: str):
+        """Ids of distinct values having a token that contains part"""
+        positions = [match.start() for match in re.finditer(re.escape(part), self._joined)]
+        if not positions:
+            return np.zeros(0, dtype=np.int32)
+        token_ids = np.unique(np.searchsorted(self._starts, positions, side="right") - 1)
+        if len(token_ids) == 1:
+            return self.postings[token_ids[0]]
+        return np.unique(np.concatenate([self.postings[token_id] for token_id in token_ids]))
+
+    def contains(self, term: str):
+        """Row bitmap of values containing term, case-insensitively"""
+        candidates = None
+        for part in set(tokenize(term)):
+            ids = self._values_with_token_part(part)
+            candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+            if not len(candidates):
+                return np.zeros(len(self.codes), dtype=bool)
+        # Tokens only narrow the candidates; the exact check runs on distinct values, never on rows
+        values = self.values if candidates is None else self.values.iloc[candidates]
+        matched = values.index[values.str.contains(term, case=False, regex=False, na=False).to_numpy()]
+        # Slot 0 of the lookup table stands for missing values (code -1)
+        lookup = np.zeros(len(self.values) + 1, dtype=bool)
+        lookup[np.asarray(matched) + 1] = True
+        return lookup[self.codes.astype(np.int64) + 1]
+
+    def memory_usage(self) -> int:
+        return int(self.codes.nbytes + sum(p.nbytes for p in self.postings) + len(self._joined) + self._starts.nbytes)
+
+class TokenIndex:
+    """Inverted index from word tokens to row bitmaps over a seller DataFrame's text columns.
+
+    Built once per uploaded dataset (identified by its SHA-256); contains() returns
+    None until the index is ready so callers can fall back to a plain scan.
+    """
+
+    def __init__(self, df, doc_hash: str = None):
+        self.doc_hash = doc_hash
+        self.rows = len(df)
+        self.columns = {}
+        self.ready = threading.Event()
+        self.build_seconds = None
+        self.error = None
+        self._df = df
+
+    def build(self):
+        started = time.perf_counter()
+        try:
+            columns = {}
+            for col in self._df.columns:
+                if is_text_column(self._df[col]):
+                    columns[col] = _ColumnIndex(self._df[col])
+            self.columns = columns
+            self.build_seconds = time.perf_counter() - started
+        except Exception as e:
+            self.error = e
+            print(f"Error building token index: {e}")
+        finally:
+            self._df = None
+            self.ready.set()
+        return self
+
+    def build_async(self):
+        """Build on a daemon thread; queries scan the DataFrame until it finishes"""
+        threading.Thread(target=self.build, name="seller-token-index", daemon=True).start()
+        return self
+
+    def covers(self, column) -> bool:
+        return self.ready.is_set() and column in self.columns
+
+    def contains(self, column, term: str):
+        """Boolean numpy mask of rows whose column contains term, or None if not indexed"""
+        if not self.covers(column):
+            return None
+        return self.columns[column].contains(str(term))
+
+    def search(self, terms, columns=None):
+        """Rows where any indexed column contains any of the terms, or None if not ready"""
+        if not self.ready.is_set() or self.error is not None:
+            return None
+        mask = np.zeros(self.rows, dtype=bool)
+        for term in terms:
+            for col in columns or self.columns:
+                if col in self.columns:
+                    mask |= self.columns[col].contains(str(term))
+        return mask
+
+    def memory_usage(self) -> int:
+        return sum(index.memory_usage() for index in self.columns.values())
+
+def build_token_index(df, doc_hash: str = None, background: bool = SELLER_TOKEN_INDEX_BACKGROUND) -> TokenIndex:
+    index = TokenIndex(df, doc_hash)
+    return index.build_async() if background else index.build()
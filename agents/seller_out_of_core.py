@@ -0,0 +1,217 @@
+import os
+
+import pandas as pd
+
+from agents.seller_planner import PREVIEW_ROWS
+from utils.dataframe_loader import COLUMNAR_CACHE_DIR
+from utils.helpers import ensure_uploads_dir
+
+# CSVs larger than this are queried chunk by chunk instead of loaded into one DataFrame
+SELLER_OUT_OF_CORE_THRESHOLD_MB = float(os.getenv("SELLER_OUT_OF_CORE_THRESHOLD_MB", 512))
+OUT_OF_CORE_CHUNK_ROWS = int(os.getenv("OUT_OF_CORE_CHUNK_ROWS", 250_000))
+# Upper bound on rows materialized for sorted results and medians
+OUT_OF_CORE_MAX_RESULT_ROWS = int(os.getenv("OUT_OF_CORE_MAX_RESULT_ROWS", 100_000))
+# Rows loaded in memory so the LLM agent can still inspect the schema and sample values
+OUT_OF_CORE_SAMPLE_ROWS = int(os.getenv("OUT_OF_CORE_SAMPLE_ROWS", 5_000))
+
+class ResultTooLarge(Exception):
+    """A plan whose exact answer would need more rows in memory than OUT_OF_CORE_MAX_RESULT_ROWS"""
+
+def needs_out_of_core(csv_path: str) -> bool:
+    return os.path.getsize(csv_path) > SELLER_OUT_OF_CORE_THRESHOLD_MB * 1024 * 1024
+
+class OutOfCoreDataset:
+    """A seller CSV that is never fully loaded into memory.
+
+    On first use the CSV is streamed into a Parquet file with pyarrow, so later
+    queries read only the columns they need, one record batch at a time. If the
+    conversion fails (e.g. a column's type changes half-way through the file) the
+    CSV itself is read in chunks.
+    """
+
+    def __init__(self, csv_path: str, doc_hash: str, chunk_rows: int = OUT_OF_CORE_CHUNK_ROWS):
+        self.csv_path = csv_path
+        self.doc_hash = doc_hash
+        self.chunk_rows = chunk_rows
+        self.parquet_path = None
+        self._row_count = None
+        self._prepare()
+
+    def _prepare(self):
+        path = os.path.join(COLUMNAR_CACHE_DIR, f"{self.doc_hash}.stream.parquet")
+        if os.path.exists(path):
+            self.parquet_path = path
+            return
+        try:
+            import pyarrow.csv as pa_csv
+            import pyarrow.parquet as pq
+        except ImportError:
+            return
+        ensure_uploads_dir()
+        os.makedirs(COLUMNAR_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        try:
+            reader = pa_csv.open_csv(self.csv_path)
+            with pq.ParquetWriter(tmp_path, reader.schema, compression="zstd") as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+            os.replace(tmp_path, path)
+            self.parquet_path = path
+        except Exception as e:
+            print(f"Streaming Parquet conversion failed, querying the CSV in chunks instead: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def iter_chunks(self, columns=None):
+        """Yield DataFrames of at most chunk_rows rows, optionally only some columns"""
+        if self.parquet_path:
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(self.parquet_path)
+            for batch in parquet_file.iter_batches(batch_size=self.chunk_rows, columns=columns):
+                yield batch.to_pandas()
+        else:
+            for chunk in pd.read_csv(self.csv_path, chunksize=self.chunk_rows, usecols=columns):
+                yield chunk
+
+    def sample(self, rows: int = OUT_OF_CORE_SAMPLE_ROWS):
+        """First rows of the file, used for the planner's schema and the LLM agent"""
+        for chunk in self.iter_chunks():
+            return chunk.head(rows).reset_index(drop=True)
+        return pd.DataFrame()
+
+    @property
+    def row_count(self) -> int:
+        if self._row_count is None:
+            if self.parquet_path:
+                import pyarrow.parquet as pq
+                self._row_count = pq.ParquetFile(self.parquet_path).metadata.num_rows
+            else:
+                self._row_count = sum(len(chunk) for chunk in pd.read_csv(self.csv_path, chunksize=self.chunk_rows, usecols=[0]))
+        return self._row_count
+
+    def execute(self, plan, export_path: str = None):
+        """Run a QueryPlan chunk by chunk with bounded memory.
+
+        Returns (result, matched_rows). For row-returning plans, matching rows are
+        streamed to export_path (when given) and only a preview is kept in memory.
+        """
+        columns = None
+        if plan.kind not in ("rows", "sort", "top") or plan.group:
+            columns = list(dict.fromkeys([col for col, _, _ in plan.filters] + [c for c in (plan.metric, plan.group) if c]))
+
+        if plan.kind == "rows":
+            return self._execute_rows(plan, export_path)
+        if plan.kind == "count":
+            return sum(int(plan.mask(chunk).sum()) for chunk in self.iter_chunks(columns)), None
+        if plan.kind == "sort" or (plan.kind == "top" and not plan.group):
+            return self._execute_ranked(plan)
+        if plan.kind == "top":
+            totals = self._grouped_partials(plan, columns, "sum")
+            picked = totals.nsmallest(plan.n) if plan.ascending else totals.nlargest(plan.n)
+            return picked.rename(f"sum_{plan.metric}").reset_index(), None
+        if plan.kind == "aggregate":
+            return self._execute_aggregate(plan, columns), None
+        raise ValueError(f"Unknown plan kind: {plan.kind}")
+
+    def _filtered_chunks(self, plan, columns=None):
+        for chunk in self.iter_chunks(columns):
+            yield chunk[plan.mask(chunk)] if plan.filters else chunk
+
+    def _execute_rows(self, plan, export_path):
+        preview = []
+        preview_rows = 0
+        matched = 0
+        header = True
+        for rows in self._filtered_chunks(plan):
+            if rows.empty:
+                continue
+            matched += len(rows)
+            if preview_rows < PREVIEW_ROWS:
+                preview.append(rows.head(PREVIEW_ROWS - preview_rows))
+                preview_rows += len(preview[-1])
+            if export_path:
+                rows.to_csv(export_path, mode="w" if header else "a", header=header, index=False)
+                header = False
+        result = pd.concat(preview) if preview else pd.DataFrame()
+        return result, matched
+
+    def _execute_ranked(self, plan):
+        """Sorted or top-N rows, keeping only the best rows seen so far"""
+        key = plan.sort_column if plan.kind == "sort" else plan.metric
+        limit = OUT_OF_CORE_MAX_RESULT_ROWS if plan.kind == "sort" else plan.n
+        best = None
+        matched = 0
+        for rows in self._filtered_chunks(plan):
+            matched += len(rows)
+            candidate = rows if best is None else pd.concat([best, rows])
+            best = candidate.sort_values(key, ascending=plan.ascending, kind="stable").head(limit)
+        return (best if best is not None else pd.DataFrame()), matched
+
+    def _grouped_partials(self, plan, columns, agg):
+        partials = []
+        for rows in self._filtered_chunks(plan, columns):
+            if not rows.empty:
+                grouped = rows.groupby(plan.group, observed=True)[plan.metric]
+                partials.append(grouped.agg(["sum", "count"]) if agg == "mean" else grouped.agg(agg))
+        if not partials:
+            return pd.Series(dtype="float64")
+        combined = pd.concat(partials)
+        if agg == "mean":
+            totals = combined.groupby(level=0).sum()
+            return totals["sum"] / totals["count"]
+        # Partial sums and counts add up; partial minima and maxima reduce again
+        return combined.groupby(level=0).agg("sum" if agg in ("sum", "count") else agg)
+
+    def _distinct(self, plan, columns):
+        """Distinct (group, metric) pairs, deduplicated chunk by chunk; memory grows with distinct values only"""
+        keys = [col for col in (plan.group, plan.metric) if col]
+        seen = None
+        for rows in self._filtered_chunks(plan, columns):
+            rows = rows[keys].dropna(subset=[plan.metric]).drop_duplicates()
+            seen = rows if seen is None else pd.concat([seen, rows]).drop_duplicates()
+        return seen if seen is not None else pd.DataFrame(columns=keys)
+
+    def _execute_aggregate(self, plan, columns):
+        if plan.agg == "nunique":
+            distinct = self._distinct(plan, columns)
+            if plan.group:
+                return distinct.groupby(plan.group, observed=True)[plan.metric].nunique().sort_values(ascending=False).rename(f"nunique_{plan.metric}").reset_index()
+            return len(distinct)
+        if plan.agg == "median":
+            # Medians need every value; only the metric (and group) columns are kept, up to a cap
+            kept, held = [], 0
+            for rows in self._filtered_chunks(plan, columns):
+                held += len(rows)
+                if held > OUT_OF_CORE_MAX_RESULT_ROWS:
+                    raise ResultTooLarge(
+                        f"The median of {plan.metric} needs more than {OUT_OF_CORE_MAX_RESULT_ROWS:,} values in memory, which is over "
+                        "the limit for files this large. Try narrowing it with a filter, or ask for the average instead."
+                    )
+                kept.append(rows)
+            values = pd.concat(kept or [pd.DataFrame(columns=columns)])
+            if plan.group:
+                return values.groupby(plan.group, observed=True)[plan.metric].median().sort_values(ascending=False).rename(f"median_{plan.metric}").reset_index()
+            return values[plan.metric].median()
+
+        if plan.group:
+            result = self._grouped_partials(plan, columns, plan.agg)
+            return result.sort_values(ascending=False).rename(f"{plan.agg}_{plan.metric}").reset_index()
+
+        # Running reductions: one chunk of the metric column in memory at a time
+        total, count, low, high = 0, 0, None, None
+        for rows in self._filtered_chunks(plan, columns):
+            series = rows[plan.metric]
+            chunk_count = int(series.count())
+            if not chunk_count:
+                continue
+            total += series.sum()
+            count += chunk_count
+            low = series.min() if low is None else min(low, series.min())
+            high = series.max() if high is None else max(high, series.max())
+        if plan.agg == "sum":
+            return total
+        if plan.agg == "count":
+            return count
+        if not count:
+            return float("nan")
+        return {"mean": total / count, "min": low, "max": high}[plan.agg]
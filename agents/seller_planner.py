@@ -0,0 +1,317 @@
+import re
+import threading
+
+import pandas as pd
+
+# Rows shown in a chat reply; the full result is offered as a download
+PREVIEW_ROWS = 10
+
+_AGGREGATES = {
+    "total": "sum", "sum": "sum",
+    "average": "mean", "avg": "mean", "mean": "mean",
+    "max": "max", "maximum": "max", "highest": "max",
+    "min": "min", "minimum": "min", "lowest": "min",
+    "median": "median",
+    # Counting an entity column ("number of campaigns") means distinct values, not rows
+    "count": "nunique", "count of": "nunique", "number of": "nunique", "how many": "nunique",
+}
+_AGGREGATE_WORDS = "|".join(sorted((re.escape(word) for word in _AGGREGATES), key=len, reverse=True))
+
+_OPERATORS = {
+    "contains": "contains", "includes": "contains", "has": "contains", "like": "contains",
+    "does not contain": "not_contains", "doesn't contain": "not_contains", "not containing": "not_contains",
+    "is not": "!=", "!=": "!=", "not equal to": "!=",
+    "is": "==", "=": "==", "==": "==", "equals": "==", "equal to": "==",
+    ">=": ">=", "at least": ">=",
+    "<=": "<=", "at most": "<=",
+    ">": ">", "greater than": ">", "more than": ">", "above": ">", "over": ">", "higher than": ">",
+    "<": "<", "less than": "<", "fewer than": "<", "below": "<", "under": "<", "lower than": "<",
+}
+_OPERATOR_WORDS = "|".join(sorted((re.escape(op) for op in _OPERATORS), key=len, reverse=True))
+_NUMERIC_OPERATORS = {">", "<", ">=", "<="}
+
+_POLITE_PREFIX = re.compile(r"^(please\s+|can you\s+|could you\s+|would you\s+|i want to\s+|i'd like to\s+)+", re.I)
+_ROWS = r"(?:all\s+)?(?:the\s+)?(?:rows|records|entries|data|results|lines)?"
+_WHERE = r"(?:where|with|whose|that have|having|which have)"
+
+_FILTER_RE = re.compile(rf"^(?:show|list|find|filter|get|display|give me|return|select)?\s*(?:me\s+)?{_ROWS}\s*{_WHERE}\s+(?P<cond>.+)$", re.I)
+_FILTER_COLUMN_RE = re.compile(rf"^(?:show|list|find|filter|get|display|give me|return|select)\s+(?:me\s+)?{_ROWS}\s*(?:for\s+|by\s+)?(?P<cond>.+?\s+(?:{_OPERATOR_WORDS})\s+.+)$", re.I)
+_COUNT_RE = re.compile(rf"^(?:how many|count(?: of| the)?|number of)\s+{_ROWS}\s*(?:are there\s*)?(?:{_WHERE}\s+(?P<cond>.+?))?(?:\s+are there)?$", re.I)
+_AGGREGATE_RE = re.compile(
+    rf"^(?:what(?:'s| is| are)\s+)?(?:show\s+|get\s+|calculate\s+|compute\s+)?(?:the\s+)?(?P<agg>{_AGGREGATE_WORDS})\s+(?:of\s+)?(?:the\s+)?(?P<metric>.+?)"
+    rf"(?:\s+(?:by|per|for each|grouped by|across)\s+(?P<group>.+?))?(?:\s+{_WHERE}\s+(?P<cond>.+))?$",
+    re.I,
+)
+_TOP_RE = re.compile(
+    rf"^(?:show\s+|list\s+|get\s+|find\s+|what are\s+)?(?:me\s+)?(?:the\s+)?(?P<dir>top|bottom|highest|lowest)\s+(?P<n>\d+)\s+(?P<entity>.+?)\s+by\s+(?P<metric>.+?)"
+    rf"(?:\s+{_WHERE}\s+(?P<cond>.+))?$",
+    re.I,
+)
+_SORT_RE = re.compile(rf"^(?:sort|order)\s+{_ROWS}\s*by\s+(?P<col>.+?)(?:\s+(?:in\s+)?(?P<dir>asc|ascending|desc|descending)(?:\s+order)?)?$", re.I)
+# An operator with an optional leading "is"/"are", so "is greater than" reads as one operator
+_CONDITION_OP_RE = re.compile(rf"(?<!\S)(?:(?:is|are)\s+)?(?:{_OPERATOR_WORDS})(?!\S)", re.I)
+_QUOTED_RE = re.compile(r"(?<!\w)\"[^\"]*\"(?!\w)|(?<!\w)'[^']*'(?!\w)")
+_DISJUNCTION_RE = re.compile(r"\b(?:or|either|nor)\b", re.I)
+_AND_SPLIT_RE = re.compile(r"\s+and\s+(?=(?:[^\"']*[\"'][^\"']*[\"'])*[^\"']*$)", re.I)
+
+def _normalize_name(name) -> str:
+    return re.sub(r"[^a-z0-9%]+", " ", str(name).lower()).strip()
+
+def _singular(word: str) -> str:
+    return word[:-1] if word.endswith("s") and not word.endswith("ss") else word
+
+def _match_strings(series, predicate):
+    """Apply a string predicate; categoricals are tested once per category, not once per row"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        matched_categories = series.cat.categories[predicate(series.cat.categories.astype(str).to_series()).to_numpy()]
+        return series.isin(matched_categories)
+    return predicate(series.astype(str))
+
+class QueryPlan:
+    """A parsed seller question: row filters followed by at most one operation.
+
+    kind is one of "rows", "count", "aggregate", "top" or "sort".
+    """
+
+    def __init__(self, kind, filters=None, metric=None, agg=None, group=None, n=None, ascending=False, sort_column=None):
+        self.kind = kind
+        self.filters = filters or []
+        self.metric = metric
+        self.agg = agg
+        self.group = group
+        self.n = n
+        self.ascending = ascending
+        self.sort_column = sort_column
+
+    def mask(self, df, index=None):
+        """Boolean row mask for all filters, evaluated with vectorized pandas.
+
+        index is an optional TokenIndex built over df; "contains" filters on indexed
+        columns are then answered from its postings instead of scanning the strings.
+        """
+        mask = pd.Series(True, index=df.index)
+        for column, op, value in self.filters:
+            series = df[column]
+            if op in ("contains", "not_contains"):
+                indexed = index.contains(column, value) if index is not None and index.rows == len(df) else None
+                if indexed is not None:
+                    matched = pd.Series(indexed, index=df.index)
+                else:
+                    matched = _match_strings(series, lambda strings: strings.str.contains(str(value), case=False, regex=False, na=False))
+                mask &= ~matched if op == "not_contains" else matched
+            elif isinstance(value, str):
+                matched = _match_strings(series, lambda strings: strings.str.lower() == value.lower())
+                mask &= ~matched if op == "!=" else matched
+            elif op == "==":
+                mask &= series == value
+            elif op == "!=":
+                mask &= series != value
+            elif op == ">":
+                mask &= series > value
+            elif op == "<":
+                mask &= series < value
+            elif op == ">=":
+                mask &= series >= value
+            elif op == "<=":
+                mask &= series <= value
+        return mask
+
+    def execute(self, df, index=None):
+        """Run the plan; returns a DataFrame, Series or scalar"""
+        rows = df[self.mask(df, index)] if self.filters else df
+        if self.kind == "rows":
+            return rows
+        if self.kind == "count":
+            return len(rows)
+        if self.kind == "sort":
+            return rows.sort_values(self.sort_column, ascending=self.ascending)
+        if self.kind == "aggregate":
+            if self.group:
+                grouped = rows.groupby(self.group, observed=True)[self.metric]
+                return grouped.agg(self.agg).sort_values(ascending=False).rename(f"{self.agg}_{self.metric}").reset_index()
+            return rows[self.metric].agg(self.agg)
+        if self.kind == "top":
+            if self.group:
+                totals = rows.groupby(self.group, observed=True)[self.metric].sum()
+                picked = totals.nsmallest(self.n) if self.ascending else totals.nlargest(self.n)
+                return picked.rename(f"sum_{self.metric}").reset_index()
+            return rows.nsmallest(self.n, self.metric) if self.ascending else rows.nlargest(self.n, self.metric)
+        raise ValueError(f"Unknown plan kind: {self.kind}")
+
+    def describe(self) -> str:
+        parts = []
+        if self.filters:
+            parts.append(" and ".join(f"{col} {op} {value!r}" for col, op, value in self.filters))
+        if self.kind == "aggregate":
+            parts.insert(0, f"{'distinct count' if self.agg == 'nunique' else self.agg} of {self.metric}" + (f" by {self.group}" if self.group else ""))
+        elif self.kind == "top":
+            parts.insert(0, f"{'bottom' if self.ascending else 'top'} {self.n}" + (f" {self.group}" if self.group else " rows") + f" by {self.metric}")
+        elif self.kind == "sort":
+            parts.insert(0, f"sorted by {self.sort_column} ({'ascending' if self.ascending else 'descending'})")
+        elif self.kind == "count":
+            parts.insert(0, "row count")
+        return "; where ".join(parts) if parts else "all rows"
+
+    def format_response(self, result, total_rows: int, matched_rows: int = None) -> str:
+        """Chat reply for an executed plan; matched_rows overrides len(result) when only a preview was kept"""
+        header = f"⚡ Answered directly from your data ({self.describe()})."
+        if isinstance(result, pd.DataFrame):
+            if result.empty:
+                return f"{header}\n\nNo rows matched."
+            matched = matched_rows if matched_rows is not None and self.kind in ("rows", "sort") else len(result)
+            preview = result.head(PREVIEW_ROWS).to_string(index=False)
+            more = f"\n\nShowing the first {PREVIEW_ROWS} of {matched} rows." if matched > PREVIEW_ROWS else ""
+            if self.kind == "sort" and matched > len(result):
+                # Out-of-core sorts keep only the leading rows in memory
+                more += f"\n\n⚠️ The result was truncated: only the first {len(result):,} of {matched:,} sorted rows were kept, and the download contains just those."
+            total = f"{len(result)} groups" if self.group else f"{matched} of {total_rows} rows"
+            return f"{header}\n\nTotal: {total}.\n\n```\n{preview}\n```{more}"
+        if self.kind == "count":
+            return f"{header}\n\n{result} of {total_rows} rows match."
+        if self.agg == "nunique":
+            return f"{header}\n\nThere are {result} distinct {self.metric} values."
+        if isinstance(result, float):
+            result = f"{result:,.4f}".rstrip("0").rstrip(".")
+        return f"{header}\n\nThe {self.agg} of {self.metric} is {result}."
+
+class QueryPlanner:
+    """Recognises common filter, sort, group-by, top-N and count questions against real columns.
+
+    plan() returns None whenever any part of the question cannot be mapped with
+    confidence, so the caller falls back to the LLM agent.
+    """
+
+    def __init__(self, df):
+        self.columns = list(df.columns)
+        self.numeric = {col for col in self.columns if pd.api.types.is_numeric_dtype(df[col])}
+        self._by_name = {}
+        for col in self.columns:
+            self._by_name.setdefault(_normalize_name(col), col)
+
+    def resolve_column(self, phrase: str):
+        """Map a phrase from the question to exactly one column, or None"""
+        name = _normalize_name(re.sub(r"^(?:the|a|an)\s+", "", phrase.strip(), flags=re.I))
+        if not name:
+            return None
+        if name in self._by_name:
+            return self._by_name[name]
+        singular = " ".join(_singular(word) for word in name.split())
+        matches = [col for key, col in self._by_name.items() if " ".join(_singular(word) for word in key.split()) == singular]
+        if len(matches) == 1:
+            return matches[0]
+        # "campaign" -> "Campaign Name" when exactly one column starts with the phrase
+        matches = [col for key, col in self._by_name.items() if key.startswith(singular + " ") or key.startswith(name + " ")]
+        return matches[0] if len(matches) == 1 else None
+
+    def _parse_value(self, column, op, raw: str):
+        value = raw.strip().strip(".,;")
+        quoted = len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'"
+        if quoted:
+            value = value[1:-1]
+        if column in self.numeric and op not in ("contains", "not_contains"):
+            try:
+                return float(value.replace(",", "").replace("$", "").rstrip("%"))
+            except ValueError:
+                return None
+        if op in _NUMERIC_OPERATORS:
+            return None
+        return value
+
+    def _parse_conditions(self, text):
+        if not text:
+            return []
+        filters = []
+        for clause in _AND_SPLIT_RE.split(text.strip()):
+            clause = clause.strip()
+            # Operator words and "or" inside quoted values are part of the value
+            masked = _QUOTED_RE.sub(lambda quoted: "_" * len(quoted.group()), clause)
+            operators = list(_CONDITION_OP_RE.finditer(masked))
+            # Disjunctions ("a or b") and stacked operators ("is like", "over under") are
+            # not plain single-column conditions; guessing one reading would answer wrongly
+            if _DISJUNCTION_RE.search(masked) or len(operators) != 1:
+                return None
+            operator = operators[0]
+            column = self.resolve_column(clause[:operator.start()])
+            if column is None:
+                return None
+            words = " ".join(operator.group().lower().split())
+            op = _OPERATORS.get(words) or _OPERATORS.get(re.sub(r"^(?:is|are) ", "", words))
+            if op is None:
+                return None
+            value = self._parse_value(column, op, clause[operator.end():])
+            if value is None or value == "":
+                return None
+            filters.append((column, op, value))
+        return filters
+
+    def plan(self, question: str):
+        """Return a QueryPlan for the question, or None to defer to the LLM"""
+        text = _POLITE_PREFIX.sub("", question.strip()).rstrip("?.! ").strip()
+        if not text:
+            return None
+
+        match = _TOP_RE.match(text)
+        if match:
+            metric = self.resolve_column(match.group("metric"))
+            filters = self._parse_conditions(match.group("cond"))
+            if metric not in self.numeric or filters is None:
+                return None
+            entity = match.group("entity")
+            group = None
+            if not re.fullmatch(_ROWS, entity.strip(), re.I):
+                group = self.resolve_column(entity)
+                if group is None:
+                    return None
+            ascending = match.group("dir").lower() in ("bottom", "lowest")
+            return QueryPlan("top", filters, metric=metric, group=group, n=int(match.group("n")), ascending=ascending)
+
+        match = _COUNT_RE.match(text)
+        if match:
+            filters = self._parse_conditions(match.group("cond"))
+            return QueryPlan("count", filters) if filters is not None else None
+
+        match = _AGGREGATE_RE.match(text)
+        if match:
+            agg = _AGGREGATES[match.group("agg").lower()]
+            metric = self.resolve_column(match.group("metric"))
+            filters = self._parse_conditions(match.group("cond"))
+            # Counts of a numeric column ("number of units") are ambiguous between a sum and
+            # distinct values, and other aggregates need numbers; both go to the LLM
+            if metric is None or filters is None or (agg == "nunique") == (metric in self.numeric):
+                return None
+            group = None
+            if match.group("group"):
+                group = self.resolve_column(match.group("group"))
+                if group is None:
+                    return None
+            return QueryPlan("aggregate", filters, metric=metric, agg=agg, group=group)
+
+        match = _SORT_RE.match(text)
+        if match:
+            column = self.resolve_column(match.group("col"))
+            if column is None:
+                return None
+            ascending = (match.group("dir") or "asc").lower().startswith("asc")
+            return QueryPlan("sort", sort_column=column, ascending=ascending)
+
+        match = _FILTER_RE.match(text) or _FILTER_COLUMN_RE.match(text)
+        if match:
+            filters = self._parse_conditions(match.group("cond"))
+            return QueryPlan("rows", filters) if filters else None
+
+        return None
+
+_stats_lock = threading.Lock()
+fast_path_stats = {"fast_path": 0, "llm_fallback": 0, "fast_path_errors": 0}
+
+def record_fast_path(outcome: str):
+    with _stats_lock:
+        fast_path_stats[outcome] += 1
+
+def get_fast_path_stats():
+    """Counters and the fraction of SellerAgent queries answered without the LLM"""
+    with _stats_lock:
+        stats = dict(fast_path_stats)
+    total = stats["fast_path"] + stats["llm_fallback"] + stats["fast_path_errors"]
+    stats["fast_path_fraction"] = stats["fast_path"] / total if total else 0.0
+    return stats
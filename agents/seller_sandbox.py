@@ -0,0 +1,36 @@
+import os
+from typing import Any, Optional
+
+from langchain_experimental.tools.python.tool import PythonAstREPLTool
+
+from utils.sandbox import sandbox_pool
+from utils.tracing import span
+
+# Run the pandas agent's generated code in sandbox worker processes instead of the server
+SELLER_SANDBOX = os.getenv("SELLER_SANDBOX", "1") == "1"
+
+class SandboxedREPLTool(PythonAstREPLTool):
+    """python_repl_ast with the same name, prompt and input handling, but executed in a sandbox worker.
+
+    `locals` only receives the _FILTERED_RESULT_ the code assigned, so SellerAgent
+    reads it exactly as it would from the in-process tool.
+    """
+
+    source: str
+    session_key: str
+    pool: Any = None
+
+    def _run(self, query: str, run_manager: Optional[Any] = None) -> str:
+        with span("repl", sandboxed=True):
+            output, filtered = (self.pool or sandbox_pool).run(self.session_key, self.source, query)
+        if filtered is not None:
+            self.locals["_FILTERED_RESULT_"] = filtered
+        return output
+
+def sandbox_agent(agent_executor, source: str, session_key: str, pool=None) -> bool:
+    """Swap the executor's python_repl_ast for the sandboxed tool; returns False if it has none"""
+    for i, tool in enumerate(agent_executor.tools):
+        if tool.name == "python_repl_ast":
+            agent_executor.tools[i] = SandboxedREPLTool(source=source, session_key=session_key, pool=pool)
+            return True
+    return False
@@ -0,0 +1,197 @@
+"""Headless batch mode: answer a JSONL file of questions with one of the chat agents.
+
+Usage:
+    python batch.py --agent seller --file report.csv --input questions.jsonl --output answers.jsonl [--workers 4]
+    python batch.py --agent pdf --file policy.pdf --input questions.jsonl --output answers.jsonl
+    python batch.py --agent general --input questions.jsonl --output answers.jsonl
+
+Each input line is {"id": ..., "question": ...}; without an id the line number is used.
+The document is stored and indexed once (reusing the columnar cache or vector index of
+an identical earlier upload), then questions are answered by a pool of workers. Each
+result is appended to the output as soon as it completes, as
+{"id", "question", "answer", "cached", "seconds", "error"}. Answers go through the same
+semantic answer cache, request coalescing and per-provider rate limits as the web app,
+and workers pause while a provider's circuit breaker is open. The CSV is loaded once;
+each worker gets a SellerAgent.clone() sharing its frame, planner and token index with
+a pandas agent of its own, because the agent's REPL keeps per-question state.
+
+Rerunning with the same output file resumes an interrupted run: ids that already have an
+answer are skipped and ids that failed are asked again.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from database.semantic_cache import normalize_query
+from database.upload_store import store_upload
+from database.write_behind import conversation_writer
+from agents.registry import create_agent
+from utils import llm_gateway
+from utils.concurrency import run_blocking
+from utils.single_flight import query_flights
+from utils.tracing import span
+
+# --agent choices -> agent registry names
+AGENTS = {
+    "seller": "Seller Queries",
+    "pdf": "PDF Queries",
+    "general": "Amazon Ads Queries",
+    "code": "Code Generation",
+}
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 4))
+CACHED_PREFIX = "🧠 (From memory) "
+ERROR_PREFIX = "❌"
+
+def read_questions(path: str):
+    """(id, question) pairs from a JSONL file; blank and malformed lines are reported and skipped"""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                question = record.get("question") or record.get("query")
+            except (ValueError, AttributeError) as e:
+                print(f"Skipping line {line_number} of {path}: {e}")
+                continue
+            if not question:
+                print(f"Skipping line {line_number} of {path}: no question")
+                continue
+            questions.append((str(record.get("id", line_number)), question))
+    return questions
+
+def completed_ids(path: str):
+    """Ids already answered in an earlier run's output; a line cut off mid-write is removed"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    done = set()
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("error") is None:
+            done.add(str(record.get("id")))
+    return done
+
+def load_agent(agent: str, file_path: str = None):
+    """Store and index the batch's document once; returns a callable creating each worker's agent, or None.
+
+    Seller workers get clones of one loaded agent, PDF retrieval has no per-question state
+    so one agent serves every worker, and general and code questions get an agent per question.
+    """
+    name = AGENTS[agent]
+    if agent in ("seller", "pdf"):
+        if not file_path:
+            raise SystemExit(f"--file is required for the {agent} agent")
+        filename = os.path.basename(file_path)
+        with open(file_path, "rb") as f:
+            doc_hash, stored_path, _ = store_upload(f.read(), filename)
+        if agent == "seller":
+            seller_agent = create_agent(name, csv_path=stored_path, doc_hash=doc_hash, filename=filename)
+            unused = [seller_agent]
+            return lambda: unused.pop() if unused else seller_agent.clone()
+        pdf_agent = create_agent(name, pdf_path=stored_path, doc_hash=doc_hash, filename=filename)
+        if not pdf_agent.ingested.is_set():
+            print(f"Indexing {filename}...")
+            pdf_agent.ingested.wait()
+        if pdf_agent.ingestion_error is not None:
+            raise SystemExit(f"Error processing PDF: {pdf_agent.ingestion_error}")
+        return lambda: pdf_agent
+    return None
+
+async def wait_for_providers():
+    """Hold new questions while a provider is refusing calls, instead of failing them all"""
+    while any(stats["circuit"] == "open" for stats in llm_gateway.get_stats().values()):
+        await asyncio.sleep(1)
+
+async def answer(agent_name: str, worker_agent, question: str):
+    # Batch questions are independent, so general and code questions each get a
+    # fresh agent with throwaway memory; their cache lookups then behave as standalone
+    agent = worker_agent or create_agent(AGENTS[agent_name], persist_memory=False)
+    # Same coalescing key as the chat callback, without the session's memory state
+    key = (type(agent).__name__, getattr(agent, "doc_hash", None), normalize_query(question))
+    with span("batch", agent=type(agent).__name__):
+        return await query_flights.run(key, lambda: agent.aquery(question))
+
+async def run_batch(agent_name: str, make_agent, questions, output_path: str, workers: int = BATCH_WORKERS):
+    """Answer questions with a pool of workers, appending each result to output_path as it completes"""
+    queue = asyncio.Queue()
+    for item in questions:
+        queue.put_nowait(item)
+    totals = {"answered": 0, "cached": 0, "errors": 0}
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def worker():
+            worker_agent = await run_blocking(make_agent) if make_agent else None
+            while True:
+                try:
+                    question_id, question = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await wait_for_providers()
+                started = time.perf_counter()
+                try:
+                    result = await answer(agent_name, worker_agent, question)
+                    error = result if result.startswith(ERROR_PREFIX) else None
+                except Exception as e:
+                    result, error = None, str(e)
+                cached = bool(result) and result.startswith(CACHED_PREFIX)
+                record = {
+                    "id": question_id,
+                    "question": question,
+                    "answer": None if error else result[len(CACHED_PREFIX):] if cached else result,
+                    "cached": cached,
+                    "seconds": round(time.perf_counter() - started, 3),
+                    "error": error,
+                }
+                # One complete line per result, so an interrupted run loses at most the answers in flight
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                totals["answered"] += 1
+                totals["cached"] += cached
+                totals["errors"] += error is not None
+                if totals["answered"] % 10 == 0 or totals["answered"] == len(questions):
+                    print(f"{totals['answered']}/{len(questions)} answered ({totals['cached']} from cache, {totals['errors']} failed)")
+
+        await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions without the web UI")
+    parser.add_argument("--agent", choices=sorted(AGENTS), required=True)
+    parser.add_argument("--file", help="CSV for the seller agent or PDF for the pdf agent")
+    parser.add_argument("--input", required=True, help="JSONL file with one {\"id\", \"question\"} object per line")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to; rerun with it to resume")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    questions = read_questions(args.input)
+    done = completed_ids(args.output)
+    remaining = [(question_id, question) for question_id, question in questions if question_id not in done]
+    if done:
+        print(f"Resuming: {len(questions) - len(remaining)} of {len(questions)} question(s) already answered.")
+    if not remaining:
+        return
+
+    make_agent = load_agent(args.agent, args.file)
+    started = time.perf_counter()
+    totals = asyncio.run(run_batch(args.agent, make_agent, remaining, args.output, args.workers))
+    elapsed = time.perf_counter() - started
+    # Cached answers are written behind; make sure they reach the database before exiting
+    conversation_writer.flush(timeout=30)
+    print(f"Answered {totals['answered']} question(s) in {elapsed:.1f}s ({totals['answered'] / elapsed:.1f}/s), "
+          f"{totals['cached']} from cache, {totals['errors']} failed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""End-to-end benchmark: every agent and main.chat_callback under concurrent simulated users, offline.
+
+Usage:
+    python benchmarks/end_to_end.py [--scenarios seller pdf general code chat] [--csv-rows 10000 100000 1000000]
+        [--pdf-pages 300] [--users 4] [--queries 20] [--llm-latency-ms 200]
+        [--baseline benchmarks/baseline.json] [--save-baseline] [--tolerance 0.15] [--output results.json]
+
+LLM_BACKEND and EMBEDDING_BACKEND are set to "fake": answers come from the gateway's
+deterministic stand-in (fixed latency, one scripted python_repl_ast step for the pandas
+agent) and embeddings from word hashing, so runs need no network, API keys or model
+downloads. Everything runs in a temporary working directory, so the database, uploads
+and vector indexes never touch the real ones.
+
+Each scenario reports p50/p95 latency (and time to first chunk for streamed answers),
+queries per second and the process's peak RSS (not on Windows), and is compared with the baseline file;
+the script exits with status 1 if any scenario regressed by more than --tolerance.
+Peak RSS covers this process only, not sandbox or PDF parsing workers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: results are reported without the process peak RSS
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import ADJECTIVES, CATEGORIES, MARKETPLACES, TOPICS, write_pdf, write_report_csv  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Planner-friendly questions plus open-ended ones that fall back to the pandas agent
+SELLER_QUESTIONS = [
+    "top {n} title by revenue",
+    "show rows where category is {category}",
+    "count rows where marketplace is {marketplace}",
+    "show rows where title contains {adjective}",
+    "average units by category",
+    "total revenue by marketplace",
+    "which {adjective} products look seasonal and why?",
+]
+PDF_QUESTIONS = [
+    "What does the document say about {topic}?",
+    "How does the {adjective} {topic} affect sellers on {marketplace}?",
+    "Summarize the guidance on {topic} and {other}.",
+]
+GENERAL_QUESTIONS = [
+    "How should I set bids for a {adjective} {topic} campaign?",
+    "What is a good budget for {category} ads on {marketplace}?",
+]
+CODE_QUESTIONS = [
+    "Write a Python function that reports {topic} by {other}.",
+    "Write a SQL query for {category} {topic} totals.",
+]
+
+def make_question(templates, user: int, i: int, seed: int) -> str:
+    """Deterministic question for one user's i-th turn; repeats across users hit the answer cache"""
+    import numpy as np
+    rng = np.random.default_rng((seed, user, i))
+    topic, other = rng.choice(TOPICS, 2, replace=False)
+    return templates[rng.integers(len(templates))].format(
+        n=int(rng.integers(3, 20)),
+        category=rng.choice(CATEGORIES),
+        marketplace=rng.choice(MARKETPLACES),
+        adjective=rng.choice(ADJECTIVES),
+        topic=topic,
+        other=other,
+    )
+
+def peak_rss_mb():
+    """Peak RSS of this process in MB, or None where the resource module is unavailable"""
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+async def drive_users(users: int, queries: int, ask):
+    """Run `users` concurrent loops of `queries` asks; ask(user, i) is an async iterator of answer chunks"""
+    latencies, first_chunks = [], []
+
+    async def user_loop(user):
+        for i in range(queries):
+            started = time.perf_counter()
+            first = None
+            async for _ in ask(user, i):
+                if first is None:
+                    first = time.perf_counter() - started
+            latencies.append(time.perf_counter() - started)
+            first_chunks.append(first if first is not None else latencies[-1])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_loop(user) for user in range(users)))
+    return latencies, first_chunks, time.perf_counter() - started
+
+def summarize(latencies, first_chunks, wall_seconds, **extra):
+    return {
+        "queries": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "first_chunk_p50_ms": statistics.median(first_chunks) * 1000,
+        "qps": len(latencies) / wall_seconds if wall_seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+def once(agent, question):
+    """Adapt aquery to the chunk-iterator shape drive_users expects"""
+    async def single():
+        yield await agent.aquery(question)
+    return single()
+
+async def seller_scenario(rows: int, args):
+    from agents.seller_agent import SellerAgent
+
+    path = write_report_csv(os.path.join(args.workdir, f"report_{rows}.csv"), rows)
+    started = time.perf_counter()
+    # One agent per user, as separate sessions would have; identical files share the columnar cache
+    agents = [SellerAgent(csv_path=path, filename=os.path.basename(path)) for _ in range(args.users)]
+    for agent in agents:
+        if agent.token_index is not None:
+            agent.token_index.ready.wait()
+    setup = time.perf_counter() - started
+
+    def ask(user, i):
+        return once(agents[user], make_question(SELLER_QUESTIONS, user, i, args.seed))
+
+    result = summarize(*await drive_users(args.users, args.queries, ask), setup_seconds=setup, rows=rows)
+    for agent in agents:
+        agent.release()
+    return result
+
+async def pdf_scenario(args):
+    from agents.pdf_agent import PDFQueryAgent
+
+    path = write_pdf(os.path.join(args.workdir, f"document_{args.pdf_pages}.pdf"), args.pdf_pages)
+    started = time.perf_counter()
+    agent = PDFQueryAgent(path)
+    await asyncio.get_running_loop().run_in_executor(None, agent.ingested.wait)
+    setup = time.perf_counter() - started
+    if agent.ingestion_error is not None:
+        raise agent.ingestion_error
+
+    def ask(user, i):
+        return agent.astream(make_question(PDF_QUESTIONS, user, i, args.seed))
+
+    return summarize(*await drive_users(args.users, args.queries, ask), setup_seconds=setup, pages=args.pdf_pages,
+                     pages_per_second=args.pdf_pages / setup if setup else 0.0)
+
+class _Transcript:
+    """Receives the greeting GeneralAgent posts to its chat interface"""
+
+    def send(self, *args, **kwargs):
+        pass
+
+async def general_scenario(args):
+    from agents.general_agent import GeneralAgent
+
+    agent = GeneralAgent(_Transcript())
+
+    def ask(user, i):
+        return agent.astream(make_question(GENERAL_QUESTIONS, user, i, args.seed))
+
+    return summarize(*await drive_users(args.users, args.queries, ask))
+
+async def code_scenario(args):
+    from agents.code_agent import DHI_CodeBot
+
+    agent = DHI_CodeBot()
+
+    def ask(user, i):
+        return agent.astream(make_question(CODE_QUESTIONS, user, i, args.seed))
+
+    return summarize(*await drive_users(args.users, args.queries, ask))
+
+async def chat_scenario(args):
+    """main.chat_callback with a seller report; simulated users share the script's chat session"""
+    import main
+    from agents.seller_agent import SellerAgent
+    from utils.single_flight import query_flights
+
+    path = write_report_csv(os.path.join(args.workdir, f"chat_report_{args.chat_rows}.csv"), args.chat_rows)
+    main.agent_pool.set_agent(main.session_id, "Seller Queries", SellerAgent(csv_path=path, filename=os.path.basename(path)))
+    coalesced = query_flights.stats["coalesced"]
+
+    def ask(user, i):
+        return main.chat_callback(make_question(SELLER_QUESTIONS, user, i, args.seed), "User", main.chat_interface)
+
+    return summarize(*await drive_users(args.users, args.queries, ask), rows=args.chat_rows,
+                     coalesced=query_flights.stats["coalesced"] - coalesced)
+
+async def run_scenarios(args):
+    jobs = []
+    for name in args.scenarios:
+        if name == "seller":
+            jobs += [(f"seller_{rows}", lambda rows=rows: seller_scenario(rows, args)) for rows in args.csv_rows]
+        else:
+            scenario = {"pdf": pdf_scenario, "general": general_scenario, "code": code_scenario, "chat": chat_scenario}[name]
+            jobs.append((name, lambda scenario=scenario: scenario(args)))
+
+    results = {}
+    for label, job in jobs:
+        print(f"running {label}...", flush=True)
+        try:
+            results[label] = await job()
+        except Exception as e:
+            print(f"{label} failed: {type(e).__name__}: {e}")
+    return results
+
+# Metrics compared with the baseline and whether a larger value is better
+COMPARED = {"p50_ms": False, "p95_ms": False, "first_chunk_p50_ms": False, "qps": True, "peak_rss_mb": False}
+
+def compare(results, baseline, tolerance: float):
+    """Print each metric next to its baseline value; returns the regressions found"""
+    regressions = []
+    print(f"\n{'scenario':<20} {'metric':<20} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<20} (not in baseline)")
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            if regressed:
+                regressions.append((name, metric))
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<20} {metric:<20} {old:>12.1f} {new:>12.1f} {change:>+8.0%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="*", default=["seller", "pdf", "general", "code", "chat"],
+                        choices=["seller", "pdf", "general", "code", "chat"])
+    parser.add_argument("--csv-rows", nargs="*", type=int, default=[10_000, 100_000, 1_000_000],
+                        help="report sizes for the seller scenario, e.g. add 5000000 for the largest case")
+    parser.add_argument("--chat-rows", type=int, default=100_000)
+    parser.add_argument("--pdf-pages", type=int, default=300)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=20, help="questions asked by each simulated user")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative change counted as a regression")
+    parser.add_argument("--output", help="also write this run's results as JSON")
+    args = parser.parse_args()
+
+    # Must be set before any project module is imported
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "EMBEDDING_BACKEND": "fake",
+        "LLM_FAKE_LATENCY_MS": str(args.llm_latency_ms),
+        "METRICS_PORT": "0",
+        "EMBEDDING_WARMUP": "0",
+    })
+    config = {key: getattr(args, key) for key in ("users", "queries", "llm_latency_ms", "pdf_pages", "chat_rows", "seed")}
+    config.update(python=platform.python_version(), machine=platform.machine(), cpus=os.cpu_count())
+
+    with tempfile.TemporaryDirectory(prefix="chatbot-bench-") as workdir:
+        args.workdir = workdir
+        previous_cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            results = asyncio.run(run_scenarios(args))
+        finally:
+            os.chdir(previous_cwd)
+
+    print(f"\n{'scenario':<20} {'p50 (ms)':>10} {'p95 (ms)':>10} {'first (ms)':>11} {'qps':>8} {'peak RSS (MB)':>14} {'setup (s)':>10}")
+    for name, result in results.items():
+        setup = f"{result['setup_seconds']:.2f}" if "setup_seconds" in result else "-"
+        peak_rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+        print(f"{name:<20} {result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f} {result['first_chunk_p50_ms']:>11.1f} "
+              f"{result['qps']:>8.1f} {peak_rss:>14} {setup:>10}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": config, "scenarios": results}, f, indent=2)
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}) != config:
+            print("\nNote: the baseline was recorded with different settings or on another machine; compare with care.")
+        regressions = compare(results, baseline.get("scenarios", {}), args.tolerance)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"config": config, "scenarios": results}, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    if regressions and not args.save_baseline:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Keyword filter benchmark: per-query string scans vs the SellerAgent token index.
+
+Usage:
+    python benchmarks/keyword_filter.py [--rows 1000000] [--runs 5] [--terms wireless "usb c" kit]
+
+Builds a synthetic seller report, then times the old path (str.contains over every
+text column for every term) against TokenIndex.search on the same typed DataFrame,
+checking that both return the same rows.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.seller_index import build_token_index, is_text_column  # noqa: E402
+from utils.dataframe_loader import optimize_dtypes  # noqa: E402
+from synthetic import make_report  # noqa: E402
+
+def scan_filter(df, terms):
+    """The pre-index keyword path: every term against every text column, row by row"""
+    string_cols = [col for col in df.columns if is_text_column(df[col])]
+    condition = pd.Series(False, index=df.index)
+    for term in terms:
+        for col in string_cols:
+            condition = condition | df[col].astype(str).str.contains(term, case=False, regex=False, na=False)
+    return condition.to_numpy()
+
+def timed(func, runs):
+    samples = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--terms", nargs="*", default=["wireless", "usb c", "kit", "SKU-0000123", "amazon.de"])
+    args = parser.parse_args()
+
+    df = optimize_dtypes(make_report(args.rows))
+    print(f"{len(df):,} rows, text columns: {[col for col in df.columns if is_text_column(df[col])]}")
+
+    started = time.perf_counter()
+    index = build_token_index(df, background=False)
+    build_seconds = time.perf_counter() - started
+    print(f"index build: {build_seconds:.2f}s, {index.memory_usage() / 1024 / 1024:.1f} MB")
+
+    print(f"\n{'terms':<24} {'scan (ms)':>12} {'index (ms)':>12} {'speedup':>9} {'rows':>10}")
+    for terms in [[term] for term in args.terms] + [args.terms]:
+        scan_seconds, expected = timed(lambda: scan_filter(df, terms), args.runs)
+        index_seconds, got = timed(lambda: index.search(terms), args.runs)
+        if not np.array_equal(expected, got):
+            print(f"MISMATCH for {terms}: scan {expected.sum()} rows, index {got.sum()} rows")
+        label = " + ".join(terms) if len(terms) < 3 else f"all {len(terms)} terms"
+        print(f"{label:<24} {scan_seconds * 1000:>12.1f} {index_seconds * 1000:>12.1f} {scan_seconds / index_seconds:>8.0f}x {int(got.sum()):>10,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Startup benchmark: per-module import cost and time until main.py reaches layout.servable().
+
+Usage:
+    python benchmarks/startup.py [--runs 3] [--modules agents.pdf_agent ...]
+
+Each measurement runs in a fresh interpreter so nothing is already cached in sys.modules.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = [
+    "panel",
+    "sqlalchemy",
+    "pandas",
+    "langchain",
+    "chromadb",
+    "sentence_transformers",
+    "langchain_experimental",
+    "database.models",
+    "ui.components",
+    "agents.registry",
+    "agents.general_agent",
+    "agents.seller_agent",
+    "agents.pdf_agent",
+    "agents.code_agent",
+]
+
+# Executes main.py the way `panel serve` would, stopping the clock once servable() returns
+RENDER_SNIPPET = """
+import time
+started = time.perf_counter()
+import panel as pn
+_servable = pn.layout.Column.servable
+marks = {}
+def servable(self, *args, **kwargs):
+    marks["servable"] = time.perf_counter() - started
+    return _servable(self, *args, **kwargs)
+pn.layout.Column.servable = servable
+import runpy
+runpy.run_path("main.py", run_name="__main__")
+print(f"SERVABLE {marks.get('servable', float('nan')):.6f}")
+"""
+
+def measure_import(module: str):
+    """Return the cumulative import time of a module in seconds, or None if it failed"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        return None
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    pattern = re.compile(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*" + re.escape(module) + r"\s*$")
+    for line in proc.stderr.splitlines():
+        match = pattern.match(line)
+        if match:
+            return int(match.group(1)) / 1e6
+    return None
+
+def measure_render():
+    """Return seconds from interpreter start of main.py until layout.servable()"""
+    proc = subprocess.run([sys.executable, "-c", RENDER_SNIPPET], cwd=ROOT, capture_output=True, text=True)
+    match = re.search(r"SERVABLE ([\d.]+)", proc.stdout)
+    if not match:
+        print(proc.stderr[-2000:], file=sys.stderr)
+        return None
+    return float(match.group(1))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modules", nargs="*", default=DEFAULT_MODULES)
+    args = parser.parse_args()
+
+    print(f"{'module':<28} {'median import (ms)':>20}")
+    for module in args.modules:
+        samples = [measure_import(module) for _ in range(args.runs)]
+        samples = [sample for sample in samples if sample is not None]
+        value = f"{statistics.median(samples) * 1000:.1f}" if samples else "unavailable"
+        print(f"{module:<28} {value:>20}")
+
+    samples = [measure_render() for _ in range(args.runs)]
+    samples = [sample for sample in samples if sample is not None]
+    value = f"{statistics.median(samples) * 1000:.1f} ms" if samples else "unavailable"
+    print(f"\ntime to layout.servable(): {value}")
+
+if __name__ == "__main__":
+    main()
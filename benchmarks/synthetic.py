@@ -0,0 +1,68 @@
+"""Synthetic seller reports and PDFs shared by the benchmark scripts."""
+import numpy as np
+import pandas as pd
+
+ADJECTIVES = ["wireless", "portable", "organic", "premium", "compact", "waterproof", "smart", "classic", "ergonomic", "stainless"]
+NOUNS = ["headphones", "charger", "blender", "backpack", "lamp", "keyboard", "bottle", "speaker", "usb c cable", "yoga mat", "phone case", "desk kit"]
+CATEGORIES = ["Electronics", "Home & Kitchen", "Sports", "Office", "Beauty", "Toys", "Grocery", "Garden"]
+MARKETPLACES = ["amazon.com", "amazon.co.uk", "amazon.de", "amazon.in", "amazon.ca"]
+TOPICS = ["campaign", "keyword", "bid", "budget", "impression", "click", "conversion", "placement", "audience", "listing", "inventory", "refund"]
+VERBS = ["increases", "reduces", "tracks", "controls", "affects", "explains", "limits", "improves"]
+
+def make_report(rows: int, seed: int = 7) -> pd.DataFrame:
+    """A seller report with a few low-cardinality and one high-cardinality text column"""
+    rng = np.random.default_rng(seed)
+    titles = np.array([f"{adj.title()} {noun.title()} {size}" for adj in ADJECTIVES for noun in NOUNS for size in ("S", "M", "L", "XL", "Pro")])
+    return pd.DataFrame({
+        "sku": [f"SKU-{i:08d}" for i in rng.integers(0, rows, rows)],
+        "title": titles[rng.integers(0, len(titles), rows)],
+        "category": np.array(CATEGORIES)[rng.integers(0, len(CATEGORIES), rows)],
+        "marketplace": np.array(MARKETPLACES)[rng.integers(0, len(MARKETPLACES), rows)],
+        "units": rng.integers(0, 500, rows),
+        "revenue": rng.gamma(2.0, 40.0, rows).round(2),
+    })
+
+def write_report_csv(path: str, rows: int, chunk_rows: int = 250_000, seed: int = 7) -> str:
+    """Write a report of any size to CSV in chunks so 5M-row files never sit in memory at once"""
+    for i, start in enumerate(range(0, rows, chunk_rows)):
+        chunk = make_report(min(chunk_rows, rows - start), seed=seed + i)
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
+
+def _sentence(rng) -> str:
+    topic, other = rng.choice(TOPICS, 2, replace=False)
+    return f"The {rng.choice(ADJECTIVES)} {topic} {rng.choice(VERBS)} the {other} for {rng.choice(NOUNS)} sellers on {rng.choice(MARKETPLACES)}."
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 7) -> str:
+    """Write a text-only PDF with one generated paragraph per line, without any PDF library"""
+    rng = np.random.default_rng(seed)
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    objects = {3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for page in range(pages):
+        page_id, content_id = 4 + 2 * page, 5 + 2 * page
+        lines = [f"Page {page + 1}."] + [_sentence(rng) for _ in range(lines_per_page - 1)]
+        text = "\n".join(f"({_escape(line)}) '" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td\n{text}\nET".encode("latin-1")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(b"%d 0 R" % page_id)
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for number in sorted(objects):
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, objects[number]))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for number in sorted(objects):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return path
@@ -1,3 +1,9 @@
-from .models import Base, engine, SessionLocal, session, Conversation
+from .models import Base, engine, SessionLocal, session_scope, conversation_lookup_hash, Conversation, VectorIndex, Blob, Artifact, ConversationMemoryRecord
+from .write_behind import WriteBehindQueue, conversation_writer
+from .semantic_cache import SemanticCache, answer_cache, normalize_query
+from .conversation_memory import ConversationMemory
+from .upload_store import store_upload, record_artifact, get_artifact, list_artifacts
+from .vector_store import DocumentIngestion, open_document_index, register_document_index, garbage_collect_indexes
+from .maintenance import compact_database, start_compaction
 
-__all__ = ['Base', 'engine', 'SessionLocal', 'session', 'Conversation']
\ No newline at end of file
+__all__ = ['Base', 'engine', 'SessionLocal', 'session_scope', 'conversation_lookup_hash', 'Conversation', 'VectorIndex', 'Blob', 'Artifact', 'ConversationMemoryRecord', 'ConversationMemory', 'WriteBehindQueue', 'conversation_writer', 'SemanticCache', 'answer_cache', 'normalize_query', 'store_upload', 'record_artifact', 'get_artifact', 'list_artifacts', 'DocumentIngestion', 'open_document_index', 'register_document_index', 'garbage_collect_indexes', 'compact_database', 'start_compaction']
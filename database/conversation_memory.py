@@ -0,0 +1,208 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import session_scope, ConversationMemoryRecord
+
+# Tokens of verbatim recent turns sent with each question; older turns are summarized
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", 1500))
+# Upper bound on the rolling summary of older turns
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", 300))
+
+SUMMARY_PROMPT = """Progressively summarize the conversation below, adding onto the previous summary.
+Keep the user's goals, the products, campaigns, numbers and decisions mentioned, and drop small talk.
+Reply with the new summary only, in at most {words} words.
+
+Previous summary:
+{summary}
+
+New lines of conversation:
+{lines}"""
+
+# Words that point back at earlier turns ("why is that?", "now add type hints", "do the same for video ads")
+_REFERENCES = re.compile(
+    r"^\s*(?:and|or|but|so|then|now|also|ok(?:ay)?|what about|how about|why)\b"
+    r"|\b(?:it|its|this|these|those|they|them|their|above|previous(?:ly)?|earlier|again|same|instead|else|another|the one|the other)\b"
+    r"|^\s*that\b|\bthat\s*[?.!]*\s*$"
+)
+
+def refers_to_context(question: str) -> bool:
+    """True for follow-ups whose answer depends on earlier turns: short fragments or questions with back-references"""
+    return len(question.split()) < 4 or bool(_REFERENCES.search(question.lower()))
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), enough to keep the window bounded"""
+    return len(text) // 4 + 1
+
+class ConversationMemory:
+    """Bounded memory of one session's chat with one agent.
+
+    The most recent turns are kept verbatim up to token_budget; turns pushed out of
+    that window are folded into a rolling summary by a background LLM call after the
+    answer has been delivered, so the prompt stays roughly the same size however
+    long the session runs. Turns waiting to be summarized are still sent verbatim.
+    State is persisted in the conversation_memory table and reloaded after release(),
+    unless persist is False (e.g. one-off batch questions).
+    """
+
+    def __init__(self, session_id: str, agent: str, token_budget: int = MEMORY_TOKEN_BUDGET, summary_tokens: int = MEMORY_SUMMARY_TOKENS, summarizer=None, persist: bool = True):
+        self.session_id = session_id
+        self.agent = agent
+        self.persist = persist
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        # Called with the summary prompt and returns the new summary; defaults to the shared chat model
+        self._summarizer = summarizer
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._summarizing = False
+        self.summary = ""
+        self.turns = []
+        # Turns evicted from the window but not yet folded into the summary
+        self.pending = []
+        self.summarized_turns = 0
+
+    def _load(self):
+        if self._loaded:
+            return
+        if not self.persist:
+            self._loaded = True
+            return
+        with session_scope() as db:
+            record = db.query(ConversationMemoryRecord).filter_by(session_id=self.session_id, agent=self.agent).one_or_none()
+        if record is not None:
+            self.summary = record.summary or ""
+            self.turns = [tuple(turn) for turn in json.loads(record.turns or "[]")]
+            self.summarized_turns = record.summarized_turns or 0
+        self._loaded = True
+        self._evict()
+
+    def _save(self):
+        if not self.persist:
+            return
+        with session_scope() as db:
+            db.execute(insert(ConversationMemoryRecord).values(session_id=self.session_id, agent=self.agent).on_conflict_do_nothing())
+            record = db.query(ConversationMemoryRecord).filter_by(session_id=self.session_id, agent=self.agent).one()
+            record.summary = self.summary
+            record.turns = json.dumps(self.pending + self.turns)
+            record.summarized_turns = self.summarized_turns
+            record.updated_at = datetime.utcnow()
+
+    def _window_tokens(self) -> int:
+        return sum(estimate_tokens(content) for _, content in self.turns)
+
+    def _evict(self):
+        # The latest question and answer always stay, even if they alone exceed the budget
+        # Turns leave the window as question/answer pairs, so it always starts with a question
+        while len(self.turns) > 2 and self._window_tokens() > self.token_budget:
+            self.pending += self.turns[:2]
+            del self.turns[:2]
+
+    def is_empty(self) -> bool:
+        """True until the first exchange; answers to later questions depend on the earlier turns"""
+        with self._lock:
+            self._load()
+            return not (self.summary or self.pending or self.turns)
+
+    def is_standalone(self, question: str) -> bool:
+        """True if the question can be answered without this conversation, so a cached answer fits it"""
+        return self.is_empty() or not refers_to_context(question)
+
+    def context_key(self):
+        """Identifies this session's conversation state, e.g. to keep it out of cross-session coalescing"""
+        with self._lock:
+            self._load()
+            return (self.session_id, self.summarized_turns + len(self.pending) + len(self.turns))
+
+    def messages(self, question: str, system_prompt: str = None):
+        """Chat messages for the next question: system prompt with the summary, recent turns, question"""
+        with self._lock:
+            self._load()
+            history = [{"role": role, "content": content} for role, content in self.pending + self.turns]
+            summary = self.summary
+        context = f"Summary of the earlier conversation: {summary}" if summary else None
+        if system_prompt:
+            head = [{"role": "system", "content": f"{system_prompt}\n\n{context}" if context else system_prompt}]
+        else:
+            head = [{"role": "user", "content": context}, {"role": "assistant", "content": "Understood."}] if context else []
+        return head + history + [{"role": "user", "content": question}]
+
+    def add_turn(self, question: str, answer: str):
+        """Record a completed exchange and summarize whatever left the window in the background"""
+        with self._lock:
+            self._load()
+            self.turns += [("user", question), ("assistant", answer)]
+            self._evict()
+            self._save()
+            start = self.pending and not self._summarizing
+            if start:
+                self._summarizing = True
+        if start:
+            from utils.concurrency import get_executor
+            get_executor().submit(self._summarize)
+
+    def _summarize(self):
+        try:
+            while True:
+                with self._lock:
+                    batch = list(self.pending)
+                    summary = self.summary
+                if not batch:
+                    return
+                lines = "\n".join(f"{role}: {content}" for role, content in batch)
+                prompt = SUMMARY_PROMPT.format(words=self.summary_tokens * 3 // 4, summary=summary or "(none)", lines=lines)
+                try:
+                    new_summary = self._summarize_text(prompt)
+                except Exception as e:
+                    print(f"Error summarizing conversation memory: {e}")
+                    with self._lock:
+                        # Keep the prompt bounded even while the summarizer is failing
+                        while self.pending and sum(estimate_tokens(content) for _, content in self.pending) > self.token_budget:
+                            self.pending.pop(0)
+                            self.summarized_turns += 1
+                        self._save()
+                    return
+                with self._lock:
+                    self.summary = new_summary.strip()[:self.summary_tokens * 4]
+                    del self.pending[:len(batch)]
+                    self.summarized_turns += len(batch)
+                    self._save()
+        finally:
+            with self._lock:
+                self._summarizing = False
+
+    def _summarize_text(self, prompt: str) -> str:
+        if self._summarizer is not None:
+            return self._summarizer(prompt)
+        # Summarizing is routine work for the small, fast model
+        from utils.llm_gateway import get_chat_model
+        from utils.model_router import SMALL_MODEL
+        return get_chat_model(SMALL_MODEL).invoke([{"role": "user", "content": prompt}]).content
+
+    def prompt_tokens(self) -> int:
+        """Approximate tokens the memory adds to each prompt"""
+        with self._lock:
+            return estimate_tokens(self.summary) + sum(estimate_tokens(content) for _, content in self.pending + self.turns)
+
+    def release(self):
+        """Drop the in-memory copy; it is reloaded from the database on next use"""
+        with self._lock:
+            if self._summarizing or not self.persist:
+                return
+            self._loaded = False
+            self.summary = ""
+            self.turns = []
+            self.pending = []
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self.pending = []
+            self.summarized_turns = 0
+            self._loaded = True
+            self._save()
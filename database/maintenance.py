@@ -0,0 +1,84 @@
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from .models import engine, session_scope, Conversation, ConversationMemoryRecord
+from .write_behind import conversation_writer
+from .vector_store import garbage_collect_indexes
+
+# Cached answers older than this, or beyond the newest CONVERSATION_MAX_ROWS, are deleted
+CONVERSATION_RETENTION_DAYS = float(os.getenv("CONVERSATION_RETENTION_DAYS", 30))
+CONVERSATION_MAX_ROWS = int(os.getenv("CONVERSATION_MAX_ROWS", 50000))
+# Chat memory of sessions idle for this long is deleted
+MEMORY_RETENTION_DAYS = float(os.getenv("MEMORY_RETENTION_DAYS", 7))
+COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", 3600))
+# Rebuild the file once this share of its pages is free
+VACUUM_FREE_FRACTION = 0.2
+
+def compact_database(retention_days: float = CONVERSATION_RETENTION_DAYS, max_rows: int = CONVERSATION_MAX_ROWS, memory_retention_days: float = MEMORY_RETENTION_DAYS):
+    """Apply the retention policy, checkpoint the WAL and vacuum if enough space is free; returns stats"""
+    conversation_writer.flush(timeout=10)
+    now = datetime.utcnow()
+    with session_scope() as db:
+        expired = db.query(Conversation).filter(Conversation.created_at < now - timedelta(days=retention_days)).delete(synchronize_session=False)
+        # Keep the newest max_rows answers
+        boundary = db.query(Conversation.id).order_by(Conversation.id.desc()).offset(max_rows).limit(1).scalar()
+        trimmed = db.query(Conversation).filter(Conversation.id <= boundary).delete(synchronize_session=False) if boundary is not None else 0
+        stale_memory = (
+            db.query(ConversationMemoryRecord)
+            .filter(ConversationMemoryRecord.updated_at < now - timedelta(days=memory_retention_days))
+            .delete(synchronize_session=False)
+        )
+
+    stats = {"expired_rows": expired, "trimmed_rows": trimmed, "stale_memory_rows": stale_memory, "vacuumed": False}
+    with engine.connect() as conn:
+        # Fold the WAL back into the main file so it does not grow between restarts
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        pages = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    if pages and free / pages > VACUUM_FREE_FRACTION:
+        # VACUUM cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        stats["vacuumed"] = True
+    stats["free_pages"] = free
+    stats["pages"] = pages
+    return stats
+
+_compactor = None
+_compactor_lock = threading.Lock()
+
+def start_compaction(interval: float = COMPACTION_INTERVAL_SECONDS):
+    """Run compact_database and the vector index GC periodically on a daemon thread"""
+    global _compactor
+
+    def _compact():
+        while True:
+            time.sleep(interval)
+            try:
+                compact_database()
+            except Exception as e:
+                print(f"Error compacting database: {e}")
+            try:
+                garbage_collect_indexes()
+            except Exception as e:
+                print(f"Error collecting idle vector indexes: {e}")
+
+    with _compactor_lock:
+        if _compactor is None and interval > 0:
+            _compactor = threading.Thread(target=_compact, name="db-compaction", daemon=True)
+            _compactor.start()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the conversation retention policy and compact the database")
+    parser.add_argument("--retention-days", type=float, default=CONVERSATION_RETENTION_DAYS)
+    parser.add_argument("--max-rows", type=int, default=CONVERSATION_MAX_ROWS)
+    parser.add_argument("--memory-retention-days", type=float, default=MEMORY_RETENTION_DAYS)
+    args = parser.parse_args()
+    stats = compact_database(args.retention_days, args.max_rows, args.memory_retention_days)
+    print(f"Deleted {stats['expired_rows'] + stats['trimmed_rows']} cached answer(s) and {stats['stale_memory_rows']} idle memory row(s); "
+          f"{'vacuumed' if stats['vacuumed'] else 'no vacuum needed'}.")
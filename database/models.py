@@ -1,11 +1,82 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text
-from sqlalchemy.orm import sessionmaker, declarative_base
+import hashlib
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, inspect, text, Column, DateTime, ForeignKey, Integer, String, Text, LargeBinary, UniqueConstraint
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from utils.tracing import current_span, start_span, finish_span
 
 # Database setup
 DATABASE_URL = "sqlite:///conversation_memory.db"
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(bind=engine)
-session = SessionLocal()
+# How long a write waits for another connection's transaction before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+engine = create_engine(DATABASE_URL, echo=False, connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000})
+# Objects stay readable after their session commits and closes
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the single writer instead of waiting for it
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # Durable at checkpoints rather than on every commit; safe with WAL
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-16000")
+    cursor.execute("PRAGMA mmap_size=134217728")
+    cursor.close()
+
+@contextmanager
+def session_scope():
+    """A session for one unit of work: committed on success, rolled back on error, always closed"""
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+# Time statements and commits as "sql" / "db_commit" stages of the current request;
+# work outside a request (schema setup, index GC) is not traced
+@event.listens_for(engine, "before_cursor_execute")
+def _start_sql_span(conn, cursor, statement, parameters, context, executemany):
+    if current_span() is not None:
+        conn.info.setdefault("spans", []).append(start_span("sql", operation=statement.split(None, 1)[0].upper()))
+
+@event.listens_for(engine, "after_cursor_execute")
+def _finish_sql_span(conn, cursor, statement, parameters, context, executemany):
+    if conn.info.get("spans"):
+        finish_span(conn.info["spans"].pop())
+
+@event.listens_for(engine, "handle_error")
+def _fail_sql_span(exception_context):
+    spans = exception_context.connection.info.get("spans") if exception_context.connection is not None else None
+    if spans:
+        finish_span(spans.pop(), error=exception_context.original_exception)
+
+@event.listens_for(SessionLocal, "before_commit")
+def _start_commit_span(db_session):
+    if current_span() is not None:
+        db_session.info["commit_span"] = start_span("db_commit")
+
+@event.listens_for(SessionLocal, "after_commit")
+def _finish_commit_span(db_session):
+    commit_span = db_session.info.pop("commit_span", None)
+    if commit_span is not None:
+        finish_span(commit_span)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _fail_commit_span(db_session):
+    commit_span = db_session.info.pop("commit_span", None)
+    if commit_span is not None:
+        commit_span.set(rolled_back=True)
+        finish_span(commit_span, error=RuntimeError("commit rolled back"))
 
 # ORM Model for Conversations
 Base = declarative_base()
@@ -13,9 +84,105 @@ Base = declarative_base()
 class Conversation(Base):
     __tablename__ = "conversations"
     id = Column(Integer, primary_key=True, index=True)
-    query = Column(String, index=True)
+    query = Column(String)
     result = Column(Text)
     filename = Column(String, index=True)
+    # float32 query embedding used by the semantic answer cache
+    embedding = Column(LargeBinary, nullable=True)
+    # Cache scope: agent type, SHA-256 of the source document and normalized query
+    agent = Column(String, nullable=True)
+    doc_hash = Column(String(64), nullable=True)
+    query_norm = Column(String, nullable=True)
+    # Fixed-length digest of the scope and normalized query; lookups use its index
+    lookup_hash = Column(String(32), nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+def conversation_lookup_hash(agent: str, doc_hash: str, query_norm: str) -> str:
+    """Index key of a cached answer; rows are still compared on query_norm in case of collisions"""
+    key = "\x1f".join((agent or "", doc_hash or "", query_norm or ""))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+# Registry of per-document vector index collections
+class VectorIndex(Base):
+    __tablename__ = "vector_indexes"
+    doc_hash = Column(String(64), primary_key=True)
+    collection_name = Column(String, nullable=False)
+    filename = Column(String)
+    chunk_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+# Uploaded files stored once by content digest
+class Blob(Base):
+    __tablename__ = "blobs"
+    digest = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False)
+    size = Column(Integer)
+    filename = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+# Results derived from a blob (columnar cache, vector index, dataset profile)
+class Artifact(Base):
+    __tablename__ = "artifacts"
+    id = Column(Integer, primary_key=True)
+    blob_digest = Column(String(64), ForeignKey("blobs.digest"), nullable=False, index=True)
+    kind = Column(String, nullable=False)
+    # File path or collection name holding the artifact, if it lives outside this row
+    location = Column(String)
+    # JSON payload for small artifacts such as the dataset profile
+    data = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("blob_digest", "kind", name="uq_artifacts_blob_kind"),
+    )
+
+# Per-session chat memory: the recent turns kept verbatim and a rolling summary of older ones
+class ConversationMemoryRecord(Base):
+    __tablename__ = "conversation_memory"
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String, nullable=False, index=True)
+    agent = Column(String, nullable=False)
+    summary = Column(Text, default="")
+    # JSON list of [role, content] turns not yet folded into the summary
+    turns = Column(Text, default="[]")
+    summarized_turns = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        UniqueConstraint("session_id", "agent", name="uq_conversation_memory_session_agent"),
+    )
+
+def migrate_schema(bind=engine):
+    """Add columns and indexes introduced after a database file was first created"""
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        with bind.begin() as conn:
+            for column in table.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=bind.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+    with bind.begin() as conn:
+        # Variable-length text indexes replaced by the lookup_hash index
+        conn.execute(text("DROP INDEX IF EXISTS ix_conversations_query"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_conversations_scope"))
+        conn.execute(text("UPDATE conversations SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"))
+        rows = conn.execute(text(
+            "SELECT id, agent, doc_hash, query_norm FROM conversations WHERE lookup_hash IS NULL AND query_norm IS NOT NULL"
+        )).fetchall()
+        if rows:
+            conn.execute(
+                text("UPDATE conversations SET lookup_hash = :lookup_hash WHERE id = :id"),
+                [{"id": row.id, "lookup_hash": conversation_lookup_hash(row.agent, row.doc_hash, row.query_norm)} for row in rows]
+            )
 
 # Create all tables
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+Base.metadata.create_all(bind=engine)
+migrate_schema()
@@ -0,0 +1,245 @@
+import heapq
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .models import session_scope, conversation_lookup_hash, Conversation
+from .write_behind import conversation_writer
+from utils.tracing import span
+
+def normalize_query(question: str) -> str:
+    """Normalize a query for exact-match cache lookups"""
+    normalized = re.sub(r"\s+", " ", question.strip().lower())
+    return normalized.rstrip("?!. ")
+
+_LITERALS = re.compile(
+    r"\"[^\"]*\"|'[^']*'|\d+(?:[.,]\d+)*%?|[<>]=?|!=|==?"
+    r"|\b(?:not|no|never|without|except|excluding|exclude|neither|nor)\b|n't\b"
+)
+
+def query_literals(query_norm: str):
+    """Numbers, quoted values, comparison operators and negations of a normalized query, in order.
+
+    Questions that differ only in these ("top 5" / "top 10", "spend > 100" / "spend > 1000",
+    "contains" / "does not contain") embed almost identically but need different answers,
+    so a semantic match requires them equal.
+    """
+    return tuple(_LITERALS.findall(query_norm))
+
+def _timestamp(created_at) -> float:
+    """Epoch seconds of a naive UTC created_at column, or now if it is missing"""
+    return created_at.replace(tzinfo=timezone.utc).timestamp() if created_at else time.time()
+
+class SemanticCache:
+    """Answer cache with an in-memory nearest-neighbour tier over the Conversation table.
+
+    Cached queries are embedded and kept in a bounded vector index with LRU and
+    TTL eviction. The Conversation table is the durable tier: every stored answer
+    is written there together with its embedding, and the in-memory index is
+    warmed from it on first use.
+
+    Entries are scoped by (agent type, document hash): a nearest-neighbour match
+    is only ever taken from answers produced by the same agent over the same
+    document content, so a new upload never sees answers for other files. Within
+    a scope it is only taken from queries with the same query_literals(). Callers
+    whose answers hinge on unquoted values ("contains shoes" / "contains hats"),
+    such as the SellerAgent, look up with semantic=False and only get exact matches.
+    """
+
+    def __init__(self, threshold=None, max_entries=None, ttl_seconds=None, embedder=None):
+        self.threshold = float(threshold if threshold is not None else os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 5000))
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 86400))
+        self._embedder = embedder
+        self._lock = threading.RLock()
+        # (agent, doc_hash, normalized query) -> (unit vector, result, inserted_at)
+        self._entries = OrderedDict()
+        # (inserted_at, key) min-heap, so expiry only looks at entries that are due
+        self._expiry = []
+        # (agent, doc_hash) -> {literals: (keys, stacked vectors)}, rebuilt lazily per scope
+        self._scope_matrices = {}
+        self._warmed = False
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "durable_hits": 0, "misses": 0, "evictions": 0}
+        self._miss_latency_total = 0.0
+        self._miss_latency_count = 0
+
+    def _get_embedder(self):
+        if self._embedder is None:
+            from utils.embedding_service import get_embedding_service
+            self._embedder = get_embedding_service()
+        return self._embedder
+
+    def _embed(self, question: str):
+        vector = np.asarray(self._get_embedder().embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _warm(self):
+        """Load the most recent embedded answers from the durable tier"""
+        if self._warmed:
+            return
+        self._warmed = True
+        with session_scope() as db:
+            rows = (
+                db.query(Conversation)
+                .filter(Conversation.embedding.isnot(None), Conversation.agent.isnot(None))
+                .order_by(Conversation.id.desc())
+                .limit(self.max_entries)
+                .all()
+            )
+        for row in reversed(rows):
+            vector = np.frombuffer(row.embedding, dtype=np.float32)
+            key = (row.agent, row.doc_hash, row.query_norm or normalize_query(row.query))
+            # Keep the original age so a restart does not extend an answer's TTL
+            self._insert(key, vector, row.result, _timestamp(row.created_at))
+        self._scope_matrices.clear()
+
+    def _insert(self, key, vector, result, inserted_at=None):
+        inserted_at = inserted_at if inserted_at is not None else time.time()
+        self._entries[key] = (vector, result, inserted_at)
+        self._entries.move_to_end(key)
+        if self.ttl_seconds:
+            heapq.heappush(self._expiry, (inserted_at, key))
+            if len(self._expiry) > 2 * self.max_entries:
+                # Drop heap records of entries already evicted or replaced
+                self._expiry = [(at, k) for k, (_, _, at) in self._entries.items()]
+                heapq.heapify(self._expiry)
+        self._scope_matrices.pop(key[:2], None)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._scope_matrices.pop(evicted[:2], None)
+            self.stats["evictions"] += 1
+
+    def _expire(self):
+        if not self.ttl_seconds:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        while self._expiry and self._expiry[0][0] < cutoff:
+            inserted_at, key = heapq.heappop(self._expiry)
+            entry = self._entries.get(key)
+            # Skip records of entries evicted or stored again since
+            if entry is not None and entry[2] == inserted_at:
+                del self._entries[key]
+                self._scope_matrices.pop(key[:2], None)
+                self.stats["evictions"] += 1
+
+    def _nearest(self, scope, vector, literals):
+        if scope not in self._scope_matrices:
+            groups = {}
+            for key in self._entries:
+                if key[:2] == scope:
+                    groups.setdefault(query_literals(key[2]), []).append(key)
+            self._scope_matrices[scope] = {
+                group: (keys, np.stack([self._entries[key][0] for key in keys])) for group, keys in groups.items()
+            }
+        if literals not in self._scope_matrices[scope]:
+            return None, 0.0
+        keys, matrix = self._scope_matrices[scope][literals]
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        return keys[best], float(scores[best])
+
+    def lookup(self, question: str, agent: str, doc_hash: str = None, semantic: bool = True):
+        """Return a cached answer for the question or, if semantic, a semantically equivalent one"""
+        with span("cache_lookup", agent=agent) as lookup_span:
+            result, tier = self._lookup(question, agent, doc_hash, semantic)
+            lookup_span.set(cache_hit=result is not None, tier=tier)
+            return result
+
+    def _lookup(self, question: str, agent: str, doc_hash: str = None, semantic: bool = True):
+        """Returns (result or None, tier that answered)"""
+        scope = (agent, doc_hash)
+        key = scope + (normalize_query(question),)
+        with self._lock:
+            self._warm()
+            self._expire()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return self._entries[key][1], "exact"
+
+        vector = None
+        if semantic:
+            vector = self._embed(question)
+            with self._lock:
+                match, score = self._nearest(scope, vector, query_literals(key[2]))
+                if match is not None and score >= self.threshold:
+                    self._entries.move_to_end(match)
+                    self.stats["semantic_hits"] += 1
+                    return self._entries[match][1], "semantic"
+
+        # Fall back to an exact lookup in the durable tier for rows evicted from memory
+        with session_scope() as db:
+            existing = (
+                db.query(Conversation)
+                .filter_by(lookup_hash=conversation_lookup_hash(agent, doc_hash, key[2]), agent=agent, doc_hash=doc_hash, query_norm=key[2])
+                .first()
+            )
+        if existing:
+            vector = vector if vector is not None else self._embed(question)
+            with self._lock:
+                self._insert(key, vector, existing.result, _timestamp(existing.created_at))
+                self.stats["durable_hits"] += 1
+            return existing.result, "durable"
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None, None
+
+    def store(self, question: str, result: str, agent: str, doc_hash: str = None, filename: str = None, latency: float = None):
+        """Add an answer to the in-memory index and queue it for the durable tier"""
+        with span("cache_store", agent=agent):
+            self._store(question, result, agent, doc_hash, filename, latency)
+
+    def _store(self, question, result, agent, doc_hash, filename, latency):
+        vector = self._embed(question)
+        query_norm = normalize_query(question)
+        # Written in batches by the write-behind queue; the in-memory tier answers until then
+        conversation_writer.put(dict(
+            query=question,
+            result=result,
+            filename=filename,
+            embedding=vector.tobytes(),
+            agent=agent,
+            doc_hash=doc_hash,
+            query_norm=query_norm,
+            lookup_hash=conversation_lookup_hash(agent, doc_hash, query_norm),
+            created_at=datetime.utcnow(),
+        ))
+        with self._lock:
+            self._insert((agent, doc_hash, query_norm), vector, result)
+            if latency is not None:
+                self._miss_latency_total += latency
+                self._miss_latency_count += 1
+
+    def invalidate(self, agent: str, doc_hash: str = None):
+        """Drop in-memory entries for one document; durable rows stay for re-uploads"""
+        with self._lock:
+            stale = [key for key in self._entries if key[:2] == (agent, doc_hash)]
+            for key in stale:
+                del self._entries[key]
+            self._scope_matrices.pop((agent, doc_hash), None)
+            return len(stale)
+
+    def get_stats(self):
+        """Hit/miss counters and the estimated LLM time saved by cache hits"""
+        with self._lock:
+            stats = dict(self.stats)
+            hits = stats["exact_hits"] + stats["semantic_hits"] + stats["durable_hits"]
+            total = hits + stats["misses"]
+            avg_miss_latency = self._miss_latency_total / self._miss_latency_count if self._miss_latency_count else 0.0
+            stats.update({
+                "entries": len(self._entries),
+                "hit_rate": hits / total if total else 0.0,
+                "avg_miss_latency_seconds": avg_miss_latency,
+                "estimated_seconds_saved": hits * avg_miss_latency,
+            })
+            return stats
+
+# Shared cache instance used by all agents
+answer_cache = SemanticCache()
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import session_scope, Artifact, Blob
+
+# Uploaded files, stored once under their SHA-256 digest
+BLOB_DIR = os.path.join("uploads", "blobs")
+
+def blob_path(digest: str, filename: str = "") -> str:
+    """Location of a blob; the original extension is kept for loaders that look at it"""
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(BLOB_DIR, digest[:2], f"{digest}{ext}")
+
+def store_upload(data: bytes, filename: str, chunk_size: int = 1 << 20):
+    """Store uploaded bytes by content, hashing them as they are written.
+
+    Returns (digest, path, is_new). An identical earlier upload is reused as is,
+    whatever it was called; two different files with the same name never collide.
+    """
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(BLOB_DIR, f".upload-{uuid.uuid4().hex}")
+    with open(tmp_path, "wb") as f:
+        view = memoryview(data)
+        for start in range(0, len(view), chunk_size):
+            chunk = view[start:start + chunk_size]
+            digest.update(chunk)
+            f.write(chunk)
+    digest = digest.hexdigest()
+
+    path = blob_path(digest, filename)
+    is_new = not os.path.exists(path)
+    if is_new:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    else:
+        os.remove(tmp_path)
+        # Refresh the timestamp so the uploads retention policy sees the blob as in use
+        os.utime(path)
+
+    with session_scope() as db:
+        # Concurrent uploads of the same file may both get here; only one row is created
+        db.execute(insert(Blob).values(digest=digest, path=path, size=len(data)).on_conflict_do_nothing())
+        record = db.get(Blob, digest)
+        record.path = path
+        record.filename = filename
+        record.last_used_at = datetime.utcnow()
+    return digest, path, is_new
+
+def record_artifact(digest: str, kind: str, location: str = None, data=None):
+    """Link a derived artifact to its blob, replacing an earlier one of the same kind"""
+    with session_scope() as db:
+        db.execute(insert(Artifact).values(blob_digest=digest, kind=kind).on_conflict_do_nothing())
+        artifact = db.query(Artifact).filter_by(blob_digest=digest, kind=kind).one()
+        artifact.location = location
+        artifact.data = json.dumps(data) if data is not None else None
+        artifact.created_at = datetime.utcnow()
+    return artifact
+
+def get_artifact(digest: str, kind: str):
+    """Return (location, data) for a blob's artifact, or None if it was never recorded or is gone"""
+    with session_scope() as db:
+        artifact = db.query(Artifact).filter_by(blob_digest=digest, kind=kind).one_or_none()
+        if artifact is None:
+            return None
+        if artifact.location and kind != "vector_index" and not os.path.exists(artifact.location):
+            # The file was removed by the uploads cleanup; the artifact must be rebuilt
+            db.delete(artifact)
+            return None
+    return artifact.location, json.loads(artifact.data) if artifact.data else None
+
+def list_artifacts(digest: str):
+    """Kinds of artifacts recorded for a blob"""
+    with session_scope() as db:
+        return [artifact.kind for artifact in db.query(Artifact).filter_by(blob_digest=digest).all()]
@@ -0,0 +1,133 @@
+import argparse
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import session_scope, Artifact, VectorIndex
+from .upload_store import record_artifact
+
+CHROMA_DIR = "./chroma_db"
+# Collections not opened for this long are deleted by the compaction thread
+VECTOR_INDEX_MAX_IDLE_DAYS = float(os.getenv("VECTOR_INDEX_MAX_IDLE_DAYS", 30))
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_chroma_client():
+    """Return the process-wide persistent Chroma client"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            import chromadb
+            _client = chromadb.PersistentClient(path=CHROMA_DIR)
+        return _client
+
+def collection_name_for(doc_hash: str) -> str:
+    """Chroma collection name for a document content hash (3-63 chars)"""
+    return f"pdf_{doc_hash[:56]}"
+
+# doc_hash -> DocumentIngestion still filling that document's collection in this process
+_ingestions = {}
+_ingestions_lock = threading.Lock()
+
+class DocumentIngestion:
+    """Background run filling one document's collection, shared by every agent opened on the document meanwhile"""
+
+    def __init__(self, doc_hash: str, filename: str, pipeline):
+        self.doc_hash = doc_hash
+        self.filename = filename
+        # Anything with run() -> chunk count, e.g. PDFIngestionPipeline
+        self.pipeline = pipeline
+        self.error = None
+        self.done = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name=f"pdf-ingest-{self.doc_hash[:8]}", daemon=True).start()
+
+    def _run(self):
+        try:
+            chunk_count = self.pipeline.run()
+            register_document_index(self.doc_hash, self.filename, chunk_count)
+        except Exception as e:
+            self.error = e
+            print(f"Error ingesting document {self.filename}: {e}")
+        finally:
+            with _ingestions_lock:
+                _ingestions.pop(self.doc_hash, None)
+            self.done.set()
+
+def open_document_index(doc_hash: str, embeddings, filename: str = None, create_pipeline=None):
+    """Open the vector store for one document.
+
+    Returns (store, ready, ingestion). ready is True when the document was fully
+    indexed before and no embedding work is needed. Otherwise ingestion is the
+    DocumentIngestion filling the collection: the one already running for this
+    document, which is joined rather than restarted, or a new one built from
+    create_pipeline(store) (None if no create_pipeline is given).
+    """
+    from langchain.vectorstores import Chroma
+
+    name = collection_name_for(doc_hash)
+    store = Chroma(client=get_chroma_client(), collection_name=name, embedding_function=embeddings)
+    with session_scope() as db:
+        record = db.get(VectorIndex, doc_hash)
+        if record is not None:
+            record.last_used_at = datetime.utcnow()
+    # Held while checking and claiming, so two uploads of one document never both start an ingestion
+    with _ingestions_lock:
+        ingestion = _ingestions.get(doc_hash)
+        count = store._collection.count()
+        ready = record is not None and count > 0
+        if ready or ingestion is not None:
+            return store, ready, ingestion
+        if count:
+            # Leftovers from an interrupted ingestion; start the collection over
+            get_chroma_client().delete_collection(name)
+            store = Chroma(client=get_chroma_client(), collection_name=name, embedding_function=embeddings)
+        if create_pipeline is None:
+            return store, False, None
+        ingestion = _ingestions[doc_hash] = DocumentIngestion(doc_hash, filename, create_pipeline(store))
+    ingestion.start()
+    return store, False, ingestion
+
+def register_document_index(doc_hash: str, filename: str, chunk_count: int):
+    """Mark a document's collection as fully indexed"""
+    with session_scope() as db:
+        db.execute(insert(VectorIndex).values(doc_hash=doc_hash, collection_name=collection_name_for(doc_hash)).on_conflict_do_nothing())
+        record = db.get(VectorIndex, doc_hash)
+        record.filename = filename
+        record.chunk_count = chunk_count
+        record.last_used_at = datetime.utcnow()
+    record_artifact(doc_hash, "vector_index", record.collection_name, {"chunk_count": chunk_count})
+
+def garbage_collect_indexes(max_idle_days: float = VECTOR_INDEX_MAX_IDLE_DAYS):
+    """Delete collections that have not been opened for max_idle_days; returns removed hashes"""
+    cutoff = datetime.utcnow() - timedelta(days=max_idle_days)
+    removed = []
+    with session_scope() as db:
+        for record in db.query(VectorIndex).filter(VectorIndex.last_used_at < cutoff).all():
+            with _ingestions_lock:
+                if record.doc_hash in _ingestions:
+                    continue
+            try:
+                get_chroma_client().delete_collection(record.collection_name)
+            except ValueError:
+                # Collection was already removed from the Chroma directory
+                pass
+            except Exception as e:
+                # Keep the record so the next pass retries; one bad collection must not stop the rest
+                print(f"Error deleting vector index {record.collection_name}: {e}")
+                continue
+            db.delete(record)
+            db.query(Artifact).filter_by(blob_digest=record.doc_hash, kind="vector_index").delete()
+            removed.append(record.doc_hash)
+    return removed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Garbage-collect idle per-document vector indexes")
+    parser.add_argument("--max-idle-days", type=float, default=VECTOR_INDEX_MAX_IDLE_DAYS)
+    args = parser.parse_args()
+    removed = garbage_collect_indexes(args.max_idle_days)
+    print(f"Removed {len(removed)} idle vector index collection(s).")
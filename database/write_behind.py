@@ -0,0 +1,100 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import insert
+
+from .models import session_scope, Conversation
+
+# Rows written per transaction, and how long the writer waits for a batch to fill
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 200))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", 200))
+# Producers block once this many rows are waiting, so a stalled disk cannot grow memory without bound
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 10000))
+WRITE_BEHIND_RETRIES = 3
+
+class WriteBehindQueue:
+    """Batches inserts into one table on a background thread.
+
+    Requests hand over a row and return immediately; the writer commits up to
+    batch_size rows per transaction, so concurrent users share a few short write
+    transactions instead of each holding the SQLite write lock for its own commit.
+    Rows still queued when the process exits are flushed by an atexit hook.
+    """
+
+    def __init__(self, model, batch_size: int = WRITE_BEHIND_BATCH_SIZE, flush_ms: float = WRITE_BEHIND_FLUSH_MS, max_pending: int = WRITE_BEHIND_MAX_PENDING):
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._done = threading.Condition()
+        self._enqueued = 0
+        self._finished = 0
+        self.stats = {"rows_written": 0, "batches": 0, "rows_dropped": 0, "failed_batches": 0}
+        atexit.register(self.flush, 5.0)
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"write-behind-{self.model.__tablename__}", daemon=True)
+                self._worker.start()
+
+    def put(self, row: dict):
+        """Queue a row (column name -> value) for insertion"""
+        self._ensure_worker()
+        with self._done:
+            self._enqueued += 1
+        self._queue.put(row)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+            with self._done:
+                self._finished += len(batch)
+                self._done.notify_all()
+
+    def _write(self, batch):
+        for attempt in range(WRITE_BEHIND_RETRIES):
+            try:
+                with session_scope() as db:
+                    db.execute(insert(self.model), batch)
+                self.stats["rows_written"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                print(f"Error writing {len(batch)} {self.model.__tablename__} row(s) (attempt {attempt + 1}): {e}")
+                time.sleep(0.1 * 2 ** attempt)
+        self.stats["rows_dropped"] += len(batch)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every row queued so far has been written; returns False on timeout"""
+        with self._done:
+            target = self._enqueued
+            return self._done.wait_for(lambda: self._finished >= target, timeout=timeout)
+
+    def pending(self) -> int:
+        with self._done:
+            return self._enqueued - self._finished
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["pending"] = self.pending()
+        return stats
+
+# Answers stored by the semantic cache
+conversation_writer = WriteBehindQueue(Conversation)
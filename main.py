@@ -3,11 +3,17 @@ import panel as pn
 from dotenv import load_dotenv
 
 from database.models import Base, engine
-from agents.pdf_agent import PDFQueryAgent
-from agents.seller_agent import SellerAgent
-from agents.general_agent import GeneralAgent
-from agents.code_agent import DHI_CodeBot
-from utils.helpers import ensure_uploads_dir
+from database.semantic_cache import answer_cache, normalize_query
+from database.upload_store import get_artifact, store_upload
+from database.write_behind import conversation_writer
+from database.maintenance import start_compaction
+from agents.registry import create_agent
+from agents.pool import agent_pool
+from utils.uploads import cleanup_uploads
+from utils.single_flight import query_flights
+from utils.sandbox import sandbox_pool
+from utils.tracing import metrics, span, start_metrics_server
+from utils.embedding_service import get_embedding_service
 from ui.components import (
     create_chat_interface,
     create_buttons,
@@ -23,28 +29,86 @@ load_dotenv()
 # Ensure database tables exist
 Base.metadata.create_all(bind=engine)
 
-# Global state variables
-current_csv_filename = None
-current_pdf_filename = None
-filtered_df = None
-filtered_csv_path = None
-pdf_query_agent = None
-seller_agent = None
-general_agent = None
-dhi_codebot_agent = None
+def warm_up_embeddings():
+    """Load the shared embedding model in the background so the first upload or cache lookup is fast"""
+    service = get_embedding_service()
+    if not service.get_stats()["loaded"]:
+        service.warm_up(background=True)
+
+# Deferred until the page has rendered so it never delays the first paint
+if os.getenv("EMBEDDING_WARMUP", "1") == "1":
+    pn.state.onload(warm_up_embeddings)
+
+# Process-wide metrics; start_metrics_server is a no-op after the first session
+metrics.register_gauges("semantic_cache", answer_cache.get_stats)
+# Per-session details are left out so the number of series does not grow with visitors
+metrics.register_gauges("agent_pool", lambda: {k: v for k, v in agent_pool.get_stats().items() if k != "sessions"})
+# Agent-side modules load langchain or pandas; their gauges appear once an agent has imported them
+metrics.register_module_gauges("llm", "utils.llm_gateway")
+metrics.register_module_gauges("router", "utils.model_router")
+metrics.register_gauges("sandbox", sandbox_pool.get_stats)
+metrics.register_gauges("single_flight", lambda: {**query_flights.stats, "in_flight": query_flights.in_flight()})
+metrics.register_module_gauges("seller_fast_path", "agents.seller_planner", "get_fast_path_stats")
+metrics.register_gauges("embeddings", lambda: get_embedding_service().get_stats())
+metrics.register_gauges("db_writer", conversation_writer.get_stats)
+start_metrics_server()
+
+def get_session_id():
+    """Identify the browser session this script run is serving"""
+    session_context = pn.state.curdoc.session_context if pn.state.curdoc else None
+    return session_context.id if session_context else "local"
+
+# Agents and uploaded-file state live in the shared pool, scoped to this session
+session_id = get_session_id()
+agent_pool.start_reaper()
+start_compaction()
+pn.state.on_session_destroyed(lambda session_context: agent_pool.drop(session_context.id))
+
+def get_active_agent():
+    """Return the agent selected for this chat, if any"""
+    return agent_pool.get(session_id).agent
+
+async def leased_answer(agent, contents: str):
+    """Stream an agent's answer while holding its pool lease.
+
+    Runs as the shared producer of a coalesced query, so the lease lasts as long as
+    the call itself rather than the session that started it. A download offered by
+    the SellerAgent is passed along as an (export, row count) chunk so every
+    coalesced session gets its own button.
+    """
+    exports = []
+    kwargs = {"on_export": lambda export, row_count: exports.append((export, row_count))} if type(agent).__name__ == "SellerAgent" else {}
+    # The lease keeps the pool from releasing this agent's DataFrame or chain mid-answer
+    with agent_pool.lease(agent):
+        async for token in agent.astream(contents, **kwargs):
+            yield token
+        while exports:
+            yield exports.pop(0)
 
 async def chat_callback(contents: str, user: str, instance: pn.chat.ChatInterface):
     """Main callback function for chat interface"""
-    if general_agent:
-        return general_agent.query(contents)
-    elif seller_agent:
-        return seller_agent.query(contents)
-    elif pdf_query_agent:
-        return pdf_query_agent.query(contents)
-    elif dhi_codebot_agent:
-        return dhi_codebot_agent.query(contents)
-    else:
-        return "❌ No valid agent initialized."
+    agent = get_active_agent()
+    if agent is None:
+        yield "❌ No valid agent initialized."
+        return
+
+    # Agents stream tokens through astream so slow LLM calls never block the server
+    # event loop; yielding the accumulated text updates the chat message in place.
+    # Identical questions asked at the same time by any session share one call
+    # (and one cache write) instead of each missing the cache and calling the LLM.
+    # Conversational agents answer from their own session's history, so those calls are
+    # only coalesced within a session (e.g. a double submit), never across sessions.
+    memory = getattr(agent, "memory", None)
+    key = (type(agent).__name__, getattr(agent, "doc_hash", None), normalize_query(contents), memory.context_key() if memory else None)
+    message = ""
+    with span("chat", agent=type(agent).__name__) as request_span:
+        async for chunk in query_flights.stream(key, lambda: leased_answer(agent, contents)):
+            if isinstance(chunk, str):
+                message += chunk
+                yield message
+            else:
+                offer_download(*chunk)
+        request_span.set(response_chars=len(message))
 
 # Create UI components
 chat_interface = create_chat_interface(callback=chat_callback)
@@ -52,44 +116,88 @@ buttons = create_buttons()
 upload_csv_button, upload_pdf_button = create_file_inputs()
 layout = create_layout(buttons)
 
+def offer_download(export, row_count):
+    """Show a filtered-data download button in this session's layout"""
+    update_layout_with_download_button(layout, export, row_count)
+
 def handle_csv_upload(event):
     """Handle CSV file upload"""
-    global seller_agent, current_csv_filename
     file = event.new
     if file:
+        # pandas/pyarrow are only imported once someone actually uploads a CSV
+        from utils.dataframe_loader import format_memory_report
+
+        session = agent_pool.get(session_id)
         # Get the filename from the widget's metadata
         filename = upload_csv_button.filename
-        current_csv_filename = filename
+        session.state["current_csv_filename"] = filename
         
-        # Ensure uploads directory exists
-        file_path = os.path.join(ensure_uploads_dir(), filename)
+        # Apply the uploads retention policy before adding another file
+        cleanup_uploads()
+        # Stored by content digest: same-named files never overwrite each other, and
+        # an identical earlier upload reuses its columnar cache and profile
+        doc_hash, file_path, is_new = store_upload(file, filename)
         
-        # Save the file with its original name
-        with open(file_path, "wb") as f:
-            f.write(file)
-        
-        seller_agent = SellerAgent(csv_path=file_path)
-        chat_interface.send(f"CSV file '{filename}' uploaded and SellerAgent is ready for queries.", user="System", respond=False)
+        previous = session.agents.get("Seller Queries")
+        previous_hash = previous.doc_hash if previous else None
+        seller_agent = agent_pool.set_agent(session_id, "Seller Queries", create_agent("Seller Queries", csv_path=file_path, doc_hash=doc_hash, filename=filename))
+        # Drop in-memory answers for the document this upload replaces
+        if previous_hash and previous_hash != seller_agent.doc_hash:
+            answer_cache.invalidate("SellerAgent", previous_hash)
+        reused = "" if is_new else " (identical to an earlier upload, so its parsed data was reused)"
+        chat_interface.send(
+            f"CSV file '{filename}' uploaded{reused} and SellerAgent is ready for queries.\n\n📊 {format_memory_report(seller_agent.load_report)}",
+            user="System",
+            respond=False
+        )
+
+def create_ingestion_reporter(filename):
+    """Post PDF ingestion progress to the chat, throttled to roughly every 10% of pages"""
+    state = {"last_step": 0, "first_batch": True}
+
+    def report(stage, done, total):
+        if stage == "started":
+            chat_interface.send(f"📄 Parsing '{filename}' ({total} pages)...", user="System", respond=False)
+        elif stage == "parsed":
+            step = done * 10 // max(total, 1)
+            if step > state["last_step"] and done < total:
+                state["last_step"] = step
+                chat_interface.send(f"⚙️ Processed {done}/{total} pages of '{filename}'.", user="System", respond=False)
+        elif stage == "embedded" and state["first_batch"]:
+            state["first_batch"] = False
+            chat_interface.send(f"🔎 The first pages of '{filename}' are indexed; you can start asking questions.", user="System", respond=False)
+        elif stage == "completed":
+            chat_interface.send(f"PDF '{filename}' is ready for queries.", user="System", respond=False)
+
+    return report
 
 def handle_pdf_upload(event):
     """Handle PDF file upload"""
-    global pdf_query_agent, current_pdf_filename
     file = event.new
     if file:
+        session = agent_pool.get(session_id)
         # Get the filename from the widget's metadata
         filename = upload_pdf_button.filename
-        current_pdf_filename = filename
-        
-        # Ensure uploads directory exists
-        file_path = os.path.join(ensure_uploads_dir(), filename)
+        session.state["current_pdf_filename"] = filename
         
-        # Save the file with its original name
-        with open(file_path, "wb") as f:
-            f.write(file)
+        # Apply the uploads retention policy before adding another file
+        cleanup_uploads()
+        # Stored by content digest; an identical earlier upload reuses its vector index
+        doc_hash, file_path, _ = store_upload(file, filename)
         
-        chat_interface.send(f"PDF file '{filename}' uploaded. Processing...", user="System", respond=False)
-        pdf_query_agent = PDFQueryAgent(pdf_path=file_path)
-        chat_interface.send(f"PDF '{filename}' is ready for queries.", user="System", respond=False)
+        if get_artifact(doc_hash, "vector_index") is None:
+            chat_interface.send(f"PDF file '{filename}' uploaded. Processing...", user="System", respond=False)
+        previous = session.agents.get("PDF Queries")
+        previous_hash = previous.doc_hash if previous else None
+        pdf_query_agent = agent_pool.set_agent(
+            session_id,
+            "PDF Queries",
+            create_agent("PDF Queries", pdf_path=file_path, progress_callback=create_ingestion_reporter(filename), doc_hash=doc_hash, filename=filename)
+        )
+        if previous_hash and previous_hash != pdf_query_agent.doc_hash:
+            answer_cache.invalidate("PDFQueryAgent", previous_hash)
+        if pdf_query_agent.ingested.is_set():
+            chat_interface.send(f"PDF '{filename}' is ready for queries.", user="System", respond=False)
 
 # Set up event handlers for file uploads
 upload_csv_button.param.watch(handle_csv_upload, 'value')
@@ -97,23 +205,26 @@ upload_pdf_button.param.watch(handle_pdf_upload, 'value')
 
 def on_button_click(event):
     """Handle button click events"""
-    global layout, chat_interface, general_agent, seller_agent, pdf_query_agent, dhi_codebot_agent
+    global layout, chat_interface
     
     # Clear the layout and remove buttons after a click
     new_layout = []
     
     if event.obj.name == "Amazon Ads Queries":
-        general_agent = GeneralAgent(chat_interface=chat_interface)
+        agent_pool.set_agent(session_id, event.obj.name, create_agent(event.obj.name, chat_interface=chat_interface, session_id=session_id))
         new_layout.append(chat_interface)
     elif event.obj.name == "Seller Queries":
-        seller_agent = SellerAgent()  # Initialize without CSV - user will upload
+        # Initialize without CSV - user will upload
+        agent_pool.set_agent(session_id, event.obj.name, create_agent(event.obj.name))
         new_layout.append(upload_csv_button)
         new_layout.append(chat_interface)
     elif event.obj.name == "PDF Queries":
+        # The PDF agent is created on upload; select it for this session's chat now
+        agent_pool.get(session_id).active = event.obj.name
         new_layout.append(upload_pdf_button)
         new_layout.append(chat_interface)
     elif event.obj.name == "Code Generation":
-        dhi_codebot_agent = DHI_CodeBot()
+        agent_pool.set_agent(session_id, event.obj.name, create_agent(event.obj.name, session_id=session_id))
         new_layout.append(chat_interface)
 
     layout.objects = new_layout  # Hide buttons and update layout
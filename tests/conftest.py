@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The SQLite database, uploads/ and the columnar cache use paths relative to the working
+# directory; run the tests in a scratch directory so they never touch the checkout's files
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="chatbot-tests-"))
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+from utils.concurrency import QueryLimiter
+
+def test_limit_holds_across_event_loops():
+    limiter = QueryLimiter(2)
+    lock = threading.Lock()
+    running = {"now": 0, "peak": 0, "done": 0}
+
+    async def query():
+        async with limiter:
+            with lock:
+                running["now"] += 1
+                running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.01)
+            with lock:
+                running["now"] -= 1
+                running["done"] += 1
+
+    async def session():
+        await asyncio.gather(*(query() for _ in range(5)))
+
+    # Like Panel's server threads and batch.py, each thread runs its own loop
+    threads = [threading.Thread(target=asyncio.run, args=(session(),)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert running == {"now": 0, "peak": 2, "done": 15}
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    limiter = QueryLimiter(1)
+
+    async def main():
+        async with limiter:
+            waiter = asyncio.ensure_future(limiter.__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.wait_for(limiter.__aenter__(), timeout=1)
+        await limiter.__aexit__(None, None, None)
+        assert limiter._active == 0 and not limiter._waiters
+
+    asyncio.run(main())
@@ -0,0 +1,29 @@
+import pytest
+
+from database.conversation_memory import ConversationMemory, refers_to_context
+
+@pytest.mark.parametrize("question", [
+    "What is ACoS in Amazon Ads?",
+    "How should I structure sponsored product campaigns for a new brand?",
+    "Write a Python function that parses a CSV file",
+])
+def test_standalone_questions(question):
+    assert not refers_to_context(question)
+
+@pytest.mark.parametrize("question", [
+    "Why is that?",
+    "now add type hints",
+    "What about sponsored brands?",
+    "Can you explain it in more detail?",
+    "Do the same for video ads",
+    "more examples",
+])
+def test_follow_ups(question):
+    assert refers_to_context(question)
+
+def test_cache_is_consulted_for_standalone_questions_after_the_first_turn():
+    memory = ConversationMemory("session", "GeneralAgent", persist=False, summarizer=lambda prompt: "")
+    assert memory.is_standalone("Why is that?")
+    memory.add_turn("What is ACoS in Amazon Ads?", "Advertising cost of sales.")
+    assert not memory.is_standalone("Why is that?")
+    assert memory.is_standalone("How do negative keywords work in Amazon Ads?")
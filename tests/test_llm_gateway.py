@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import pytest
+
+from utils import llm_gateway
+from utils.llm_gateway import CircuitBreaker, CircuitOpenError, ProviderGuard, TokenBucket
+
+class ServerError(Exception):
+    status_code = 503
+
+@pytest.fixture
+def guard(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "backoff_delay", lambda attempt, error=None: 0)
+    guard = ProviderGuard("test")
+    guard.bucket = TokenBucket(0)
+    guard.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    return guard
+
+def failing():
+    raise ServerError("unavailable")
+
+def open_circuit(guard):
+    with pytest.raises(ServerError):
+        guard.call(failing)
+    assert guard.breaker.state == "open"
+    time.sleep(0.06)
+    assert guard.breaker.state == "half_open"
+
+def test_retries_then_opens_the_circuit(guard):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 2:
+            raise ServerError("busy")
+        return "ok"
+
+    assert guard.call(flaky) == "ok"
+    assert guard.stats["retries"] == 1 and guard.breaker.state == "closed"
+    open_circuit(guard)
+    guard.breaker.opened_at = time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        guard.call(lambda: "never called")
+    assert guard.stats["rejected"] == 1
+
+def test_client_errors_do_not_open_the_circuit(guard):
+    def bad_request():
+        raise ValueError("invalid prompt")
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            guard.call(bad_request)
+    assert guard.breaker.state == "closed" and guard.stats["retries"] == 0
+
+def test_half_open_admits_one_trial_and_closes_on_success(guard):
+    open_circuit(guard)
+    assert guard.call(lambda: "ok") == "ok"
+    assert guard.breaker.state == "closed"
+
+def test_cancelled_half_open_trial_lets_the_next_call_through(guard):
+    open_circuit(guard)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def main():
+        trial = asyncio.ensure_future(guard.acall(hang))
+        await asyncio.sleep(0.01)
+        # While the trial runs, other calls are still refused
+        with pytest.raises(CircuitOpenError):
+            await guard.acall(hang)
+        trial.cancel()
+        await asyncio.gather(trial, return_exceptions=True)
+
+        async def answer():
+            return "ok"
+        return await guard.acall(answer)
+
+    assert asyncio.run(main()) == "ok"
+    assert guard.breaker.state == "closed"
+
+def test_abandoned_half_open_stream_lets_the_next_call_through(guard):
+    open_circuit(guard)
+    chunks = guard.stream(lambda: iter(["a", "b", "c"]))
+    assert next(chunks) == "a"
+    chunks.close()
+    assert list(guard.stream(lambda: iter(["x"]))) == ["x"]
+
+def test_stream_is_not_retried_after_its_first_chunk(guard):
+    def broken():
+        yield "a"
+        raise ServerError("dropped")
+
+    received = []
+    with pytest.raises(ServerError):
+        for chunk in guard.stream(broken):
+            received.append(chunk)
+    assert received == ["a"] and guard.stats["retries"] == 0
+
+def test_token_bucket_spaces_calls_after_its_burst():
+    bucket = TokenBucket(rate_per_minute=600, capacity=2)
+    started = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # Two tokens are available at once, the next two arrive 0.1s apart
+    assert 0.15 <= time.monotonic() - started < 1
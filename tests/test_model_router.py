@@ -0,0 +1,82 @@
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from utils.model_router import classify, score_complexity
+
+SIMPLE = "show rows where campaign contains shoes"
+COMPLEX = "Compare spend across marketplaces where campaign contains shoes and explain why the ACoS differs, step by step"
+STEPS = [
+    "Thought: I need to filter the dataframe\nAction: python_repl_ast\nAction Input: _FILTERED_RESULT_ = df[df['Campaign'].str.contains('shoes')]",
+    "Thought: I now know the final answer\nFinal Answer: 2 rows match.",
+]
+
+class RecordingModel(BaseChatModel):
+    """Replies with a fixed script and keeps every prompt it was sent"""
+
+    replies: list
+    prompts: list
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages)
+        reply = self.replies[min(len(self.prompts), len(self.replies)) - 1]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+def seller_prompts(question):
+    """Prompts the real pandas agent sends for SellerAgent's input to a filtering question"""
+    pd = pytest.importorskip("pandas")
+    pandas_agents = pytest.importorskip("langchain_experimental.agents")
+    from agents.seller_agent import filter_question
+
+    model = RecordingModel(replies=STEPS, prompts=[])
+    df = pd.DataFrame({"Campaign": ["red shoes", "blue shoes", "hats"], "Spend": [120.0, 80.0, 40.0]})
+    agent = pandas_agents.create_pandas_dataframe_agent(llm=model, df=df, allow_dangerous_code=True)
+    agent.invoke({"input": filter_question(question)})
+    return model.prompts
+
+@pytest.mark.parametrize("question, tier", [(SIMPLE, "small"), (COMPLEX, "large")])
+def test_seller_first_step_is_scored_on_the_question(question, tier):
+    first = seller_prompts(question)[0]
+    assert classify(first)[:2] == (tier, score_complexity(question))
+
+def test_seller_steps_after_an_observation_use_the_small_model():
+    prompts = seller_prompts(COMPLEX)
+    assert len(prompts) == 2
+    assert classify(prompts[1]) == ("small", 0.0, "agent_step")
+
+def test_react_question_on_its_own_line():
+    # Same shape as the pandas agent's template: the input starts with a newline and ends with instructions
+    prompt = (
+        "Use the tools below.\n\npython_repl_ast: A Python shell.\n\nUse the following format:\n"
+        "Question: the input question\nThought: ...\nAction: python_repl_ast\nAction Input: ...\nObservation: ...\n\n"
+        f"Begin!\nQuestion: \n            {COMPLEX}\n\n            Also assign the result to _FILTERED_RESULT_.\n            \n"
+    )
+    assert classify([HumanMessage(content=prompt)])[:2] == ("large", score_complexity(COMPLEX))
+    assert classify([HumanMessage(content=prompt + STEPS[0] + "\nObservation: 2 rows\nThought:")]) == ("small", 0.0, "agent_step")
+
+def test_abandoned_stream_finishes_the_route_span(monkeypatch):
+    import asyncio
+    import utils.model_router as model_router
+    from utils.llm_gateway import FakeChatModel
+
+    finished = []
+    monkeypatch.setattr(model_router, "finish_span", lambda span, error=None: finished.append((span, error)))
+    model = model_router.RoutedChatModel(small=FakeChatModel(latency_ms=0), large=FakeChatModel(latency_ms=0))
+    messages = [HumanMessage(content=SIMPLE)]
+
+    chunks = model._stream(messages)
+    next(chunks)
+    chunks.close()
+    assert len(finished) == 1 and finished[0][0].attrs["cancelled"] and finished[0][1] is None
+
+    async def abandon():
+        chunks = model._astream(messages)
+        await chunks.__anext__()
+        await chunks.aclose()
+    asyncio.run(abandon())
+    assert len(finished) == 2 and finished[1][0].attrs["cancelled"]
@@ -0,0 +1,50 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from utils import sandbox
+from utils.sandbox import SandboxPool, _run_cell
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    path = tmp_path_factory.mktemp("sandbox") / "frame.parquet"
+    pd.DataFrame({"Campaign": ["Red Shoes", "Hats", "Blue Shoes"], "Spend": [120.0, 40.0, 80.0]}).to_parquet(path)
+    return str(path)
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(workers=1, cpu_seconds=1, timeout=3, memory_mb=2048).start()
+    yield pool
+    pool.shutdown()
+
+def test_cells_behave_like_the_repl():
+    namespace = {}
+    assert _run_cell("```python\nx = 2\nx * 21\n```", namespace) == ("42", False)
+    assert _run_cell("print('hi')", namespace) == ("hi\n", False)
+    output, failed = _run_cell("1 / 0", namespace)
+    assert failed and output.startswith("ZeroDivisionError")
+
+def test_sessions_keep_state_and_return_the_filtered_result(pool, source):
+    assert pool.run("a", source, "shoes = df[df['Campaign'].str.contains('Shoes')]")[0] == ""
+    output, filtered = pool.run("a", source, "_FILTERED_RESULT_ = shoes\nlen(shoes)")
+    assert output == "2" and list(filtered["Spend"]) == [120.0, 80.0]
+    # Another session has its own namespace over the same frame
+    assert pool.run("b", source, "shoes")[0].startswith("NameError")
+    assert pool.stats["errors"] == 1 and pool.stats["killed"] == 0
+
+def test_a_hung_cell_is_killed_and_the_worker_replaced(pool, source):
+    pool.run("a", source, "x = 1")
+    output, filtered = pool.run("a", source, "import time\ntime.sleep(30)")
+    assert "ran longer than 3s" in output and filtered is None
+    assert pool.stats["killed"] == 1 and pool.get_stats()["restarts"] == 1
+    # The replacement worker answers, without the variables of the killed one
+    assert pool.run("a", source, "len(df)")[0] == "3"
+    assert pool.run("a", source, "x")[0].startswith("NameError")
+
+@pytest.mark.skipif(sandbox.resource is None, reason="CPU limits need the resource module")
+def test_a_cell_over_its_cpu_budget_is_killed(pool, source):
+    pool.timeout = 20
+    output, _ = pool.run("a", source, "while True:\n    pass")
+    assert "1s CPU" in output and pool.stats["killed"] == 1
+    assert pool.run("a", source, "df['Spend'].sum()")[0] == "240.0"
@@ -0,0 +1,28 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from agents.seller_index import TokenIndex, build_token_index
+from agents.seller_planner import QueryPlanner
+
+VALUES = ["Red Shoes", "blue shoes - SALE", "Hats", None, "Red-Shoe Outlet", "socks & shoes", "Summer Hats 2024", "red shoes"]
+
+@pytest.fixture(params=["object", "category"])
+def df(request):
+    return pd.DataFrame({"Campaign": pd.Series(VALUES * 3, dtype=request.param), "Spend": range(len(VALUES) * 3)})
+
+@pytest.mark.parametrize("term", ["shoes", "SHOE", "sho", "red shoes", "red-shoe", "shoes - sale", "2024", "& ", "-", "boots", "s h"])
+def test_contains_matches_a_pandas_scan(df, term):
+    index = build_token_index(df, background=False)
+    expected = df["Campaign"].astype(str).where(df["Campaign"].notna(), "").str.contains(term, case=False, regex=False).to_numpy()
+    assert index.contains("Campaign", term).tolist() == expected.tolist()
+
+def test_unindexed_columns_and_unbuilt_index_return_none(df):
+    assert build_token_index(df, background=False).contains("Spend", "1") is None
+    assert TokenIndex(df).contains("Campaign", "shoes") is None
+
+def test_planner_gives_the_same_rows_with_and_without_the_index(df):
+    index = build_token_index(df, background=False)
+    plan = QueryPlanner(df).plan("list rows where campaign contains red shoe")
+    assert plan.execute(df, index).equals(plan.execute(df))
+    assert len(plan.execute(df, index)) == 6
@@ -0,0 +1,82 @@
+import uuid
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from agents import seller_out_of_core
+from agents.seller_out_of_core import OutOfCoreDataset, ResultTooLarge
+from agents.seller_planner import QueryPlanner
+
+QUESTIONS = [
+    "list rows where campaign contains shoes",
+    "how many rows where spend > 20",
+    "total spend",
+    "average spend by ad group",
+    "max clicks by ad group where campaign contains hats",
+    "min spend",
+    "median spend by ad group",
+    "number of campaigns",
+    "number of campaigns by ad group where spend > 10",
+    "top 2 ad groups by spend",
+    "bottom 3 rows by clicks",
+    "sort rows by spend descending",
+]
+
+@pytest.fixture
+def df():
+    campaigns = ["Red Shoes", "Blue Shoes", "Hats", "Summer Hats", "Socks"]
+    return pd.DataFrame({
+        "Campaign": [campaigns[i % 5] for i in range(23)],
+        "Ad Group": [f"g{i % 4}" for i in range(23)],
+        "Spend": [round(i * 1.7 % 31, 2) for i in range(23)],
+        "Clicks": [i * 7 % 13 for i in range(23)],
+    })
+
+@pytest.fixture(params=["parquet", "csv"])
+def dataset(request, df, tmp_path):
+    csv_path = tmp_path / "report.csv"
+    df.to_csv(csv_path, index=False)
+    dataset = OutOfCoreDataset(str(csv_path), uuid.uuid4().hex, chunk_rows=4)
+    assert dataset.parquet_path
+    if request.param == "csv":
+        # Same as a file whose Parquet conversion failed
+        dataset.parquet_path = None
+    return dataset
+
+def normalized(result):
+    if isinstance(result, pd.DataFrame):
+        result = result.round(6)
+        return sorted(map(tuple, result.astype(str).to_numpy().tolist()))
+    return round(float(result), 6)
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_chunked_results_match_pandas(df, dataset, question):
+    plan = QueryPlanner(df).plan(question)
+    assert plan is not None
+    result, matched = dataset.execute(plan)
+    expected = plan.execute(df)
+    if plan.kind in ("rows", "sort"):
+        assert matched == len(expected)
+    assert normalized(result) == normalized(expected)
+
+def test_matching_rows_are_streamed_to_the_export(df, dataset, tmp_path):
+    plan = QueryPlanner(df).plan("list rows where campaign contains hats")
+    export_path = tmp_path / "export.csv"
+    preview, matched = dataset.execute(plan, export_path=str(export_path))
+    exported = pd.read_csv(export_path)
+    assert matched == len(exported) == len(plan.execute(df)) and len(preview) == min(matched, 10)
+
+def test_oversized_median_is_refused(df, dataset, monkeypatch):
+    monkeypatch.setattr(seller_out_of_core, "OUT_OF_CORE_MAX_RESULT_ROWS", 5)
+    with pytest.raises(ResultTooLarge):
+        dataset.execute(QueryPlanner(df).plan("median spend"))
+
+def test_truncated_sort_says_so(df, dataset, monkeypatch):
+    monkeypatch.setattr(seller_out_of_core, "OUT_OF_CORE_MAX_RESULT_ROWS", 5)
+    plan = QueryPlanner(df).plan("sort rows by spend descending")
+    result, matched = dataset.execute(plan)
+    assert len(result) == 5 and matched == len(df)
+    assert list(result["Spend"]) == sorted(df["Spend"], reverse=True)[:5]
+    assert "truncated" in plan.format_response(result, len(df), matched_rows=matched)
@@ -0,0 +1,64 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from agents.seller_planner import QueryPlanner
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "Campaign Name": ["Red Shoes", "Blue Shoes", "Hats", "Summer Hats", "Socks"],
+        "Ad Group": ["a", "b", "a", "c", "b"],
+        "Spend": [120.0, 80.0, 40.0, 60.0, 10.0],
+        "Clicks": [30, 20, 10, 15, 2],
+    })
+
+@pytest.fixture
+def planner(df):
+    return QueryPlanner(df)
+
+@pytest.mark.parametrize("question, filters", [
+    ("list rows where campaign contains shoes", [("Campaign Name", "contains", "shoes")]),
+    ("show rows where campaign does not contain shoes", [("Campaign Name", "not_contains", "shoes")]),
+    ("list rows where campaign is like shoes", [("Campaign Name", "contains", "shoes")]),
+    ("show rows where spend is greater than 50", [("Spend", ">", 50.0)]),
+    ("show rows where ad group is not a", [("Ad Group", "!=", "a")]),
+    ("show rows where campaign is 'Hats or Caps'", [("Campaign Name", "==", "Hats or Caps")]),
+    ("find rows where spend over 50 and campaign contains hats", [("Spend", ">", 50.0), ("Campaign Name", "contains", "hats")]),
+])
+def test_filters(planner, question, filters):
+    plan = planner.plan(question)
+    assert plan.kind == "rows" and plan.filters == filters
+
+@pytest.mark.parametrize("question", [
+    # Disjunctions and stacked operators go to the LLM instead of matching a literal "a or b"
+    "show rows where ad group is a or b",
+    "list rows where spend is over under 50",
+    "show rows where campaign contains shoes or hats",
+    "list rows where spend is greater than or equal to 50",
+    # Unknown columns, non-numeric comparisons and free-form questions
+    "show rows where budget is over 50",
+    "show rows where campaign is over hats",
+    "why did spend drop last week",
+])
+def test_unclear_questions_fall_back(planner, question):
+    assert planner.plan(question) is None
+
+def test_execution(planner, df):
+    rows = planner.plan("list rows where campaign contains shoes").execute(df)
+    assert list(rows["Campaign Name"]) == ["Red Shoes", "Blue Shoes"]
+    assert planner.plan("how many rows where spend > 50").execute(df) == 3
+    assert planner.plan("total spend where campaign contains hats").execute(df) == 100.0
+    assert planner.plan("number of ad groups where spend > 50").execute(df) == 3
+    top = planner.plan("top 2 ad groups by spend").execute(df)
+    assert list(top["Ad Group"]) == ["a", "b"] and list(top["sum_Spend"]) == [160.0, 90.0]
+    ordered = planner.plan("sort rows by clicks descending").execute(df)
+    assert list(ordered["Clicks"]) == [30, 20, 15, 10, 2]
+
+def test_counting_a_numeric_column_falls_back(planner):
+    # "number of clicks" could mean their sum or distinct values
+    assert planner.plan("number of clicks") is None
+
+def test_no_matches_are_reported(planner, df):
+    plan = planner.plan("list rows where campaign contains boots")
+    assert plan.format_response(plan.execute(df), len(df)).endswith("No rows matched.")
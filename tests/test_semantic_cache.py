@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+import pytest
+
+from database.semantic_cache import SemanticCache, query_literals
+from database.write_behind import conversation_writer
+
+class WordEmbedder:
+    """Bag-of-words vectors: questions sharing most words score above the threshold"""
+
+    def embed_query(self, text):
+        vector = np.zeros(256, dtype=np.float32)
+        for word in text.lower().replace("?", "").split():
+            vector[hash(word) % 256] += 1
+        return vector
+
+@pytest.fixture
+def cache():
+    return SemanticCache(threshold=0.8, embedder=WordEmbedder())
+
+def ask(cache, question, **kwargs):
+    return cache.lookup(question, agent="test", doc_hash="doc", **kwargs)
+
+def test_near_duplicate_questions_hit(cache):
+    cache.store("what is the total spend for the brand campaign", "120", agent="test", doc_hash="doc")
+    assert ask(cache, "What is the total spend for the brand campaign?") == "120"
+    assert ask(cache, "so what is the total spend for the brand campaign") == "120"
+    assert cache.stats["semantic_hits"] == 1
+
+@pytest.mark.parametrize("stored, asked", [
+    ("show the top 5 campaigns by spend for the brand", "show the top 10 campaigns by spend for the brand"),
+    ("list campaigns where spend > 100 for the brand", "list campaigns where spend > 1000 for the brand"),
+    ("list rows where campaign contains 'shoes' please", "list rows where campaign contains 'hats' please"),
+    ("list rows where the campaign name contains shoes", "list rows where the campaign name does not contain shoes"),
+    ("list rows where the campaign name contains shoes", "list rows where the campaign name doesn't contain shoes"),
+])
+def test_questions_differing_in_literals_or_negation_miss(cache, stored, asked):
+    assert query_literals(stored) != query_literals(asked)
+    cache.store(stored, "stored answer", agent="test", doc_hash="doc")
+    assert ask(cache, asked) is None
+
+def test_exact_only_lookups_ignore_near_matches(cache):
+    cache.store("list rows where campaign name contains shoes", "2 rows", agent="test", doc_hash="doc")
+    assert ask(cache, "list rows where campaign name contains hats", semantic=False) is None
+    assert ask(cache, "List rows where campaign name contains shoes?", semantic=False) == "2 rows"
+
+def test_answers_expire_after_the_ttl(cache):
+    cache.ttl_seconds = 0.05
+    cache.store("what is the total spend for the brand campaign", "120", agent="test", doc_hash="fresh-doc")
+    time.sleep(0.06)
+    cache.lookup("anything", agent="test", doc_hash="other")
+    assert ("test", "fresh-doc", "what is the total spend for the brand campaign") not in cache._entries
+    assert cache.stats["evictions"] == 1
+
+def test_warmed_answers_keep_their_age():
+    writer = SemanticCache(embedder=WordEmbedder())
+    writer.store("how many campaigns are paused in the account", "3", agent="warm-test", doc_hash="doc")
+    conversation_writer.flush(timeout=10)
+    time.sleep(0.2)
+
+    restarted = SemanticCache(ttl_seconds=0.1, embedder=WordEmbedder())
+    restarted.lookup("unrelated", agent="warm-test", doc_hash="other")
+    # Stored 0.2s ago with a 0.1s TTL: expired on warm-up instead of starting a fresh TTL
+    assert ("warm-test", "doc", "how many campaigns are paused in the account") not in restarted._entries
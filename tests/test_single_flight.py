@@ -0,0 +1,73 @@
+import asyncio
+
+from agents.pool import AgentPool
+from utils.single_flight import SingleFlight
+
+class Agent:
+    def __init__(self):
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+    def memory_usage(self):
+        return 1
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def answer():
+        calls.append(1)
+        for chunk in ["a", ("export", 3), "b"]:
+            await asyncio.sleep(0.01)
+            yield chunk
+
+    async def ask():
+        return [chunk async for chunk in flights.stream("key", answer)]
+
+    async def main():
+        first = asyncio.ensure_future(ask())
+        await asyncio.sleep(0.015)
+        # The late caller replays the chunks it missed, including non-text ones
+        return await asyncio.gather(first, ask())
+
+    assert asyncio.run(main()) == [["a", ("export", 3), "b"]] * 2
+    assert calls == [1] and flights.stats == {"leaders": 1, "coalesced": 1} and flights.in_flight() == 0
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def main():
+        return await asyncio.gather(*(flights.run("key", failing) for _ in range(2)), return_exceptions=True)
+
+    assert [str(e) for e in asyncio.run(main())] == ["provider down"] * 2
+
+def test_leader_leaving_does_not_cancel_the_call_or_its_lease():
+    flights = SingleFlight()
+    pool = AgentPool(memory_budget_bytes=0)
+    agent = Agent()
+    pool.set_agent("leader", "Seller Queries", agent)
+
+    async def leased_answer():
+        # Same shape as main.leased_answer: the producer holds the lease, not the leader
+        with pool.lease(agent):
+            await asyncio.sleep(0.05)
+            yield "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(flights.stream("key", leased_answer).__anext__())
+        follower = asyncio.ensure_future(flights.stream("key", leased_answer).__anext__())
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        # Replacing the leader's agent while the call runs defers its release
+        pool.set_agent("leader", "Seller Queries", Agent())
+        assert not agent.released
+        return await follower
+
+    assert asyncio.run(main()) == "answer"
+    assert agent.released
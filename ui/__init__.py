@@ -3,10 +3,7 @@ from .components import (
     create_buttons, 
     create_file_inputs, 
     create_layout,
-    update_layout_with_download_button,
-    chat_interface,
-    layout,
-    download_button
+    update_layout_with_download_button
 )
 
 __all__ = [
@@ -14,8 +11,5 @@ __all__ = [
     'create_buttons',
     'create_file_inputs',
     'create_layout',
-    'update_layout_with_download_button',
-    'chat_interface',
-    'layout',
-    'download_button'
-]
\ No newline at end of file
+    'update_layout_with_download_button'
+]
@@ -2,16 +2,12 @@ import panel as pn
 from typing import Dict, Any, Optional, List
 import os
 
-# Global UI components
-chat_interface = None
-layout = None
-download_button = None
+from utils.exports import EXPORT_FORMATS
 
+# Components are created per browser session by main.py and passed in; nothing is kept here
 def create_chat_interface(callback):
     """Create the chat interface component"""
-    global chat_interface
-    chat_interface = pn.chat.ChatInterface(callback=callback, callback_user="BOT")
-    return chat_interface
+    return pn.chat.ChatInterface(callback=callback, callback_user="BOT")
 
 def create_buttons():
     """Create the main navigation buttons"""
@@ -32,8 +28,7 @@ def create_file_inputs():
 
 def create_layout(buttons):
     """Create the main application layout"""
-    global layout
-    layout = pn.Column(
+    return pn.Column(
         pn.layout.VSpacer(),
         pn.Row(
             pn.layout.HSpacer(),
@@ -42,23 +37,40 @@ def create_layout(buttons):
         ),
         pn.layout.VSpacer()
     )
-    return layout
 
-def update_layout_with_download_button(file_path: str, row_count: int):
-    """Update the layout with a download button for filtered data"""
-    global layout, download_button, chat_interface
+def update_layout_with_download_button(layout, export, row_count: int):
+    """Update a session's layout with a download button for filtered data.
+
+    export is a DataExport, serialized as CSV or Parquet only when the button is
+    clicked, or the path of a file that already exists.
+    """
+    if isinstance(export, str):
+        download_button = pn.widgets.FileDownload(
+            file=export,
+            filename=os.path.basename(export),
+            button_type="success",
+            label=f"Download Filtered Data ({row_count} rows)"
+        )
+        controls = download_button
+    else:
+        format_select = pn.widgets.RadioButtonGroup(options=list(EXPORT_FORMATS), value="CSV", button_type="light")
+        download_button = pn.widgets.FileDownload(
+            callback=lambda: export.open(format_select.value),
+            filename=export.filename(format_select.value),
+            button_type="success",
+            label=f"Download Filtered Data ({row_count} rows)"
+        )
+        format_select.param.watch(lambda event: setattr(download_button, "filename", export.filename(event.new)), "value")
+        controls = pn.Row(format_select, download_button, css_classes=["download-controls"])
     
-    if layout is None:
-        return
+    current_objects = list(layout.objects)
     
-    download_button = pn.widgets.FileDownload(
-        file=file_path,
-        filename=os.path.basename(file_path),
-        button_type="success",
-        label=f"Download Filtered Data ({row_count} rows)"
-    )
+    # Remove any existing download buttons
+    current_objects = [
+        obj for obj in current_objects
+        if not isinstance(obj, pn.widgets.FileDownload) and "download-controls" not in getattr(obj, "css_classes", [])
+    ]
     
-    current_objects = list(layout.objects)
     # Find the position of chat_interface
     chat_interface_position = -1
     for i, obj in enumerate(current_objects):
@@ -66,13 +78,10 @@ def update_layout_with_download_button(file_path: str, row_count: int):
             chat_interface_position = i
             break
     
-    # Remove any existing download buttons
-    current_objects = [obj for obj in current_objects if not isinstance(obj, pn.widgets.FileDownload)]
-    
     # Insert the new download button before chat_interface
     if chat_interface_position != -1:
-        current_objects.insert(chat_interface_position, download_button)
+        current_objects.insert(chat_interface_position, controls)
     else:
-        current_objects.append(download_button)
+        current_objects.append(controls)
     
     layout.objects = current_objects
\ No newline at end of file
@@ -1,3 +1,10 @@
-from .helpers import ensure_uploads_dir
+from .helpers import ensure_uploads_dir, file_sha256
+from .concurrency import run_blocking, iterate_blocking, query_slot, get_executor, QueryLimiter
+from .embedding_service import EmbeddingService, get_embedding_service
+from .sandbox import SandboxPool, sandbox_pool
+from .exports import DataExport, EXPORT_FORMATS
+from .uploads import cleanup_uploads, retain
+from .single_flight import SingleFlight, query_flights
+from .tracing import span, metrics, start_metrics_server
 
-__all__ = ['ensure_uploads_dir']
\ No newline at end of file
+__all__ = ['ensure_uploads_dir', 'file_sha256', 'run_blocking', 'iterate_blocking', 'query_slot', 'get_executor', 'QueryLimiter', 'EmbeddingService', 'get_embedding_service', 'SandboxPool', 'sandbox_pool', 'DataExport', 'EXPORT_FORMATS', 'cleanup_uploads', 'retain', 'SingleFlight', 'query_flights', 'span', 'metrics', 'start_metrics_server']
@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Bounded pool for blocking agent work (sync LLM clients, pandas, SQLite, embeddings)
+AGENT_THREAD_POOL_SIZE = int(os.getenv("AGENT_THREAD_POOL_SIZE", 8))
+# Maximum number of agent queries executing at once in this process
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", 16))
+
+_executor = ThreadPoolExecutor(max_workers=AGENT_THREAD_POOL_SIZE, thread_name_prefix="agent-worker")
+
+def get_executor():
+    """Return the shared thread pool used for blocking agent work"""
+    return _executor
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable on the shared thread pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    # Copy the caller's context so tracing spans opened in func nest under the caller's span
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+class _StreamError:
+    def __init__(self, error):
+        self.error = error
+
+async def iterate_blocking(func, *args, **kwargs):
+    """Consume a blocking generator on the shared thread pool, yielding its items asynchronously"""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for item in func(*args, **kwargs):
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, _StreamError(e))
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = loop.run_in_executor(_executor, contextvars.copy_context().run, produce)
+    while True:
+        item = await queue.get()
+        if item is done:
+            break
+        if isinstance(item, _StreamError):
+            raise item.error
+        yield item
+    await producer
+
+class QueryLimiter:
+    """Async context manager limiting concurrent queries across every event loop in the process.
+
+    An asyncio.Semaphore belongs to the loop that first waits on it, but Panel serves
+    sessions from several loops and batch.py runs its own. Slots are counted under a
+    thread lock; a released slot is handed to the oldest waiter on that waiter's loop.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._active = 0
+        # (loop, future) of queries waiting for a slot, oldest first
+        self._waiters = deque()
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                return self
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = (loop, waiter) in self._waiters
+                if queued:
+                    self._waiters.remove((loop, waiter))
+            # A slot handed over just before the cancellation is passed on
+            if not queued and waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._release()
+
+    def _release(self):
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._hand_over, waiter)
+                    return
+                except RuntimeError:
+                    continue  # the waiter's loop has closed
+            self._active -= 1
+
+    def _hand_over(self, waiter):
+        if waiter.cancelled():
+            self._release()
+        else:
+            waiter.set_result(None)
+
+_query_limiter = QueryLimiter(AGENT_MAX_CONCURRENCY)
+
+def query_slot():
+    """Async context manager enforcing the per-process agent concurrency limit"""
+    return _query_limiter
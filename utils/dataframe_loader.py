@@ -0,0 +1,99 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.helpers import ensure_uploads_dir, file_sha256
+
+# Parquet copies of parsed CSVs, keyed by the SHA-256 of the uploaded file
+COLUMNAR_CACHE_DIR = os.path.join("uploads", ".columnar_cache")
+# String columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = float(os.getenv("CATEGORY_MAX_UNIQUE_RATIO", 0.5))
+
+def _downcast_numeric(series):
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if pd.api.types.is_float_dtype(series):
+        downcast = pd.to_numeric(series, downcast="float")
+        # Only keep float32 when every value survives the round trip exactly
+        if downcast.dtype != series.dtype and not np.array_equal(downcast.to_numpy(dtype="float64"), series.to_numpy(), equal_nan=True):
+            return series
+        return downcast
+    return series
+
+def optimize_dtypes(df):
+    """Downcast numeric columns and turn low-cardinality strings into categoricals"""
+    optimized = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            optimized[col] = _downcast_numeric(series)
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            non_null = series.dropna()
+            if len(non_null) and non_null.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(non_null):
+                optimized[col] = series.astype("category")
+            else:
+                optimized[col] = series
+        else:
+            optimized[col] = series
+    return pd.DataFrame(optimized, index=df.index)
+
+def _columnar_cache_path(doc_hash: str) -> str:
+    return os.path.join(COLUMNAR_CACHE_DIR, f"{doc_hash}.parquet")
+
+def _write_columnar_cache(df, path: str):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    ensure_uploads_dir()
+    os.makedirs(COLUMNAR_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, engine="pyarrow", index=False)
+    os.replace(tmp_path, path)
+    return True
+
+def load_csv(csv_path: str, doc_hash: str = None):
+    """Load a CSV with compact dtypes, reusing the Parquet copy from an earlier upload.
+
+    Returns (df, report) where report describes the memory saved by the typed load.
+    """
+    started = time.perf_counter()
+    doc_hash = doc_hash or file_sha256(csv_path)
+    cache_path = _columnar_cache_path(doc_hash)
+    report = {"file_bytes": os.path.getsize(csv_path), "columnar_cache": cache_path}
+
+    if os.path.exists(cache_path):
+        df = pd.read_parquet(cache_path, engine="pyarrow", memory_map=True)
+        report["source"] = "columnar_cache"
+        report["raw_bytes"] = None
+    else:
+        raw = pd.read_csv(csv_path)
+        report["source"] = "csv"
+        report["raw_bytes"] = int(raw.memory_usage(deep=True).sum())
+        df = optimize_dtypes(raw)
+        del raw
+        if not _write_columnar_cache(df, cache_path):
+            report["columnar_cache"] = None
+
+    report["rows"] = len(df)
+    report["columns"] = len(df.columns)
+    report["optimized_bytes"] = int(df.memory_usage(deep=True).sum())
+    if report["raw_bytes"]:
+        report["saved_bytes"] = report["raw_bytes"] - report["optimized_bytes"]
+        report["saved_pct"] = 100.0 * report["saved_bytes"] / report["raw_bytes"]
+    report["load_seconds"] = time.perf_counter() - started
+    return df, report
+
+def format_memory_report(report) -> str:
+    """One-line summary of a load_csv report for the chat"""
+    mb = 1024 * 1024
+    summary = f"{report['rows']:,} rows × {report['columns']} columns, {report['optimized_bytes'] / mb:.1f} MB in memory"
+    if report.get("saved_bytes") is not None:
+        summary += f" (was {report['raw_bytes'] / mb:.1f} MB untyped, saved {report['saved_pct']:.0f}%)"
+    if report["source"] == "columnar_cache":
+        summary += f", loaded from the columnar cache in {report['load_seconds']:.2f}s"
+    else:
+        summary += f", parsed in {report['load_seconds']:.2f}s"
+    return summary
@@ -0,0 +1,205 @@
+import hashlib
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    import resource
+except ImportError:  # Windows: stats are reported without the process peak RSS
+    resource = None
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# "sentence-transformers" loads EMBEDDING_MODEL_NAME; "fake" hashes words into vectors for offline benchmarks
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+# Maximum texts encoded in one forward pass and how long to wait for other requests to join it
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+
+class HashingEmbeddingModel:
+    """Offline stand-in for a sentence-transformer: each word adds a fixed pseudo-random vector.
+
+    Deterministic and dependency-free; texts sharing words get similar vectors, which is
+    enough to exercise retrieval and the semantic cache without downloading a model.
+    """
+
+    tokenizer = None
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self._word_vectors = {}
+
+    def _word_vector(self, word: str):
+        import numpy as np
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype("float32")
+            self._word_vectors[word] = vector
+        return vector
+
+    def encode(self, texts, batch_size: int = None, convert_to_numpy: bool = True):
+        import numpy as np
+        vectors = np.zeros((len(texts), self.dimension), dtype="float32")
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i] += self._word_vector(word)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def parameters(self):
+        return []
+
+class EmbeddingService:
+    """Process-wide sentence-transformer shared by PDF ingestion, retrieval and the answer cache.
+
+    The model is loaded once, on first use or by warm_up(). Concurrent requests from
+    different sessions are queued and coalesced by a single worker thread into one
+    encode() call, up to batch_size texts. Implements the embed_documents/embed_query
+    interface LangChain vector stores expect.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, batch_size: int = EMBEDDING_BATCH_SIZE, batch_wait_ms: float = EMBEDDING_BATCH_WAIT_MS):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "load_seconds": None,
+            "requests": 0,
+            "texts": 0,
+            "forward_passes": 0,
+            "encode_seconds": 0.0,
+            "max_encode_seconds": 0.0,
+        }
+
+    def load_model(self):
+        """Load the sentence-transformer once per process and return it"""
+        with self._load_lock:
+            if self._model is None:
+                started = time.perf_counter()
+                if EMBEDDING_BACKEND == "fake":
+                    self._model = HashingEmbeddingModel()
+                else:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+                self._stats["load_seconds"] = time.perf_counter() - started
+        return self._model
+
+    def warm_up(self, background: bool = True):
+        """Load the model and run one encode so the first real request is fast"""
+        def _warm():
+            try:
+                self.embed_query("warm up")
+            except Exception as e:
+                print(f"Error warming up embedding model: {e}")
+
+        if background:
+            threading.Thread(target=_warm, name="embedding-warmup", daemon=True).start()
+        else:
+            _warm()
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            count = len(pending[0][0])
+            deadline = time.perf_counter() + self.batch_wait
+            # Gather other sessions' requests that arrive within the batching window
+            while count < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(request)
+                count += len(request[0])
+            self._encode(pending)
+
+    def _encode(self, pending):
+        texts = [text for request_texts, _ in pending for text in request_texts]
+        try:
+            model = self.load_model()
+            started = time.perf_counter()
+            vectors = model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True).tolist()
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        with self._stats_lock:
+            self._stats["forward_passes"] += 1
+            self._stats["encode_seconds"] += elapsed
+            self._stats["max_encode_seconds"] = max(self._stats["max_encode_seconds"], elapsed)
+        offset = 0
+        for request_texts, future in pending:
+            future.set_result(vectors[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def embed_documents(self, texts):
+        """Embed a list of texts, sharing forward passes with concurrent callers"""
+        texts = list(texts)
+        if not texts:
+            return []
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["texts"] += len(texts)
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def embed_query(self, text: str):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        from utils.concurrency import run_blocking
+        return await run_blocking(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str):
+        from utils.concurrency import run_blocking
+        return await run_blocking(self.embed_query, text)
+
+    def get_stats(self):
+        """Load time, batching efficiency, encode latency and memory usage"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        passes = stats["forward_passes"]
+        stats["model_name"] = self.model_name
+        stats["loaded"] = self._model is not None
+        stats["avg_texts_per_pass"] = stats["texts"] / passes if passes else 0.0
+        stats["avg_encode_seconds"] = stats["encode_seconds"] / passes if passes else 0.0
+        stats["queued_requests"] = self._queue.qsize()
+        stats["model_parameter_bytes"] = (
+            sum(p.numel() * p.element_size() for p in self._model.parameters()) if self._model is not None else 0
+        )
+        if resource is not None:
+            # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            stats["process_peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+        return stats
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_embedding_service():
+    """Return the process-wide embedding service"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EmbeddingService()
+        return _service
@@ -0,0 +1,75 @@
+import os
+import tempfile
+
+from utils.tracing import span
+from utils.uploads import retain
+
+# Rows serialized per chunk when an export is produced
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 100_000))
+# Exports larger than this spill from memory to a temporary file while being built
+EXPORT_SPOOL_MB = int(os.getenv("EXPORT_SPOOL_MB", 64))
+
+EXPORT_FORMATS = {"CSV": ".csv", "Parquet": ".parquet"}
+
+class DataExport:
+    """A filtered result that is only serialized when the user downloads it.
+
+    Holds either the result DataFrame or the path of a CSV the rows were already
+    streamed to (out-of-core queries). open() writes the requested format chunk by
+    chunk into a spooled temporary file and returns it rewound.
+    """
+
+    def __init__(self, df=None, csv_path: str = None, name: str = "filtered_data"):
+        if df is None and csv_path is None:
+            raise ValueError("DataExport needs a DataFrame or a CSV path")
+        self.df = df
+        self.csv_path = csv_path
+        self.name = name
+        # A streamed export file lives as long as the download button that serves it
+        retain(self, csv_path)
+
+    def filename(self, fmt: str = "CSV") -> str:
+        return f"{self.name}{EXPORT_FORMATS[fmt]}"
+
+    def open(self, fmt: str = "CSV"):
+        """Return a readable binary file with the export in fmt ("CSV" or "Parquet")"""
+        out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MB * 1024 * 1024)
+        with span("export", agent="SellerAgent", format=fmt) as export_span:
+            if fmt == "Parquet":
+                self._write_parquet(out)
+            elif self.df is not None:
+                self._write_csv(out)
+            else:
+                with open(self.csv_path, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        out.write(block)
+            export_span.set(bytes=out.tell())
+        out.seek(0)
+        return out
+
+    def _write_csv(self, out):
+        for start in range(0, max(len(self.df), 1), EXPORT_CHUNK_ROWS):
+            chunk = self.df.iloc[start:start + EXPORT_CHUNK_ROWS]
+            out.write(chunk.to_csv(index=False, header=start == 0).encode("utf-8"))
+
+    def _write_parquet(self, out):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.df is None:
+            import pyarrow.csv as pa_csv
+            reader = pa_csv.open_csv(self.csv_path)
+            with pq.ParquetWriter(out, reader.schema, compression="zstd") as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+            return
+        writer = None
+        try:
+            for start in range(0, max(len(self.df), 1), EXPORT_CHUNK_ROWS):
+                table = pa.Table.from_pandas(self.df.iloc[start:start + EXPORT_CHUNK_ROWS], preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(out, table.schema, compression="zstd")
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
@@ -1,6 +1,15 @@
+import hashlib
 import os
 
 def ensure_uploads_dir():
     """Ensure the uploads directory exists"""
     os.makedirs("uploads", exist_ok=True)
-    return "uploads"
\ No newline at end of file
+    return "uploads"
+
+def file_sha256(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,478 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Iterator, AsyncIterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .tracing import span, start_span, finish_span
+
+# "groq" talks to the real providers; "fake" answers locally for offline load tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+# Requests per minute allowed per provider before callers wait for a token
+LLM_RATE_LIMIT_RPM = {
+    "groq": float(os.getenv("LLM_RATE_LIMIT_RPM_GROQ", 30)),
+    "codegpt": float(os.getenv("LLM_RATE_LIMIT_RPM_CODEGPT", 60)),
+    # 0 disables the limiter, so offline load tests measure the app rather than the bucket
+    "fake": float(os.getenv("LLM_RATE_LIMIT_RPM_FAKE", 0)),
+}
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 0.5))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", 20))
+# Consecutive failures that open a provider's circuit, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30))
+# Connections shared by every session's requests to one provider
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", 200))
+# Code the fake model submits on its one python_repl_ast step, so offline agent runs exercise the REPL
+LLM_FAKE_REACT_CODE = os.getenv("LLM_FAKE_REACT_CODE", "_FILTERED_RESULT_ = df.head(10)\nprint(len(df))")
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by threads and event loops"""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 6)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token, returning how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        if self.rate > 0:
+            wait = self._reserve()
+            if wait:
+                time.sleep(wait)
+
+    async def aacquire(self):
+        if self.rate > 0:
+            wait = self._reserve()
+            if wait:
+                await asyncio.sleep(wait)
+
+class CircuitBreaker:
+    """Fails fast after repeated provider errors, then lets one trial request through after a cool-down"""
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError or admit the call; returns True if it is the half-open trial"""
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._trial_in_flight):
+                wait = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+                raise CircuitOpenError(f"LLM provider unavailable; retrying in {wait:.0f}s")
+            if state == "half_open":
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def abandon_trial(self):
+        """A trial cancelled before the provider answered says nothing about it; let the next call try"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # A failed half-open trial re-opens the circuit for another cool-down
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+def _status_code(error):
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+def is_retryable(error) -> bool:
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying"""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(error).__name__
+    return isinstance(error, (TimeoutError, ConnectionError)) or any(key in name for key in ("Timeout", "Connection", "RateLimit"))
+
+def _retry_after(error) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, error=None) -> float:
+    """Full-jitter exponential backoff, honouring a provider's Retry-After when it sends one"""
+    retry_after = _retry_after(error) if error is not None else None
+    if retry_after is not None:
+        return min(retry_after, LLM_BACKOFF_MAX_SECONDS)
+    return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+class ProviderGuard:
+    """Rate limit, retries and circuit breaker for one provider"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.bucket = TokenBucket(LLM_RATE_LIMIT_RPM.get(name, 60))
+        self.breaker = CircuitBreaker()
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _before(self) -> bool:
+        try:
+            trial = self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("rejected")
+            raise
+        self._count("calls")
+        return trial
+
+    def _abandoned(self, trial: bool):
+        """The caller was cancelled or stopped reading a stream mid-call"""
+        if trial:
+            self.breaker.abandon_trial()
+
+    def _failed(self, error, attempt: int, retry: bool = True) -> bool:
+        """Record a failure; returns True if the call should be retried"""
+        self._count("failures")
+        if not is_retryable(error):
+            # The provider answered, so a bad request counts as healthy for the breaker
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        if retry and attempt < LLM_MAX_RETRIES and self.breaker.state != "open":
+            self._count("retries")
+            return True
+        return False
+
+    def call(self, func, *args, **kwargs):
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            trial = self._before()
+            try:
+                self.bucket.acquire()
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not self._failed(e, attempt):
+                    raise
+                time.sleep(backoff_delay(attempt, e))
+                continue
+            except BaseException:
+                self._abandoned(trial)
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, func, *args, **kwargs):
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            trial = self._before()
+            try:
+                await self.bucket.aacquire()
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if not self._failed(e, attempt):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, e))
+                continue
+            except BaseException:
+                self._abandoned(trial)
+                raise
+            self.breaker.record_success()
+            return result
+
+    def stream(self, func, *args, **kwargs):
+        """Retry a streaming call only until its first chunk, so no chunk is ever sent twice"""
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            trial = self._before()
+            started = False
+            try:
+                self.bucket.acquire()
+                for chunk in func(*args, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if not self._failed(e, attempt, retry=not started):
+                    raise
+                time.sleep(backoff_delay(attempt, e))
+                continue
+            except BaseException:
+                # Includes GeneratorExit when the consumer stops reading
+                self._abandoned(trial)
+                raise
+            self.breaker.record_success()
+            return
+
+    async def astream(self, func, *args, **kwargs):
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            trial = self._before()
+            started = False
+            try:
+                await self.bucket.aacquire()
+                async for chunk in func(*args, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if not self._failed(e, attempt, retry=not started):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, e))
+                continue
+            except BaseException:
+                self._abandoned(trial)
+                raise
+            self.breaker.record_success()
+            return
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["circuit"] = self.breaker.state
+        return stats
+
+_guards = {}
+_models = {}
+_lock = threading.Lock()
+
+def get_guard(provider: str) -> ProviderGuard:
+    with _lock:
+        if provider not in _guards:
+            _guards[provider] = ProviderGuard(provider)
+        return _guards[provider]
+
+class GatewayChatModel(BaseChatModel):
+    """LangChain chat model that routes every call through a provider's ProviderGuard.
+
+    Drop-in for ChatGroq in chains and agents; the wrapped model is shared by all
+    sessions so its pooled HTTP connections are reused.
+    """
+
+    inner: Any
+    provider: str = "groq"
+
+    @property
+    def _llm_type(self) -> str:
+        return f"gateway-{self.provider}"
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.inner, "model_name", self.provider)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        with span("llm", model=self.model_name, provider=self.provider) as llm_span:
+            result = get_guard(self.provider).call(self.inner._generate, messages, stop=stop, **kwargs)
+            llm_span.set(**_result_usage(result))
+            return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        with span("llm", model=self.model_name, provider=self.provider) as llm_span:
+            result = await get_guard(self.provider).acall(self.inner._agenerate, messages, stop=stop, **kwargs)
+            llm_span.set(**_result_usage(result))
+            return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        # Not made current: a generator's context changes would leak into the consumer between chunks
+        llm_span = start_span("llm", model=self.model_name, provider=self.provider, streamed=True)
+        try:
+            for chunk in get_guard(self.provider).stream(self.inner._stream, messages, stop=stop, **kwargs):
+                _chunk_usage(llm_span, chunk)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            llm_span.set(cancelled=True)
+            finish_span(llm_span)
+            raise
+        except Exception as e:
+            finish_span(llm_span, error=e)
+            raise
+        finish_span(llm_span)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        llm_span = start_span("llm", model=self.model_name, provider=self.provider, streamed=True)
+        try:
+            async for chunk in get_guard(self.provider).astream(self.inner._astream, messages, stop=stop, **kwargs):
+                _chunk_usage(llm_span, chunk)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            llm_span.set(cancelled=True)
+            finish_span(llm_span)
+            raise
+        except Exception as e:
+            finish_span(llm_span, error=e)
+            raise
+        finish_span(llm_span)
+
+def _result_usage(result: ChatResult) -> dict:
+    """Prompt and completion token counts reported by the provider, if any"""
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    if not usage and result.generations:
+        metadata = getattr(result.generations[0].message, "usage_metadata", None) or {}
+        usage = {"prompt_tokens": metadata.get("input_tokens"), "completion_tokens": metadata.get("output_tokens")}
+    return {kind: usage[kind] for kind in ("prompt_tokens", "completion_tokens") if usage.get(kind)}
+
+def _chunk_usage(llm_span, chunk: ChatGenerationChunk):
+    # Providers that report usage while streaming put it on one of the last chunks
+    metadata = getattr(chunk.message, "usage_metadata", None)
+    if metadata:
+        llm_span.set(prompt_tokens=metadata.get("input_tokens"), completion_tokens=metadata.get("output_tokens"))
+
+def _last_user_text(messages) -> str:
+    for message in reversed(messages):
+        if message.type == "human":
+            return str(message.content)
+    return str(messages[-1].content) if messages else ""
+
+def fake_reply(prompt: str) -> str:
+    """Deterministic offline answer; ReAct prompts get a well-formed final answer so agents terminate"""
+    question = " ".join(prompt.split())[-160:]
+    if "python_repl_ast" in prompt and "Observation:" not in prompt.rsplit("Question:", 1)[-1]:
+        # Scripted first step of the pandas agent; the next call sees the observation and answers
+        return f"Thought: I should inspect the data.\nAction: python_repl_ast\nAction Input: {LLM_FAKE_REACT_CODE}"
+    if "Action Input" in prompt or "Final Answer" in prompt:
+        if "Question:" in prompt:
+            question = prompt.rsplit("Question:", 1)[-1].strip().splitlines()[0][:160]
+        return f"Thought: I can answer this directly.\nFinal Answer: Offline answer for: {question}"
+    return f"Offline answer for: {question}"
+
+class FakeChatModel(BaseChatModel):
+    """Local stand-in for a provider: fixed latency, deterministic text, streamed word by word"""
+
+    model_name: str = "fake"
+    latency_ms: float = LLM_FAKE_LATENCY_MS
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=fake_reply(_last_user_text(messages))))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=fake_reply(_last_user_text(messages))))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        words = fake_reply(_last_user_text(messages)).split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.latency_ms / 1000 / len(words))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        words = fake_reply(_last_user_text(messages)).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency_ms / 1000 / len(words))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+
+def _groq_model(model_name: str, temperature: float):
+    from langchain_groq import ChatGroq
+
+    kwargs = {}
+    try:
+        import httpx
+        limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+        kwargs = {"http_client": httpx.Client(limits=limits), "http_async_client": httpx.AsyncClient(limits=limits)}
+    except ImportError:
+        pass
+    # Retries belong to the gateway, so the SDK's own are turned off
+    return ChatGroq(temperature=temperature, model_name=model_name, max_retries=0, **kwargs)
+
+def get_chat_model(model_name: str = DEFAULT_MODEL, temperature: float = 0) -> GatewayChatModel:
+    """Shared, guarded chat model for a model name; the same instance serves every session"""
+    key = (LLM_BACKEND, model_name, temperature)
+    with _lock:
+        if key not in _models:
+            if LLM_BACKEND == "fake":
+                inner, provider = FakeChatModel(model_name=model_name), "fake"
+            else:
+                inner, provider = _groq_model(model_name, temperature), "groq"
+            _models[key] = GatewayChatModel(inner=inner, provider=provider)
+        return _models[key]
+
+class _FakeCodeGPT:
+    def chat_completion(self, agent_id, messages, stream=False):
+        reply = fake_reply(messages[-1]["content"])
+        if not stream:
+            time.sleep(LLM_FAKE_LATENCY_MS / 1000)
+            return reply
+
+        def chunks():
+            words = reply.split(" ")
+            for i, word in enumerate(words):
+                time.sleep(LLM_FAKE_LATENCY_MS / 1000 / len(words))
+                yield word if i == 0 else f" {word}"
+        return chunks()
+
+_codegpt = None
+
+def codegpt_completion(agent_id: str, messages, stream: bool = False):
+    """CodeGPT chat completion through the gateway; streaming returns a generator of text chunks"""
+    global _codegpt
+    with _lock:
+        if _codegpt is None:
+            if LLM_BACKEND == "fake":
+                _codegpt = _FakeCodeGPT()
+            else:
+                from codegpt import CodeGPTPlus
+                _codegpt = CodeGPTPlus()
+    provider = "fake" if LLM_BACKEND == "fake" else "codegpt"
+    guard = get_guard(provider)
+    if stream:
+        return _traced_stream(guard.stream(_codegpt.chat_completion, agent_id=agent_id, messages=messages, stream=True),
+                              start_span("llm", model=agent_id, provider=provider, streamed=True))
+    with span("llm", model=agent_id, provider=provider):
+        return guard.call(_codegpt.chat_completion, agent_id=agent_id, messages=messages)
+
+def _traced_stream(chunks, llm_span):
+    try:
+        yield from chunks
+    except GeneratorExit:
+        llm_span.set(cancelled=True)
+        finish_span(llm_span)
+        raise
+    except Exception as e:
+        finish_span(llm_span, error=e)
+        raise
+    finish_span(llm_span)
+
+def get_stats():
+    """Per-provider call, retry, failure and rejection counts plus circuit state"""
+    with _lock:
+        guards = dict(_guards)
+    return {name: guard.get_stats() for name, guard in guards.items()}
@@ -0,0 +1,289 @@
+import asyncio
+import itertools
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from .llm_gateway import DEFAULT_MODEL, get_chat_model
+from .tracing import span, start_span, finish_span
+
+# Send simple questions and intermediate agent steps to SMALL_MODEL; 0 pins everything to LARGE_MODEL
+LLM_ROUTING = os.getenv("LLM_ROUTING", "1") == "1"
+SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "llama-3.1-8b-instant")
+LARGE_MODEL = os.getenv("LLM_LARGE_MODEL", DEFAULT_MODEL)
+# Questions scoring at or above this complexity go straight to the large model
+LLM_ROUTER_THRESHOLD = float(os.getenv("LLM_ROUTER_THRESHOLD", 0.35))
+# Characters of a streamed small-model answer held back to check it is not a non-answer
+LLM_ROUTER_STREAM_PROBE_CHARS = 80
+
+_COMPLEX_WORDS = re.compile(
+    r"\b(why|how (?:should|can|could|do|would)|compare|versus|vs|analy[sz]\w*|strateg\w*|optimi[sz]\w*|"
+    r"recommend\w*|plan|forecast\w*|trade-?offs?|diagnos\w*|explain|step[- ]by[- ]step|pros and cons|refactor\w*)\b",
+    re.I,
+)
+_SIMPLE_PREFIX = re.compile(r"^\s*(what (?:is|are|does)|define|meaning of|who|when|where|which|list|is there|does|do i)\b", re.I)
+_NON_ANSWER = re.compile(r"\b(i(?:'m| am) not sure|i don'?t know|i cannot (?:determine|answer)|unable to (?:determine|answer)|not enough information)\b", re.I)
+_REACT_STEP = re.compile(r"Action\s*:.*?Action\s*Input\s*:", re.S)
+
+def score_complexity(question: str) -> float:
+    """Heuristic 0-1 complexity of a question: length, analytical wording, several asks, code"""
+    words = len(question.split())
+    score = min(words / 60, 0.5)
+    score += 0.25 * min(len(_COMPLEX_WORDS.findall(question)), 2)
+    score += 0.1 * max(question.count("?") - 1, 0)
+    if "```" in question or "\n" in question.strip():
+        score += 0.2
+    if _SIMPLE_PREFIX.match(question) and words <= 15:
+        score -= 0.2
+    return max(0.0, min(score, 1.0))
+
+def _prompt_text(messages) -> str:
+    for message in reversed(messages):
+        if message.type == "human":
+            return str(message.content)
+    return str(messages[-1].content) if messages else ""
+
+def classify(messages, threshold: float = LLM_ROUTER_THRESHOLD):
+    """Return (tier, score, reason) for a prompt"""
+    text = _prompt_text(messages)
+    if "Action Input" in text and "Question:" in text:
+        # ReAct prompt: once a tool has run, the remaining steps read an observation and
+        # format the next action or the answer, which the small model handles
+        question = text.rpartition("Question:")[2]
+        if "\nObservation:" in question:
+            return "small", 0.0, "agent_step"
+        # The question may start on the next line and be followed, after a blank line, by
+        # instructions the agent appended (SellerAgent's filter_question); score only the question
+        text = question.partition("\nThought:")[0].strip().split("\n\n")[0]
+    score = score_complexity(text)
+    return ("large", score, "complex") if score >= threshold else ("small", score, "simple")
+
+def acceptable(text: str, messages) -> Optional[str]:
+    """None if a small-model answer can be used, otherwise the reason to escalate it"""
+    if not text.strip():
+        return "empty"
+    prompt = _prompt_text(messages)
+    if "Action Input" in prompt and "Question:" in prompt and "Final Answer:" not in text and not _REACT_STEP.search(text):
+        return "parse_failure"
+    if _NON_ANSWER.search(text[:300]):
+        return "low_confidence"
+    return None
+
+class _RouterStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    def record(self, agent: str, tier: str, seconds: float, reason: str, escalated: bool):
+        with self._lock:
+            self.counts[f"{tier}_calls"] += 1
+            self.seconds[tier] += seconds
+            self.counts[f"{agent}_{tier}_calls"] += 1
+            if escalated:
+                self.counts["escalations"] += 1
+                self.counts[f"escalations_{reason}"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.counts)
+            for tier, total in self.seconds.items():
+                calls = self.counts[f"{tier}_calls"]
+                stats[f"{tier}_avg_seconds"] = total / calls if calls else 0.0
+        small, large = stats.get("small_calls", 0), stats.get("large_calls", 0)
+        stats["small_fraction"] = small / (small + large) if small + large else 0.0
+        return stats
+
+router_stats = _RouterStats()
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model that answers on the small tier when it can and escalates to the large one.
+
+    Each call is classified with the heuristic scorer; small-tier answers that are
+    empty, not valid ReAct output or a non-answer are retried on the large model.
+    Every decision is recorded as a "route" span (tier, score, reason, escalated) and
+    in router_stats so the threshold can be tuned from the trace log and /metrics.
+    """
+
+    small: Any
+    large: Any
+    agent: str = "none"
+    threshold: float = LLM_ROUTER_THRESHOLD
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    @property
+    def model_name(self) -> str:
+        return f"{self.small.model_name}|{self.large.model_name}"
+
+    def _record(self, route_span, tier, started, reason, escalated):
+        elapsed = time.perf_counter() - started
+        route_span.set(tier=tier, reason=reason, escalated=escalated)
+        router_stats.record(self.agent, tier, elapsed, reason, escalated)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        tier, score, reason = classify(messages, self.threshold)
+        with span("route", agent=self.agent, score=round(score, 3)) as route_span:
+            started = time.perf_counter()
+            if tier == "small":
+                try:
+                    result = self.small._generate(messages, stop=stop, **kwargs)
+                    reason = acceptable(result.generations[0].text, messages) or reason
+                except Exception as e:
+                    print(f"Small model failed, escalating: {e}")
+                    reason, result = "error", None
+                if reason in ("simple", "agent_step"):
+                    self._record(route_span, "small", started, reason, False)
+                    return result
+                router_stats.record(self.agent, "small", time.perf_counter() - started, reason, False)
+                started = time.perf_counter()
+            result = self.large._generate(messages, stop=stop, **kwargs)
+            self._record(route_span, "large", started, reason, tier == "small")
+            return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        tier, score, reason = classify(messages, self.threshold)
+        with span("route", agent=self.agent, score=round(score, 3)) as route_span:
+            started = time.perf_counter()
+            if tier == "small":
+                try:
+                    result = await self.small._agenerate(messages, stop=stop, **kwargs)
+                    reason = acceptable(result.generations[0].text, messages) or reason
+                except Exception as e:
+                    print(f"Small model failed, escalating: {e}")
+                    reason, result = "error", None
+                if reason in ("simple", "agent_step"):
+                    self._record(route_span, "small", started, reason, False)
+                    return result
+                router_stats.record(self.agent, "small", time.perf_counter() - started, reason, False)
+                started = time.perf_counter()
+            result = await self.large._agenerate(messages, stop=stop, **kwargs)
+            self._record(route_span, "large", started, reason, tier == "small")
+            return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        # Streamed answers are only checked on their first characters, so time to first token stays low
+        tier, score, reason = classify(messages, self.threshold)
+        route_span = start_span("route", agent=self.agent, score=round(score, 3), streamed=True)
+        error = None
+        try:
+            started = time.perf_counter()
+            if tier == "small":
+                chunks = self.small._stream(messages, stop=stop, **kwargs)
+                held = []
+                try:
+                    for chunk in chunks:
+                        held.append(chunk)
+                        if sum(len(c.text) for c in held) >= LLM_ROUTER_STREAM_PROBE_CHARS:
+                            break
+                    verdict = _probe_verdict("".join(c.text for c in held))
+                except Exception as e:
+                    print(f"Small model failed, escalating: {e}")
+                    verdict = "error"
+                if verdict is None:
+                    for chunk in itertools.chain(held, chunks):
+                        if run_manager:
+                            run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                        yield chunk
+                    self._record(route_span, "small", started, reason, False)
+                    return
+                chunks.close()
+                router_stats.record(self.agent, "small", time.perf_counter() - started, verdict, False)
+                reason, started = verdict, time.perf_counter()
+            for chunk in self.large._stream(messages, stop=stop, **kwargs):
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            self._record(route_span, "large", started, reason, tier == "small")
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer stopped reading the stream (e.g. the browser tab closed); not a failure
+            route_span.set(cancelled=True)
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            finish_span(route_span, error=error)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        tier, score, reason = classify(messages, self.threshold)
+        route_span = start_span("route", agent=self.agent, score=round(score, 3), streamed=True)
+        error = None
+        try:
+            started = time.perf_counter()
+            if tier == "small":
+                chunks = self.small._astream(messages, stop=stop, **kwargs)
+                held = []
+                try:
+                    async for chunk in chunks:
+                        held.append(chunk)
+                        if sum(len(c.text) for c in held) >= LLM_ROUTER_STREAM_PROBE_CHARS:
+                            break
+                    verdict = _probe_verdict("".join(c.text for c in held))
+                except Exception as e:
+                    print(f"Small model failed, escalating: {e}")
+                    verdict = "error"
+                if verdict is None:
+                    for chunk in held:
+                        if run_manager:
+                            await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                        yield chunk
+                    async for chunk in chunks:
+                        if run_manager:
+                            await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                        yield chunk
+                    self._record(route_span, "small", started, reason, False)
+                    return
+                await chunks.aclose()
+                router_stats.record(self.agent, "small", time.perf_counter() - started, verdict, False)
+                reason, started = verdict, time.perf_counter()
+            async for chunk in self.large._astream(messages, stop=stop, **kwargs):
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            self._record(route_span, "large", started, reason, tier == "small")
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer stopped reading the stream (e.g. the browser tab closed); not a failure
+            route_span.set(cancelled=True)
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            finish_span(route_span, error=error)
+
+def _probe_verdict(text: str) -> Optional[str]:
+    """Escalation reason for the start of a streamed answer, or None to keep streaming it"""
+    if not text.strip():
+        return "empty"
+    return "low_confidence" if _NON_ANSWER.search(text) else None
+
+_routed = {}
+_lock = threading.Lock()
+
+def get_routed_model(agent: str, temperature: float = 0):
+    """Chat model for an agent: the small/large router, or the large model alone if routing is off"""
+    if not LLM_ROUTING:
+        return get_chat_model(LARGE_MODEL, temperature)
+    key = (agent, temperature)
+    with _lock:
+        if key not in _routed:
+            _routed[key] = RoutedChatModel(
+                small=get_chat_model(SMALL_MODEL, temperature),
+                large=get_chat_model(LARGE_MODEL, temperature),
+                agent=agent,
+            )
+        return _routed[key]
+
+def get_stats():
+    """Calls, average latency per tier and escalations by reason"""
+    return router_stats.get_stats()
@@ -0,0 +1,190 @@
+import ast
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from io import StringIO
+
+try:
+    import resource
+except ImportError:  # Windows: workers still isolate crashes but run without rlimits
+    resource = None
+
+# Worker processes that run LLM-generated pandas code outside the web server
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", 2))
+# CPU seconds a single code cell may use before its worker is killed
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", 30))
+# Wall-clock limit per cell, covering code that sleeps or blocks rather than computes
+SANDBOX_TIMEOUT_SECONDS = float(os.getenv("SANDBOX_TIMEOUT_SECONDS", 60))
+# Address-space cap for each worker, including its copy of the DataFrame
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", 4096))
+SANDBOX_MAX_OUTPUT_CHARS = int(os.getenv("SANDBOX_MAX_OUTPUT_CHARS", 10_000))
+# Per-worker bounds on cached DataFrames and REPL namespaces
+_MAX_FRAMES = 2
+_MAX_NAMESPACES = 32
+
+def sanitize_input(code: str) -> str:
+    """Strip backticks, a leading 'python' and surrounding whitespace, as the LangChain REPL does"""
+    code = re.sub(r"^(\s|`)*(?i:python)?\s*", "", code)
+    return re.sub(r"(\s|`)*$", "", code)
+
+def _run_cell(code: str, namespace: dict):
+    """Execute a cell like python_repl_ast; returns (last expression's value or stdout, failed)"""
+    try:
+        tree = ast.parse(sanitize_input(code))
+        exec(ast.unparse(ast.Module(tree.body[:-1], type_ignores=[])), namespace)
+        last = ast.unparse(ast.Module(tree.body[-1:], type_ignores=[]))
+        buffer = StringIO()
+        try:
+            with redirect_stdout(buffer):
+                value = eval(last, namespace)
+        except Exception:
+            with redirect_stdout(buffer):
+                exec(last, namespace)
+            return buffer.getvalue(), False
+        return (buffer.getvalue() if value is None else str(value)), False
+    except MemoryError:
+        return "MemoryError: the code exceeded the sandbox memory limit", True
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", True
+
+def _set_cpu_budget(seconds: int):
+    """Let the next cell use `seconds` more CPU time; past that the kernel sends SIGXCPU"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+def _worker_main(conn, memory_bytes: int):
+    """Worker loop: load DataFrames from their Parquet files and run cells in per-session namespaces"""
+    import pandas as pd
+
+    if resource is not None and memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    frames = OrderedDict()
+    namespaces = OrderedDict()
+    while True:
+        try:
+            session_key, source, code, cpu_seconds = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        try:
+            if source not in frames:
+                frames[source] = pd.read_parquet(source, memory_map=True)
+                while len(frames) > _MAX_FRAMES:
+                    frames.popitem(last=False)
+            frames.move_to_end(source)
+            namespace_source, namespace = namespaces.get(session_key, (None, None))
+            if namespace_source != source:
+                # A shallow copy so column assignments stay within this session
+                namespace = {"df": frames[source].copy(deep=False), "pd": pd}
+                namespaces[session_key] = (source, namespace)
+                while len(namespaces) > _MAX_NAMESPACES:
+                    namespaces.popitem(last=False)
+            namespaces.move_to_end(session_key)
+
+            if resource is not None and cpu_seconds:
+                _set_cpu_budget(cpu_seconds)
+            output, failed = _run_cell(code, namespace)
+            filtered = namespace.pop("_FILTERED_RESULT_", None)
+            if not isinstance(filtered, (pd.DataFrame, pd.Series)):
+                filtered = None
+            conn.send((output[:SANDBOX_MAX_OUTPUT_CHARS], filtered, failed))
+        except Exception as e:
+            # Includes MemoryError from the address-space limit while loading or sending
+            namespaces.pop(session_key, None)
+            conn.send((f"{type(e).__name__}: {e}", None, True))
+
+class _Worker:
+    def __init__(self, context, memory_bytes: int):
+        self._context = context
+        self._memory_bytes = memory_bytes
+        self.lock = threading.Lock()
+        self.restarts = 0
+        self._spawn()
+
+    def _spawn(self):
+        self.conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(target=_worker_main, args=(child_conn, self._memory_bytes), name="sandbox-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def restart(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+        self.restarts += 1
+        self._spawn()
+
+class SandboxPool:
+    """Pre-started worker processes that run generated pandas code under CPU, memory and time limits.
+
+    Workers read the session's DataFrame from a Parquet file (memory-mapped) and
+    keep one REPL namespace per session, so only code and results cross the
+    process boundary. A cell that exceeds its limits takes down its worker, which
+    is replaced; the web process only sees an error string.
+    """
+
+    def __init__(self, workers: int = SANDBOX_WORKERS, cpu_seconds: int = SANDBOX_CPU_SECONDS,
+                 timeout: float = SANDBOX_TIMEOUT_SECONDS, memory_mb: int = SANDBOX_MEMORY_MB):
+        self.size = max(1, workers)
+        self.cpu_seconds = cpu_seconds
+        self.timeout = timeout
+        self.memory_bytes = memory_mb * 1024 * 1024
+        self._workers = None
+        self._lock = threading.Lock()
+        self.stats = {"cells": 0, "errors": 0, "killed": 0}
+
+    def start(self):
+        """Spawn the workers now so the first query does not pay for process start-up and imports"""
+        with self._lock:
+            if self._workers is None:
+                # spawn, not fork: the server process has threads and open sockets
+                context = multiprocessing.get_context("spawn")
+                self._workers = [_Worker(context, self.memory_bytes) for _ in range(self.size)]
+        return self
+
+    def _worker_for(self, session_key: str) -> _Worker:
+        # Sessions stick to one worker so variables persist between an agent's steps
+        digest = hashlib.sha256(session_key.encode()).digest()
+        return self.start()._workers[int.from_bytes(digest[:4], "big") % self.size]
+
+    def run(self, session_key: str, source: str, code: str):
+        """Run a cell for a session against the DataFrame stored at source.
+
+        Returns (output, filtered) where filtered is the _FILTERED_RESULT_ the cell assigned, if any.
+        """
+        worker = self._worker_for(session_key)
+        with worker.lock:
+            self.stats["cells"] += 1
+            try:
+                worker.conn.send((session_key, source, code, self.cpu_seconds))
+                if worker.conn.poll(self.timeout):
+                    output, filtered, failed = worker.conn.recv()
+                    if failed:
+                        self.stats["errors"] += 1
+                    return output, filtered
+                reason = f"it ran longer than {self.timeout:.0f}s"
+            except (EOFError, OSError, BrokenPipeError):
+                reason = f"it exceeded the {self.cpu_seconds}s CPU or {self.memory_bytes // (1024 * 1024)} MB memory limit"
+            self.stats["killed"] += 1
+            worker.restart()
+        return f"Error: the code was stopped because {reason}. Variables from earlier steps were lost; use a cheaper approach.", None
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers = self._workers or [], None
+        for worker in workers:
+            worker.process.kill()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["restarts"] = sum(worker.restarts for worker in self._workers or [])
+        return stats
+
+# Shared pool for all seller agents in this process; workers start on first use
+sandbox_pool = SandboxPool()
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+from .tracing import current_span
+
+_DONE = object()
+
+class _Flight:
+    """One in-flight stream: chunks produced so far plus the subscribers waiting for more"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.task = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def _broadcast(self, item, subscribers):
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def publish(self, chunk):
+        with self._lock:
+            self.chunks.append(chunk)
+            subscribers = list(self._subscribers)
+        self._broadcast(chunk, subscribers)
+
+    def finish(self, error=None):
+        with self._lock:
+            self.done = True
+            self.error = error
+            subscribers, self._subscribers = self._subscribers, []
+        self._broadcast(_DONE, subscribers)
+
+    async def subscribe(self):
+        """Replay the chunks produced so far, then follow the stream until it ends"""
+        queue = asyncio.Queue()
+        with self._lock:
+            backlog = list(self.chunks)
+            done = self.done
+            if not done:
+                # Subscribers may live on other event loops (one per Panel server thread)
+                self._subscribers.append((asyncio.get_running_loop(), queue))
+        for chunk in backlog:
+            yield chunk
+        if not done:
+            while True:
+                chunk = await queue.get()
+                if chunk is _DONE:
+                    break
+                yield chunk
+        if self.error is not None:
+            raise self.error
+
+class SingleFlight:
+    """Coalesces identical concurrent requests into one underlying call.
+
+    The first caller for a key starts the producer as its own task; everyone who
+    asks for the same key before it finishes, including the first caller,
+    subscribes to that one stream. A consumer that goes away (e.g. a closed
+    browser tab) never cancels the shared call for the others.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def stream(self, key, factory):
+        """Yield the chunks of factory() (an async iterator), shared with concurrent callers of key"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.stats["leaders"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        request_span = current_span()
+        if request_span is not None:
+            request_span.set(coalesced=not leader)
+        if leader:
+            # Held on the flight so the event loop does not garbage-collect the running task
+            flight.task = asyncio.ensure_future(self._produce(key, flight, factory))
+        async for chunk in flight.subscribe():
+            yield chunk
+
+    async def run(self, key, coroutine_factory):
+        """Await coroutine_factory() once for all concurrent callers of key and return its result"""
+        async def single():
+            yield await coroutine_factory()
+
+        async for result in self.stream(key, single):
+            return result
+
+    async def _produce(self, key, flight, factory):
+        error = None
+        try:
+            async for chunk in factory():
+                flight.publish(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.finish(error)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+# Shared by every chat session in this process
+query_flights = SingleFlight()
@@ -0,0 +1,239 @@
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Port for the Prometheus-text /metrics endpoint served next to the Panel app; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9464))
+# Interface it listens on; only local scrapers by default, 0.0.0.0 exposes it to the network
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Append every finished span as one JSON line here; empty disables the trace log
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "")
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """One timed stage of a request; attributes are free-form (tokens, cache_hit, rows, ...)"""
+
+    def __init__(self, stage: str, agent: str = None, parent=None, **attrs):
+        self.stage = stage
+        self.parent = parent
+        self.agent = agent or (parent.agent if parent else None) or "none"
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "agent": self.agent,
+            "stage": self.stage,
+            "start": self.started_at,
+            "duration": self.duration,
+            **self.attrs,
+        }
+
+class MetricsRegistry:
+    """Latency histograms per (agent, stage) plus token and cache counters"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # (agent, stage) -> [bucket counts..., +Inf count], sum
+        self._histograms = defaultdict(lambda: [[0] * (len(self.buckets) + 1), 0.0])
+        self._tokens = defaultdict(int)
+        self._cache = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._gauge_sources = {}
+
+    def observe(self, span: Span):
+        with self._lock:
+            counts, _ = histogram = self._histograms[(span.agent, span.stage)]
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            histogram[1] += span.duration
+            for kind in ("prompt_tokens", "completion_tokens"):
+                if span.attrs.get(kind):
+                    self._tokens[(span.agent, span.stage, kind.split("_")[0])] += int(span.attrs[kind])
+            if "cache_hit" in span.attrs:
+                self._cache[(span.agent, "hit" if span.attrs["cache_hit"] else "miss")] += 1
+            if span.attrs.get("error"):
+                self._errors[(span.agent, span.stage)] += 1
+
+    def register_gauges(self, prefix: str, source):
+        """Expose the numeric values of source() (e.g. a get_stats method) as gauges"""
+        self._gauge_sources[prefix] = source
+
+    def register_module_gauges(self, prefix: str, module: str, attr: str = "get_stats"):
+        """Like register_gauges for module.attr(), but silent until the app itself imports module,
+        so neither startup nor a scrape pulls in pandas or langchain"""
+        def source():
+            loaded = sys.modules.get(module)
+            return getattr(loaded, attr)() if loaded is not None else {}
+        self.register_gauges(prefix, source)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP chatbot_stage_seconds Time spent per agent and stage",
+            "# TYPE chatbot_stage_seconds histogram",
+        ]
+        with self._lock:
+            histograms = {key: ([*counts], total) for key, (counts, total) in self._histograms.items()}
+            tokens = dict(self._tokens)
+            cache = dict(self._cache)
+            errors = dict(self._errors)
+        for (agent, stage), (counts, total) in sorted(histograms.items()):
+            labels = f'agent="{_escape(agent)}",stage="{_escape(stage)}"'
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                lines.append(f'chatbot_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"chatbot_stage_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"chatbot_stage_seconds_count{{{labels}}} {cumulative}")
+
+        lines += ["# HELP chatbot_llm_tokens_total LLM tokens by agent, stage and kind", "# TYPE chatbot_llm_tokens_total counter"]
+        for (agent, stage, kind), count in sorted(tokens.items()):
+            lines.append(f'chatbot_llm_tokens_total{{agent="{_escape(agent)}",stage="{_escape(stage)}",kind="{kind}"}} {count}')
+        lines += ["# HELP chatbot_cache_lookups_total Answer cache lookups by result", "# TYPE chatbot_cache_lookups_total counter"]
+        for (agent, result), count in sorted(cache.items()):
+            lines.append(f'chatbot_cache_lookups_total{{agent="{_escape(agent)}",result="{result}"}} {count}')
+        lines += ["# HELP chatbot_stage_errors_total Failed spans by agent and stage", "# TYPE chatbot_stage_errors_total counter"]
+        for (agent, stage), count in sorted(errors.items()):
+            lines.append(f'chatbot_stage_errors_total{{agent="{_escape(agent)}",stage="{_escape(stage)}"}} {count}')
+
+        for prefix, source in list(self._gauge_sources.items()):
+            try:
+                values = source()
+            except Exception as e:
+                print(f"Error collecting {prefix} metrics: {e}")
+                continue
+            for name, value in _flatten(values):
+                lines.append(f"chatbot_{prefix}_{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _flatten(values, prefix=""):
+    """Numeric leaves of a nested stats dict, with names joined by underscores"""
+    for key, value in values.items():
+        name = "".join(ch if ch.isalnum() else "_" for ch in f"{prefix}{key}")
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}_")
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+metrics = MetricsRegistry()
+
+class _TraceLog:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", buffering=1, encoding="utf-8")
+            self._file.write(line + "\n")
+
+_trace_log = _TraceLog(TRACE_LOG_PATH) if TRACE_LOG_PATH else None
+
+def current_span():
+    return _current_span.get()
+
+def start_span(stage: str, agent: str = None, **attrs) -> Span:
+    """Open a span under the current one without making it current (for spans closed elsewhere)"""
+    return Span(stage, agent=agent, parent=_current_span.get(), **attrs)
+
+def finish_span(span: Span, error=None):
+    span.duration = time.perf_counter() - span._started
+    if error is not None:
+        span.attrs["error"] = f"{type(error).__name__}: {error}"
+    metrics.observe(span)
+    if _trace_log is not None:
+        try:
+            _trace_log.write(span)
+        except OSError as e:
+            print(f"Error writing trace log: {e}")
+
+@contextmanager
+def span(stage: str, agent: str = None, **attrs):
+    """Time a block as a stage of the current request; yields the Span so attributes can be added"""
+    current = start_span(stage, agent=agent, **attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except (GeneratorExit, asyncio.CancelledError):
+        # The consumer stopped listening (e.g. the browser tab closed); not a failure
+        current.set(cancelled=True)
+        finish_span(current)
+        raise
+    except BaseException as e:
+        finish_span(current, error=e)
+        raise
+    else:
+        finish_span(current)
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # An async generator resumed in another context; that context never saw the span
+            pass
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Serve /metrics on a daemon thread; a no-op if disabled or already running"""
+    global _server
+    with _server_lock:
+        if _server is not None or not port:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"Metrics endpoint not started on {host}:{port}: {e}")
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+import weakref
+from collections import Counter
+
+from utils.helpers import ensure_uploads_dir
+
+# Files in uploads/ untouched for longer than this are deleted by cleanup_uploads
+UPLOADS_RETENTION_HOURS = float(os.getenv("UPLOADS_RETENTION_HOURS", 24))
+# Total size cap for uploads/ (sources, exports and caches); oldest files go first
+UPLOADS_MAX_MB = float(os.getenv("UPLOADS_MAX_MB", 2048))
+
+_retained = Counter()
+_lock = threading.Lock()
+
+def _release(paths):
+    with _lock:
+        for path in paths:
+            _retained[path] -= 1
+            if _retained[path] <= 0:
+                del _retained[path]
+
+def retain(owner, *paths):
+    """Keep files from cleanup for as long as owner (e.g. an agent) is alive"""
+    paths = [os.path.abspath(path) for path in paths if path]
+    with _lock:
+        _retained.update(paths)
+    weakref.finalize(owner, _release, paths)
+
+def is_retained(path: str) -> bool:
+    with _lock:
+        return _retained[os.path.abspath(path)] > 0
+
+def cleanup_uploads(max_age_hours: float = UPLOADS_RETENTION_HOURS, max_total_mb: float = UPLOADS_MAX_MB):
+    """Delete expired files under uploads/, then the oldest ones until the size cap holds.
+
+    Files retained by live agents are never deleted. Returns (files_removed, bytes_removed).
+    """
+    files = []
+    for root, _, names in os.walk(ensure_uploads_dir()):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((max(stat.st_mtime, stat.st_atime), stat.st_size, path))
+
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    cutoff = time.time() - max_age_hours * 3600
+    max_bytes = max_total_mb * 1024 * 1024
+    removed, removed_bytes = 0, 0
+    for last_used, size, path in files:
+        if last_used >= cutoff and total <= max_bytes:
+            break
+        if is_retained(path):
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Error removing {path}: {e}")
+            continue
+        total -= size
+        removed += 1
+        removed_bytes += size
+    return removed, removed_bytes